@@ -0,0 +1,3 @@
+"""
+Benchmarks for the docx and pptx rendering hot paths, see ``python -m benchmarks.run --help``.
+"""
@@ -0,0 +1,41 @@
+"""
+Compare two result files of ``python -m benchmarks.run``.
+
+Usage::
+
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--stat', default='median', choices=['min', 'median', 'mean'])
+    args = parser.parse_args(argv)
+
+    with open(args.before) as infile:
+        before = {case['name']: case for case in json.load(infile)['cases']}
+    with open(args.after) as infile:
+        after = {case['name']: case for case in json.load(infile)['cases']}
+
+    for name, case in after.items():
+        if name not in before:
+            continue
+        print(name)
+        for phase, values in case['phases'].items():
+            old = before[name]['phases'].get(phase)
+            if not old:
+                continue
+            ratio = values[args.stat] / old[args.stat] if old[args.stat] else float('inf')
+            print('    {:<10} {:>10.2f}ms -> {:>10.2f}ms  x{:.2f}'.format(
+                phase, old[args.stat] * 1000, values[args.stat] * 1000, ratio))
+        memory_ratio = case['peak_memory'] / before[name]['peak_memory'] if before[name]['peak_memory'] else 0
+        print('    {:<10} {:>10.1f}MB -> {:>10.1f}MB  x{:.2f}'.format(
+            'memory', before[name]['peak_memory'] / 2 ** 20, case['peak_memory'] / 2 ** 20, memory_ratio))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Time saving the example templates with every compression preset, and compare the sizes.
+
+Usage::
+
+    python -m benchmarks.compression
+    python -m benchmarks.compression examples/*.docx tests/powerpoint/files/*.pptx --repeat 20
+
+'library' is the default of python-docx and python-pptx, which deflates
+every part at zlib's default level.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+from bureaucracy import DocxTemplate
+from bureaucracy.packaging import Compression
+from bureaucracy.powerpoint import Template
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATHS = sorted(glob.glob(os.path.join(ROOT, 'examples', '*.docx')) +
+                       glob.glob(os.path.join(ROOT, 'tests', 'powerpoint', 'files', '*.pptx')))
+
+PRESETS = OrderedDict([
+    ('library', None),
+    ('store', Compression.STORE),
+    ('fast', Compression.FAST),
+    ('default', Compression.DEFAULT),
+    ('smallest', Compression.SMALLEST),
+])
+
+
+def load(path, compression):
+    if path.lower().endswith('.pptx'):
+        return Template(path, compression=compression)
+    return DocxTemplate(path, compression=compression)
+
+
+def measure(path, compression, repeat):
+    template = load(path, compression)
+    durations = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        handle = BytesIO()
+        if isinstance(template, Template):
+            template.save_to(handle)
+        else:
+            template.save(handle)
+        durations.append(time.perf_counter() - start)
+    return {'median': statistics.median(durations), 'min': min(durations), 'size': len(handle.getvalue())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS, help='the docx and pptx files to save')
+    parser.add_argument('--repeat', type=int, default=10, help='number of timed saves per file and preset')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    totals = OrderedDict((name, {'median': 0.0, 'size': 0}) for name in PRESETS)
+    for path in args.paths:
+        for name, compression in PRESETS.items():
+            result = measure(path, compression, args.repeat)
+            results.append(dict(result, path=os.path.relpath(path, ROOT), compression=name))
+            totals[name]['median'] += result['median']
+            totals[name]['size'] += result['size']
+            print('{:<50} {:<9} {:>8.2f}ms {:>10} bytes'.format(
+                os.path.relpath(path, ROOT), name, result['median'] * 1000, result['size']))
+
+    print()
+    library = totals['library']
+    for name, total in totals.items():
+        print('{:<9} {:>8.2f}ms ({:>4.0%}) {:>10} bytes ({:>4.0%})'.format(
+            name, total['median'] * 1000, total['median'] / library['median'] if library['median'] else 0,
+            total['size'], total['size'] / library['size'] if library['size'] else 0))
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(results, outfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Time the phases of rendering synthetic docx and pptx templates of various sizes.
+
+Usage::
+
+    python -m benchmarks.run --output before.json
+    # ... make changes ...
+    python -m benchmarks.run --output after.json
+    python -m benchmarks.compare before.json after.json
+
+Every case is run ``--repeat`` times and the min, median and mean duration
+of each phase are recorded, plus the peak memory of a separate, traced run.
+Conversion uses a stub converter, so it measures bureaucracy's own
+overhead and not LibreOffice.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from copy import deepcopy
+from io import BytesIO
+
+import docx
+import pptx
+
+from bureaucracy import DocxTemplate
+from bureaucracy.converters import BaseConverter
+from bureaucracy.powerpoint import Template
+
+from . import synthetic
+
+
+class StubConverter(BaseConverter):
+    """
+    Hands the documents back as-is.
+    """
+
+    def convert_many(self, documents, source_format, target_format):
+        return list(documents)
+
+
+def run_docx_case(fields, tables, table_rows, html, pages):
+    converter = StubConverter()
+    source = synthetic.docx_template(fields=fields, tables=tables, html=html, pages=pages)
+    html_replacement = None
+    if html:
+        from bureaucracy import HTML as html_replacement
+    context = synthetic.docx_context(fields=fields, tables=tables, table_rows=table_rows, html=html,
+                                     html_replacement=html_replacement)
+
+    timings = OrderedDict()
+    with timed(timings, 'parse'):
+        template = DocxTemplate(BytesIO(source), converter=converter)
+    with timed(timings, 'clone'):
+        doc = deepcopy(template)
+    with timed(timings, 'replace'):
+        doc.replace_fields(context)
+    with timed(timings, 'save'):
+        handle = BytesIO()
+        doc.save(handle)
+    with timed(timings, 'convert'):
+        doc.to_pdf_bytes()
+    with timed(timings, 'render'):
+        template.render(context)
+    return timings
+
+
+def run_pptx_case(slides, placeholders, table_rows):
+    converter = StubConverter()
+    source = synthetic.pptx_template(slides=slides, placeholders=placeholders, table_rows=table_rows)
+    context = synthetic.pptx_context(placeholders=placeholders)
+
+    timings = OrderedDict()
+    with timed(timings, 'parse'):
+        template = Template(BytesIO(source), converter=converter)
+    with timed(timings, 'clone'):
+        copy = template.copy()
+    with timed(timings, 'replace'):
+        copy.render(context)
+    with timed(timings, 'save'):
+        copy.to_bytes()
+    with timed(timings, 'convert'):
+        copy.to_bytes(format='pdf')
+    return timings
+
+
+class timed:
+    def __init__(self, timings, phase):
+        self.timings = timings
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings[self.phase] = time.perf_counter() - self.start
+
+
+def measure(run, params, repeat):
+    runs = [run(**params) for i in range(repeat)]
+    phases = OrderedDict()
+    for phase in runs[0]:
+        values = [timings[phase] for timings in runs]
+        phases[phase] = {
+            'min': min(values),
+            'median': statistics.median(values),
+            'mean': statistics.mean(values),
+        }
+
+    tracemalloc.start()
+    try:
+        run(**params)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'params': params, 'phases': phases, 'peak_memory': peak}
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(',')]
+
+
+def get_cases(args):
+    for fields in args.fields:
+        yield 'docx', run_docx_case, {'fields': fields, 'tables': 0, 'table_rows': 0, 'html': 0, 'pages': 1}
+    for table_rows in args.table_rows:
+        yield 'docx', run_docx_case, {'fields': 1, 'tables': 1, 'table_rows': table_rows, 'html': 0, 'pages': 1}
+    for html in args.html:
+        yield 'docx', run_docx_case, {'fields': 1, 'tables': 0, 'table_rows': 0, 'html': html, 'pages': 1}
+    for pages in args.pages:
+        yield 'docx', run_docx_case, {'fields': pages, 'tables': 0, 'table_rows': 0, 'html': 0, 'pages': pages}
+    for slides in args.slides:
+        for placeholders in args.placeholders:
+            yield 'pptx', run_pptx_case, {'slides': slides, 'placeholders': placeholders, 'table_rows': 0}
+    for table_rows in args.pptx_table_rows:
+        yield 'pptx', run_pptx_case, {'slides': 1, 'placeholders': 1, 'table_rows': table_rows}
+
+
+def get_environment():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL).stdout.decode().strip()
+    except OSError:
+        revision = ''
+    return {
+        'python': sys.version,
+        'platform': platform.platform(),
+        'python-docx': getattr(docx, '__version__', ''),
+        'python-pptx': getattr(pptx, '__version__', ''),
+        'revision': revision,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--fields', type=parse_sizes, default=[10, 100, 1000],
+                        help='numbers of merge fields in the docx field cases')
+    parser.add_argument('--table-rows', type=parse_sizes, default=[100, 1000],
+                        help='numbers of rows of a TableReplacement')
+    parser.add_argument('--html', type=parse_sizes, default=[],
+                        help='numbers of HTML fragments (needs pandoc)')
+    parser.add_argument('--pages', type=parse_sizes, default=[50],
+                        help='numbers of pages of the docx page cases')
+    parser.add_argument('--slides', type=parse_sizes, default=[10, 100],
+                        help='numbers of slides in the pptx cases')
+    parser.add_argument('--placeholders', type=parse_sizes, default=[4, 32],
+                        help='numbers of placeholders per slide layout')
+    parser.add_argument('--pptx-table-rows', type=parse_sizes, default=[100],
+                        help='numbers of rows of a pptx table')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs per case')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = {'environment': get_environment(), 'cases': []}
+    for kind, run, params in get_cases(args):
+        result = measure(run, params, args.repeat)
+        result['kind'] = kind
+        result['name'] = case_name(kind, params)
+        results['cases'].append(result)
+
+        phases = ' '.join('{}={:.2f}ms'.format(phase, values['median'] * 1000)
+                          for phase, values in result['phases'].items())
+        print('{:<60} {} peak={:.1f}MB'.format(result['name'], phases, result['peak_memory'] / 2 ** 20))
+
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(results, outfile, indent=2)
+
+
+def case_name(kind, params):
+    return '{}[{}]'.format(kind, ','.join('{}={}'.format(key, value) for key, value in sorted(params.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Generators for synthetic templates and contexts of parameterized sizes.
+"""
+from copy import deepcopy
+from io import BytesIO
+
+import docx
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from pptx import Presentation
+from pptx.util import Emu
+
+from bureaucracy import Table
+
+SIMPLE_FIELD = '<w:fldSimple {} w:instr=" MERGEFIELD {} \\* MERGEFORMAT "><w:r><w:t>«{}»</w:t></w:r></w:fldSimple>'
+COMPLEX_FIELD_RUNS = (
+    '<w:r {0}><w:fldChar w:fldCharType="begin"/></w:r>',
+    '<w:r {0}><w:instrText xml:space="preserve"> MERGEFIELD {1} \\* MERGEFORMAT </w:instrText></w:r>',
+    '<w:r {0}><w:fldChar w:fldCharType="separate"/></w:r>',
+    '<w:r {0}><w:t>«{1}»</w:t></w:r>',
+    '<w:r {0}><w:fldChar w:fldCharType="end"/></w:r>',
+)
+
+HTML_FRAGMENT = '<h2>Section {0}</h2><p><strong>bold {0}</strong> - not bold</p><ul><li>one</li><li>two</li></ul>'
+
+
+def docx_template(fields=10, tables=0, html=0, pages=1):
+    """
+    Return the bytes of a docx with merge fields, spread over a number of pages.
+
+    Half of the text fields are simple (fldSimple) fields, the other half complex
+    (fldChar/instrText) ones. Tables and HTML fragments get a paragraph of their own.
+    """
+    document = docx.Document()
+    names = docx_field_names(fields, tables, html)
+    per_page = max(1, len(names) // max(pages, 1))
+
+    for i, name in enumerate(names):
+        paragraph = document.add_paragraph('Field {}: '.format(i))
+        if i % 2:
+            for run in COMPLEX_FIELD_RUNS:
+                paragraph._p.append(parse_xml(run.format(nsdecls('w'), name)))
+        else:
+            paragraph._p.append(parse_xml(SIMPLE_FIELD.format(nsdecls('w'), name, name)))
+        if (i + 1) % per_page == 0 and i + 1 < len(names):
+            document.add_page_break()
+
+    for page in range(len(names) // per_page, pages):
+        document.add_paragraph('Filler page {}'.format(page))
+        document.add_page_break()
+
+    handle = BytesIO()
+    document.save(handle)
+    return handle.getvalue()
+
+
+def docx_field_names(fields=10, tables=0, html=0):
+    return (['text_{}'.format(i) for i in range(fields)] +
+            ['table_{}'.format(i) for i in range(tables)] +
+            ['html_{}'.format(i) for i in range(html)])
+
+
+def docx_context(fields=10, tables=0, table_rows=10, html=0, html_replacement=None):
+    """
+    Return a context for :func:`docx_template`.
+
+    :param html_replacement: the class to build HTML replacements with, only needed if html > 0.
+    """
+    context = {'text_{}'.format(i): 'value {}'.format(i) for i in range(fields)}
+    for i in range(tables):
+        context['table_{}'.format(i)] = Table([['{}.{}'.format(r, c) for c in range(4)] for r in range(table_rows)],
+                                              headers=['one', 'two', 'three', 'four'])
+    for i in range(html):
+        context['html_{}'.format(i)] = html_replacement(HTML_FRAGMENT.format(i))
+    return context
+
+
+def pptx_template(slides=10, placeholders=4, table_rows=0):
+    """
+    Return the bytes of a pptx with ``slides`` slides on a layout with ``placeholders`` text placeholders.
+
+    The placeholders are laid out in a grid and hold '{field_<n>}' template
+    code. With ``table_rows``, every slide gets a table of that many rows too.
+    """
+    presentation = Presentation()
+    layout = presentation.slide_layouts[6]
+    for placeholder in list(layout.placeholders):
+        placeholder.element.getparent().remove(placeholder.element)
+
+    prototype = presentation.slide_layouts[1].placeholders[1].element
+    columns = max(1, int(placeholders ** 0.5))
+    rows = -(-placeholders // columns)
+    width = presentation.slide_width // columns
+    height = presentation.slide_height // rows
+
+    for i in range(placeholders):
+        element = deepcopy(prototype)
+        element.ph.idx = 100 + i
+        element.nvSpPr.cNvPr.id = 100 + i
+        layout.shapes._spTree.append(element)
+        shape = layout.placeholders.get(idx=100 + i)
+        shape.left, shape.top = Emu(width * (i % columns)), Emu(height * (i // columns))
+        shape.width, shape.height = Emu(width), Emu(height)
+        shape.text = '{{field_{}}}'.format(i)
+
+    for i in range(slides):
+        slide = presentation.slides.add_slide(layout)
+        if table_rows:
+            table = slide.shapes.add_table(table_rows, 4, 0, 0, presentation.slide_width, height).table
+            table.cell(0, 0).text = 'table'
+
+    handle = BytesIO()
+    presentation.save(handle)
+    return handle.getvalue()
+
+
+def pptx_context(placeholders=4):
+    return {'field_{}'.format(i): 'value {}'.format(i) for i in range(placeholders)}
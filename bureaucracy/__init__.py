@@ -1,16 +1,38 @@
-from bureaucracy.replacements import (
-    HTMLReplacement, ImageReplacement, TableReplacement, TextReplacement
-)
-from bureaucracy.template import DocxTemplate
+"""
+Templating and pdf generation for docx/pptx files.
 
-HTML = HTMLReplacement
-Text = TextReplacement
-Image = ImageReplacement
-Table = TableReplacement
+The public names are loaded on first access, so importing the package does
+not import python-docx, lxml or pypandoc until they are needed.
+"""
+from importlib import import_module
+
+# public name -> (module, attribute)
+_LAZY_ATTRIBUTES = {
+    'DocxTemplate': ('bureaucracy.template', 'DocxTemplate'),
+    'HTML': ('bureaucracy.replacements', 'HTMLReplacement'),
+    'Text': ('bureaucracy.replacements', 'TextReplacement'),
+    'Image': ('bureaucracy.replacements', 'ImageReplacement'),
+    'Table': ('bureaucracy.replacements', 'TableReplacement'),
+    'SubTemplate': ('bureaucracy.replacements', 'TemplateReplacement'),
+}
 
 __all__ = ['DocxTemplate',
            'HTML',
            'Text',
            'Table',
            'Image',
-           'Document']
+           'SubTemplate']
+
+
+def __getattr__(name):
+    try:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name)) from None
+    value = getattr(import_module(module_name), attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
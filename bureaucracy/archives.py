@@ -0,0 +1,197 @@
+"""
+Writing the documents of a batch render straight into one zip or tar archive.
+
+An archive is a callback for the batch renderers: every rendered document is
+added to it as soon as it completes and dropped, so only the documents in
+flight are kept in memory and nothing goes through the filesystem. Archives
+are written to a path or to any file-like object, which doesn't have to be
+seekable, like a socket or a streaming HTTP response::
+
+    with ZipArchive(response) as archive:
+        DocxBatchRenderer('letter.docx', format='pdf').run(contexts, callback=archive)
+
+The archive ends with a manifest, ``manifest.json``, listing the documents
+it holds and the contexts that failed to render, with their errors.
+"""
+import json
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from io import BytesIO
+
+from bureaucracy.instrumentation import instrumentation
+from bureaucracy.packaging import Compression
+
+__all__ = ['BaseArchive', 'ZipArchive', 'TarArchive']
+
+
+class BaseArchive:
+    """
+    Collects rendered documents and failures into an archive. Archives are safe to write to from several threads.
+
+    Subclasses implement :meth:`_add` and :meth:`_close` for a type of archive.
+
+    :param manifest: the name of the manifest entry, written when the archive is closed. None leaves it out.
+    """
+
+    def __init__(self, manifest: str = 'manifest.json'):
+        self.manifest = manifest
+        self.names = set()
+        self.failures = []
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def __call__(self, item):
+        """
+        Add a :class:`bureaucracy.batch.BatchItem`: its document, or its failure to the manifest.
+        """
+        if not item.ok:
+            self.fail(item.index, item.name, item.error, item.problems)
+        elif item.data is None:
+            raise ValueError("Item {} was written to {}, render without an output directory to archive it".format(
+                item.index, item.path))
+        else:
+            self.write(item.name, item.data)
+
+    def exists(self, name: str) -> bool:
+        return name in self.names
+
+    def write(self, name: str, data: bytes):
+        """
+        Add the document ``data`` as ``name``.
+        """
+        with self._lock:
+            if self.closed:
+                raise ValueError("The archive is closed")
+            if name in self.names:
+                raise ValueError("The archive has a document called '{}' already".format(name))
+            with instrumentation.timer('archive.write'):
+                self._add(name, data)
+            self.names.add(name)
+        instrumentation.count('archive.bytes_in', len(data))
+
+    def fail(self, index: int, name: str, error: str, problems=None):
+        """
+        Record that the document ``name`` for the context at ``index`` could not be rendered.
+
+        :param problems: the :class:`bureaucracy.preflight.Problem` instances found with the context, if any.
+        """
+        failure = {'index': index, 'name': name, 'error': error}
+        if problems:
+            failure['problems'] = [problem.as_dict() for problem in problems]
+        with self._lock:
+            self.failures.append(failure)
+
+    def get_manifest(self) -> dict:
+        return {
+            'documents': sorted(self.names - {self.manifest}),
+            'failures': sorted(self.failures, key=lambda failure: failure['index']),
+        }
+
+    def close(self):
+        """
+        Write the manifest and finish the archive. Closing an archive again does nothing.
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                if self.manifest:
+                    self._add(self.manifest, json.dumps(self.get_manifest(), indent=2).encode('utf-8'))
+            finally:
+                self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _add(self, name, data):
+        raise NotImplementedError("You must implement the `_add` method.")
+
+    def _close(self):
+        raise NotImplementedError("You must implement the `_close` method.")
+
+
+class ZipArchive(BaseArchive):
+    """
+    Writes the documents to a zip file.
+
+    :param outfile: a path or a file-like object opened for writing in binary mode.
+    :param compression: a :class:`bureaucracy.packaging.Compression` for the entries. By default pdfs are deflated
+      and docx and pptx documents, which are zip files already, are stored.
+    :param append: add to an existing zip file at the path ``outfile``, like when resuming an interrupted run. Its
+      documents count as written and its manifest is replaced: the zip file is rewritten without it first.
+
+    See :class:`BaseArchive` for the other options.
+    """
+
+    def __init__(self, outfile, compression: Compression = None, append: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.compression = compression or Compression.DEFAULT
+        if append:
+            if hasattr(outfile, 'write'):
+                raise ValueError("Only zip files at a path can be appended to")
+            if self.manifest:
+                _remove_entry(outfile, self.manifest)
+        self._zipfile = zipfile.ZipFile(outfile, 'a' if append else 'w')
+        self.names.update(self._zipfile.namelist())
+
+    def _add(self, name, data):
+        compress_type, level = self.compression.options(name)
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = compress_type
+        info.external_attr = 0o644 << 16
+        self._zipfile.writestr(info, data, compresslevel=level)
+
+    def _close(self):
+        self._zipfile.close()
+
+
+def _remove_entry(path, name):
+    """
+    Rewrite the zip file at ``path`` without the entry ``name``, if it has one.
+    """
+    with zipfile.ZipFile(path) as zin:
+        if name not in zin.namelist():
+            return
+        with zipfile.ZipFile(path + '.part', 'w') as zout:
+            for info in zin.infolist():
+                if info.filename != name:
+                    zout.writestr(info, zin.read(info))
+    os.replace(path + '.part', path)
+
+
+class TarArchive(BaseArchive):
+    """
+    Writes the documents to a tar file, in stream mode.
+
+    :param outfile: a path or a file-like object opened for writing in binary mode.
+    :param compression: '' for an uncompressed tar file, or 'gz', 'bz2' or 'xz'.
+
+    See :class:`BaseArchive` for the other options.
+    """
+
+    def __init__(self, outfile, compression: str = '', **kwargs):
+        if compression not in ('', 'gz', 'bz2', 'xz'):
+            raise ValueError("Unknown tar compression '{}', use '', 'gz', 'bz2' or 'xz'".format(compression))
+        super().__init__(**kwargs)
+        mode = 'w|{}'.format(compression)
+        if hasattr(outfile, 'write'):
+            self._tarfile = tarfile.open(fileobj=outfile, mode=mode)
+        else:
+            self._tarfile = tarfile.open(outfile, mode=mode)
+
+    def _add(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = time.time()
+        info.mode = 0o644
+        self._tarfile.addfile(info, BytesIO(data))
+
+    def _close(self):
+        self._tarfile.close()
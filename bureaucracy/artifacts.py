@@ -0,0 +1,99 @@
+"""
+Compiled templates as bytes, to load them again without analysing them.
+
+Loading a template is quick, analysing it is not: finding the fields of a
+docx template and the order of the placeholders of every layout of a pptx
+template takes most of the time a new worker needs before its first render.
+An artifact holds the package of a template together with that analysis::
+
+    artifact = DocxTemplate('letter.docx').to_artifact()
+    template = DocxTemplate.from_artifact(artifact)  # no field scanning
+
+Templates are pickled as artifacts, so the batch renderers and process pools
+send the analysis along with the template.
+
+An artifact starts with a magic string, the version of its format and a
+SHA-256 checksum of the rest: a JSON header with the analysis and the sizes of
+the binary parts, followed by those parts. Artifacts of another version, or
+that don't match their checksum, are rejected with an :class:`ArtifactError`;
+compile the template again.
+"""
+import hashlib
+import json
+import struct
+
+from bureaucracy.instrumentation import instrumentation
+
+__all__ = ['ARTIFACT_VERSION', 'ArtifactError', 'dump_artifact', 'load_artifact', 'is_artifact']
+
+MAGIC = b'BUREAUCRACY\x00'
+
+# bump when the analysis of a template changes
+ARTIFACT_VERSION = 1
+
+# magic, version, checksum of the rest, length of the header
+_PREFIX = struct.Struct('>12sH32sI')
+
+
+class ArtifactError(ValueError):
+    pass
+
+
+def is_artifact(data) -> bool:
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def dump_artifact(kind: str, analysis: dict, blobs: dict) -> bytes:
+    """
+    Return an artifact of a ``kind`` ('docx' or 'pptx') template.
+
+    :param analysis: the analysis of the template, which must be serializable as JSON.
+    :param blobs: a dict of names and bytes, like the package of the template.
+    """
+    header = json.dumps({
+        'kind': kind,
+        'analysis': analysis,
+        'blobs': [[name, len(blob)] for name, blob in blobs.items()],
+    }, separators=(',', ':')).encode('utf-8')
+
+    digest = hashlib.sha256(header)
+    for blob in blobs.values():
+        digest.update(blob)
+    data = b''.join([_PREFIX.pack(MAGIC, ARTIFACT_VERSION, digest.digest(), len(header)), header] +
+                    list(blobs.values()))
+    instrumentation.count('artifact.bytes_out', len(data), kind=kind)
+    return data
+
+
+def load_artifact(data: bytes, kind: str):
+    """
+    Check an artifact of a ``kind`` template and return its analysis and blobs.
+    """
+    with instrumentation.timer('artifact.load', kind=kind):
+        if len(data) < _PREFIX.size or not is_artifact(data):
+            raise ArtifactError("Not a compiled template")
+        _, version, checksum, header_length = _PREFIX.unpack_from(data)
+        if version != ARTIFACT_VERSION:
+            raise ArtifactError("The template was compiled for version {} of the format, this is version {}".format(
+                version, ARTIFACT_VERSION))
+
+        body = memoryview(data)[_PREFIX.size:]
+        if hashlib.sha256(body).digest() != checksum:
+            raise ArtifactError("The compiled template is corrupt, its checksum does not match")
+
+        header = json.loads(bytes(body[:header_length]).decode('utf-8'))
+        if header['kind'] != kind:
+            raise ArtifactError("This is a compiled {} template, not a {} template".format(header['kind'], kind))
+
+        blobs = {}
+        offset = header_length
+        for name, size in header['blobs']:
+            blobs[name] = bytes(body[offset:offset + size])
+            offset += size
+    return header['analysis'], blobs
+
+
+def _from_artifact(cls, artifact, options):
+    # Unpickles a template, which the __reduce__ of templates pickle as an artifact. The converter, cache and profiler
+    # belong to the process, the unpickled template uses the defaults.
+    return cls.from_artifact(artifact, **options)
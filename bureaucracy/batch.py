@@ -0,0 +1,316 @@
+"""
+Render many documents from a single template in a pool of processes.
+
+The template is analysed once, in the calling process, and sent to the
+workers as an artifact (see :mod:`bureaucracy.artifacts`), so they only
+have to load it. Contexts
+are streamed to the workers, so they don't all have to be in memory at the
+same time, and the outputs are written to a directory by the workers
+themselves or handed to a callback in the calling process.
+"""
+import logging
+import os
+import time
+import traceback
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+
+logger = logging.getLogger('bureaucracy')
+
+__all__ = ['BaseBatchRenderer', 'BatchItem', 'BatchReport', 'DocxBatchRenderer']
+
+# state of a worker process: the renderer and the template it loaded
+_worker = {}
+
+
+class BatchItem:
+    """
+    The outcome of rendering a single context.
+
+    :param index: the position of the context in the input.
+    :param name: the file name of the output.
+    :param path: the path the output was written to, if rendering to a directory.
+    :param data: the rendered document, if not rendering to a directory.
+    :param error: a description of the error if rendering failed.
+    :param traceback: the formatted traceback if rendering failed.
+    :param problems: the problems found with the context, if it was
+      rejected before rendering, see :mod:`bureaucracy.preflight`.
+    :param duration: the time spent rendering in seconds.
+    """
+
+    def __init__(self, index, name, path=None, data=None, error=None, traceback=None, problems=None, duration=0.0):
+        self.index = index
+        self.name = name
+        self.path = path
+        self.data = data
+        self.error = error
+        self.traceback = traceback
+        self.problems = problems
+        self.duration = duration
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = 'ok' if self.ok else 'failed: {}'.format(self.error)
+        return '<BatchItem {} {!r} {}>'.format(self.index, self.name, status)
+
+
+class BatchReport:
+    """
+    Progress counters and errors of a batch run.
+    """
+
+    def __init__(self):
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def completed(self):
+        return self.succeeded + self.failed
+
+    @property
+    def pending(self):
+        return self.submitted - self.completed
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def throughput(self):
+        """
+        The number of documents completed per second.
+        """
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed else 0.0
+
+    def add(self, item: BatchItem):
+        if item.ok:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+            self.errors.append(item)
+
+    def __repr__(self):
+        return '<BatchReport {} succeeded, {} failed, {} skipped, {} pending>'.format(
+            self.succeeded, self.failed, self.skipped, self.pending)
+
+
+class BaseBatchRenderer:
+    """
+    Render a template for many contexts in a pool of worker processes.
+
+    Subclasses implement :meth:`load` and :meth:`render_one` for a type of
+    template, and :meth:`compile` to analyse it before it's sent to the
+    workers. The renderer itself is sent to every worker process, so it (and
+    the contexts) must be picklable.
+
+    :param template: a path or file-like object with the template, or with a compiled template artifact.
+    :param workers: the number of worker processes, defaults to the number
+      of CPUs. With 0, everything is rendered in the current process.
+    :param filename: a format string for the output file names, formatted
+      with ``index``, ``ext`` and the keys of the context, or a callable
+      taking the index and context and returning the file name.
+    :param max_pending: the maximum number of contexts handed to the pool
+      but not completed yet, defaults to four per worker.
+    """
+    extension = None
+
+    def __init__(self, template, workers=None, filename='{index:05d}.{ext}', max_pending=None):
+        if hasattr(template, 'read'):
+            self.source = template.read()
+        else:
+            with open(template, 'rb') as infile:
+                self.source = infile.read()
+        self.workers = os.cpu_count() if workers is None else workers
+        self.filename = filename
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+
+    def compile(self):
+        """
+        Analyse the template in :attr:`source` once, and replace it by an artifact that :meth:`load` reads.
+        """
+
+    def load(self):
+        """
+        Load and analyse the template, once per worker process.
+        """
+        raise NotImplementedError("You must implement the `load` method.")
+
+    def render_one(self, template, context):
+        """
+        Render the loaded template with a context and return the document as bytes.
+        """
+        raise NotImplementedError("You must implement the `render_one` method.")
+
+    def get_filename(self, index, context):
+        """
+        Return the file name of the output for a context, relative to the output directory or archive.
+
+        :raises ValueError: if the name is absolute or points outside of the output directory.
+        """
+        if callable(self.filename):
+            name = self.filename(index, context)
+        else:
+            fields = dict(context) if isinstance(context, Mapping) else {}
+            fields.update(index=index, ext=self.extension)
+            name = self.filename.format_map(fields)
+
+        # names are made from the contexts, which should not be able to write anywhere else
+        normalized = os.path.normpath(name)
+        if os.path.isabs(normalized) or normalized.split(os.sep)[0] in (os.curdir, os.pardir):
+            raise ValueError("The file name '{}' is not inside the output directory".format(name))
+        return name
+
+    def run(self, contexts, outdir=None, callback=None, progress=None, skip=None):
+        """
+        Render the template for every context.
+
+        :param contexts: an iterable of contexts, consumed as the workers
+          become available.
+        :param outdir: if given, the workers write the documents to this
+          directory. Otherwise the rendered bytes are in :attr:`BatchItem.data`.
+        :param callback: called with every :class:`BatchItem`, in order of
+          completion.
+        :param progress: called with the :class:`BatchReport` after every item.
+        :param skip: called with the index and file name of every context,
+          contexts for which it returns True are not rendered.
+        :return: the :class:`BatchReport`.
+        """
+        if outdir is not None:
+            os.makedirs(outdir, exist_ok=True)
+
+        report = BatchReport()
+
+        def complete(item):
+            report.add(item)
+            if not item.ok:
+                logger.warning("Rendering item %s (%s) failed: %s", item.index, item.name, item.error)
+            if callback is not None:
+                callback(item)
+            if progress is not None:
+                progress(report)
+
+        if not self.workers:
+            _init_worker(self)
+            try:
+                for index, context in enumerate(contexts):
+                    name, failure = self._get_name(index, context)
+                    if failure is None and skip is not None and skip(index, name):
+                        report.skipped += 1
+                        continue
+                    report.submitted += 1
+                    complete(failure or _render_item(index, context, name, outdir))
+            finally:
+                _worker.clear()
+            report.finished = time.perf_counter()
+            return report
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self,)) as executor:
+            pending = {}
+
+            def collect(return_when):
+                done, _ = wait(pending, return_when=return_when)
+                for future in done:
+                    index, name = pending.pop(future)
+                    try:
+                        item = future.result()
+                    except Exception as exc:
+                        # the context could not be sent to the worker, or the worker died
+                        item = BatchItem(index, name, error=repr(exc), traceback=traceback.format_exc())
+                    complete(item)
+
+            for index, context in enumerate(contexts):
+                name, failure = self._get_name(index, context)
+                if failure is not None:
+                    report.submitted += 1
+                    complete(failure)
+                    continue
+                if skip is not None and skip(index, name):
+                    report.skipped += 1
+                    continue
+                if len(pending) >= self.max_pending:
+                    collect(FIRST_COMPLETED)
+                future = executor.submit(_render_item, index, context, name, outdir)
+                pending[future] = (index, name)
+                report.submitted += 1
+
+            while pending:
+                collect(FIRST_COMPLETED)
+
+        report.finished = time.perf_counter()
+        return report
+
+    def _get_name(self, index, context):
+        """
+        Return the file name for a context and None, or None and a failed :class:`BatchItem` if there is none.
+        """
+        try:
+            return self.get_filename(index, context), None
+        except Exception as exc:
+            return None, BatchItem(index, None, error=repr(exc), traceback=traceback.format_exc())
+
+
+class DocxBatchRenderer(BaseBatchRenderer):
+    """
+    Render a docx template for many contexts in a pool of processes.
+
+    :param template: a path or file-like object with the template.
+    :param strict: check every context before rendering it, see :class:`bureaucracy.DocxTemplate`.
+      Rejected contexts have the problems found in :attr:`BatchItem.problems`.
+    :param format: 'docx' or 'pdf'. Every worker converts its own documents.
+    :param compression: a :class:`bureaucracy.packaging.Compression` for the documents.
+
+    See :class:`BaseBatchRenderer` for the other options.
+    """
+    extension = 'docx'
+
+    def __init__(self, template, strict=False, format='docx', compression=None, **kwargs):
+        super().__init__(template, **kwargs)
+        self.strict = strict
+        self.extension = format
+        self.compression = compression
+        self.compile()
+
+    def compile(self):
+        from bureaucracy.artifacts import is_artifact
+        from bureaucracy.template import DocxTemplate
+        if not is_artifact(self.source):
+            self.source = DocxTemplate(BytesIO(self.source), strict=self.strict).to_artifact()
+
+    def load(self):
+        from bureaucracy.template import DocxTemplate
+        return DocxTemplate.from_artifact(self.source, strict=self.strict, compression=self.compression)
+
+    def render_one(self, template, context):
+        return template.render(context, format=self.extension)
+
+
+def _init_worker(renderer: BaseBatchRenderer):
+    _worker['renderer'] = renderer
+    _worker['template'] = renderer.load()
+
+
+def _render_item(index, context, name, outdir=None):
+    renderer = _worker['renderer']
+    start = time.perf_counter()
+    try:
+        data = renderer.render_one(_worker['template'], context)
+        path = None
+        if outdir is not None:
+            path = os.path.join(outdir, name)
+            with open(path, 'wb') as outfile:
+                outfile.write(data)
+            data = None
+    except Exception as exc:
+        return BatchItem(index, name, error=repr(exc), traceback=traceback.format_exc(),
+                         problems=getattr(exc, 'problems', None), duration=time.perf_counter() - start)
+    return BatchItem(index, name, path=path, data=data, duration=time.perf_counter() - start)
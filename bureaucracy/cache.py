@@ -0,0 +1,260 @@
+"""
+Caching of rendered documents.
+
+Rendering the same template with the same context gives the same document,
+so templates given a cache look the output up before rendering::
+
+    from bureaucracy.cache import DirectoryCache
+
+    template = DocxTemplate('invoice.docx', cache=DirectoryCache('/var/cache/invoices', max_bytes=2 ** 30))
+    template.render(context, format='pdf')  # rendered and converted once, read from the cache afterwards
+
+Entries are keyed by a hash of the template's contents and a
+:func:`fingerprint` of the context. Contexts with values that can't be
+fingerprinted are rendered without the cache.
+"""
+import datetime
+import decimal
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from bureaucracy.instrumentation import instrumentation
+from bureaucracy.utils import SharedService
+
+__all__ = ['fingerprint', 'cache_key', 'BaseCache', 'MemoryCache', 'DirectoryCache']
+
+logger = logging.getLogger('bureaucracy')
+
+# bump when a change to the rendering changes the output for the same template and context
+CACHE_VERSION = 1
+
+_TEXT_TYPES = (decimal.Decimal, uuid.UUID)
+_DATE_TYPES = (datetime.datetime, datetime.date, datetime.time)
+
+
+def fingerprint(value) -> str:
+    """
+    Return a stable hash of a context, or any value in it.
+
+    Equal values have the same fingerprint, in every process. Mappings,
+    sequences, sets, strings, bytes, numbers, dates and None are supported,
+    as well as objects with a ``fingerprint()`` method, which should return
+    one of those. Replacements implement it by returning their data.
+
+    :raises TypeError: if the value contains anything else.
+    """
+    digest = hashlib.sha256()
+    _feed(digest, value)
+    return digest.hexdigest()
+
+
+def _feed(digest, value):
+    if value is None:
+        digest.update(b'N')
+    elif isinstance(value, bool):
+        digest.update(b'T' if value else b'F')
+    elif isinstance(value, int):
+        digest.update(b'i%d;' % value)
+    elif isinstance(value, float):
+        digest.update(b'f' + repr(value).encode('ascii') + b';')
+    elif isinstance(value, str):
+        _feed_bytes(digest, b's', value.encode('utf-8'))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        _feed_bytes(digest, b'b', bytes(value))
+    elif isinstance(value, _TEXT_TYPES + _DATE_TYPES):
+        text = value.isoformat() if isinstance(value, _DATE_TYPES) else str(value)
+        _feed_bytes(digest, b'v', '{}:{}'.format(type(value).__name__, text).encode('utf-8'))
+    elif isinstance(value, Mapping):
+        # hash the keys first, so the order of the items doesn't matter
+        items = sorted((fingerprint(key), item) for key, item in value.items())
+        digest.update(b'd%d:' % len(items))
+        for key, item in items:
+            digest.update(key.encode('ascii'))
+            _feed(digest, item)
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'l%d:' % len(value))
+        for item in value:
+            _feed(digest, item)
+    elif isinstance(value, (set, frozenset)):
+        digest.update(b'S%d:' % len(value))
+        for item in sorted(fingerprint(item) for item in value):
+            digest.update(item.encode('ascii'))
+    elif callable(getattr(value, 'fingerprint', None)):
+        cls = type(value)
+        _feed_bytes(digest, b'o', '{}.{}'.format(cls.__module__, cls.__qualname__).encode('utf-8'))
+        _feed(digest, value.fingerprint())
+    else:
+        raise TypeError("Can't fingerprint {!r}".format(value))
+
+
+def _feed_bytes(digest, tag, data):
+    digest.update(tag + b'%d:' % len(data))
+    digest.update(data)
+
+
+def cache_key(template_hash: str, context, *extra) -> str:
+    """
+    Return the cache key for rendering a template with a context, or None if the context can't be fingerprinted.
+
+    :param template_hash: a hash of the contents of the template.
+    :param extra: anything else the output depends on, like the template engine.
+    """
+    try:
+        return fingerprint([CACHE_VERSION, template_hash, context] + list(extra))
+    except TypeError as exc:
+        logger.debug("Not caching the render: %s", exc)
+        return None
+
+
+class BaseCache(SharedService):
+    """
+    Storage for rendered documents, as bytes, by key.
+
+    Keys consist of letters, digits and dots.
+    """
+
+    def get(self, key: str):
+        """
+        Return the data stored under ``key``, or None.
+        """
+        raise NotImplementedError("You must implement the `get` method.")
+
+    def set(self, key: str, data: bytes):
+        raise NotImplementedError("You must implement the `set` method.")
+
+    def get_or_render(self, key: str, render, format: str = None) -> bytes:
+        """
+        Return the data under ``key``, calling ``render`` to produce and store it if it's not in the cache.
+
+        Without a key, the data is rendered and not stored.
+        """
+        if key is None:
+            return render()
+        data = self.get(key)
+        if data is not None:
+            instrumentation.count('cache.hits', format=format)
+            return data
+        instrumentation.count('cache.misses', format=format)
+        data = render()
+        self.set(key, data)
+        return data
+
+
+class MemoryCache(BaseCache):
+    """
+    Keeps the most recently used documents in memory.
+
+    :param max_entries: the maximum number of documents to keep.
+    :param max_bytes: the maximum total size of the documents to keep.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def set(self, key, data):
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self.size += len(data)
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     (self.max_bytes is not None and self.size > self.max_bytes)):
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class DirectoryCache(BaseCache):
+    """
+    Keeps documents as files in a directory, up to a total size.
+
+    When the directory grows over ``max_bytes``, the least recently used
+    files are removed. Several processes can share the directory.
+
+    :param path: the directory, created if it doesn't exist.
+    :param max_bytes: the maximum total size of the files.
+    """
+
+    def __init__(self, path, max_bytes: int = 256 * 2 ** 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.size = sum(size for _, _, size in self._entries())
+
+    def _path(self, key):
+        if not key or not all(char.isalnum() or char == '.' for char in key) or key.startswith('.'):
+            raise ValueError("Invalid cache key '{}'".format(key))
+        return os.path.join(self.path, key)
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.path) as scan:
+            for entry in scan:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime_ns, entry.path, stat.st_size))
+        return entries
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as infile:
+                data = infile.read()
+            # the modification time marks the last use, for the eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def set(self, key, data):
+        path = self._path(key)
+        handle, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.tmp-')
+        with os.fdopen(handle, 'wb') as outfile:
+            outfile.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # other processes may have added or removed files, so start from what's on disk
+        entries = sorted(self._entries())
+        self.size = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
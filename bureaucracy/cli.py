@@ -0,0 +1,331 @@
+"""
+Command line interface to render a template for many contexts::
+
+    bureaucracy letter.docx contexts.jsonl letters/
+    bureaucracy deck.pptx contexts.csv decks.zip --format pdf --workers 4
+
+Contexts are read one at a time from a JSON lines or CSV file (or stdin),
+rendered in a pool of worker processes and written to a directory, or
+streamed into a zip or tar file with a manifest of the failures. When
+converting to pdf, the rendered documents are collected in the main process
+and converted in batches, so LibreOffice starts once per batch instead of
+once per document.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bureaucracy.archives import TarArchive, ZipArchive
+from bureaucracy.batch import DocxBatchRenderer
+from bureaucracy.converters import SofficeConverter, UnoserverConverter
+from bureaucracy.packaging import Compression
+
+__all__ = ['main']
+
+FORMATS = {
+    '.docx': ('docx', 'pdf'),
+    '.pptx': ('pptx', 'pdf'),
+}
+
+# extension of the output -> compression of the tar file
+TAR_EXTENSIONS = {
+    '.tar': '',
+    '.tar.gz': 'gz',
+    '.tgz': 'gz',
+    '.tar.bz2': 'bz2',
+    '.tar.xz': 'xz',
+}
+
+
+def read_jsonl(infile):
+    """
+    Yield the contexts in a JSON lines file, one JSON object per line.
+    """
+    for lineno, line in enumerate(infile, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            context = json.loads(line)
+        except ValueError as exc:
+            raise ValueError("Line {} is not valid JSON: {}".format(lineno, exc)) from exc
+        if not isinstance(context, dict):
+            raise ValueError("Line {} is not a JSON object".format(lineno))
+        yield context
+
+
+def read_csv(infile):
+    """
+    Yield the rows of a CSV file with a header row as contexts.
+    """
+    yield from csv.DictReader(infile)
+
+
+READERS = {
+    'jsonl': read_jsonl,
+    'csv': read_csv,
+}
+
+
+class DirectoryOutput:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.path, name))
+
+    def write(self, name, data):
+        # write to a temporary file first, so an interrupted run does not leave a partial output to resume from
+        path = os.path.join(self.path, name)
+        with open(path + '.part', 'wb') as outfile:
+            outfile.write(data)
+        os.replace(path + '.part', path)
+
+    def fail(self, index, name, error, problems=None):
+        # failures are reported with --report
+        pass
+
+    def close(self):
+        pass
+
+
+def get_output(parser, args):
+    path = args.output
+    lower = path.lower()
+    if lower.endswith('.zip'):
+        return ZipArchive(path, append=args.resume and os.path.exists(path))
+    for extension, compression in TAR_EXTENSIONS.items():
+        if lower.endswith(extension):
+            if args.resume:
+                parser.error("Tar files can't be resumed, write to a directory or a .zip file")
+            return TarArchive(path, compression=compression)
+    return DirectoryOutput(path)
+
+
+class Job:
+    """
+    Writes the rendered documents to the output, converting them to pdf in batches if needed.
+    """
+
+    def __init__(self, output, converter=None, batch_size=20, converter_workers=1, source_format=None):
+        self.output = output
+        self.converter = converter
+        self.batch_size = batch_size
+        self.source_format = source_format
+        self.written = 0
+        self.failures = []
+        self._batch = []
+        self._futures = []
+        self._lock = threading.Lock()
+        if converter is not None:
+            self._executor = ThreadPoolExecutor(max_workers=converter_workers)
+            # don't keep more rendered documents in memory than the converters can take
+            self._slots = threading.BoundedSemaphore(converter_workers * 2)
+
+    def output_name(self, name):
+        if self.converter is None:
+            return name
+        return os.path.splitext(name)[0] + '.pdf'
+
+    def __call__(self, item):
+        if not item.ok:
+            self._fail(item.index, item.name, item.error, item.problems)
+        elif self.converter is None:
+            self._write(item.index, item.name, item.data)
+        else:
+            self._batch.append(item)
+            if len(self._batch) >= self.batch_size:
+                self._submit()
+
+    def finish(self):
+        try:
+            if self.converter is not None:
+                if self._batch:
+                    self._submit()
+                self._executor.shutdown(wait=True)
+                # the failures of single documents are recorded, anything else should not go unnoticed
+                for future in self._futures:
+                    future.result()
+        finally:
+            self.output.close()
+
+    def _submit(self):
+        batch, self._batch = self._batch, []
+        self._slots.acquire()
+        future = self._executor.submit(self._convert, batch)
+        future.add_done_callback(lambda future: self._slots.release())
+        self._futures.append(future)
+
+    def _convert(self, batch):
+        try:
+            converted = self.converter.convert_many([item.data for item in batch], self.source_format, 'pdf')
+        except Exception:
+            # find out which documents could not be converted
+            converted = []
+            for item in batch:
+                try:
+                    converted.append(self.converter.convert(item.data, self.source_format, 'pdf'))
+                except Exception as exc:
+                    converted.append(exc)
+
+        for item, data in zip(batch, converted):
+            if isinstance(data, Exception):
+                self._fail(item.index, self.output_name(item.name), repr(data))
+            else:
+                self._write(item.index, self.output_name(item.name), data)
+
+    def _write(self, index, name, data):
+        try:
+            self.output.write(name, data)
+        except Exception as exc:
+            self._fail(index, name, repr(exc))
+            return
+        with self._lock:
+            self.written += 1
+
+    def _fail(self, index, name, error, problems=None):
+        failure = {'index': index, 'name': name, 'error': error}
+        if problems:
+            failure['problems'] = [problem.as_dict() for problem in problems]
+        with self._lock:
+            self.failures.append(failure)
+        self.output.fail(index, name, error, problems)
+
+
+class ProgressPrinter:
+    def __init__(self, stream, interval=2.0):
+        self.stream = stream
+        self.interval = interval
+        self.last = time.perf_counter()
+
+    def __call__(self, report):
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.stream.write("{} rendered, {} failed, {} skipped, {:.1f} documents/s\n".format(
+                report.succeeded, report.failed, report.skipped, report.throughput))
+            self.stream.flush()
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='bureaucracy', description="Render a docx or pptx template for every context in a JSONL or CSV file.")
+    parser.add_argument('template', help="the docx or pptx template")
+    parser.add_argument('contexts', help="a JSON lines or CSV file with one context per line, '-' for stdin")
+    parser.add_argument('output', help="the directory to write the documents to, or a .zip, .tar, .tar.gz, .tgz, "
+                        ".tar.bz2 or .tar.xz file")
+    parser.add_argument('--input-format', choices=sorted(READERS),
+                        help="the format of the contexts, by default guessed from the file extension")
+    parser.add_argument('--format', choices=['docx', 'pptx', 'pdf'], help="the output format, defaults to the "
+                        "format of the template")
+    parser.add_argument('--filename', default='{index:05d}.{ext}',
+                        help="the file name of every output, formatted with index, ext and the context "
+                        "(default: %(default)s)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="the number of render processes, 0 renders in this process (default: CPU count)")
+    parser.add_argument('--strict', action='store_true',
+                        help="check every context against the docx template before rendering it")
+    parser.add_argument('--resume', action='store_true', help="skip the outputs that already exist")
+    parser.add_argument('--report', metavar='FILE',
+                        help="write every failure to this file, as a JSON line with the error and problems")
+    parser.add_argument('--batch-size', type=int, default=20, help="the number of documents per pdf conversion "
+                        "(default: %(default)s)")
+    parser.add_argument('--converter-workers', type=int, default=1,
+                        help="the number of pdf conversions to run at once (default: %(default)s)")
+    parser.add_argument('--soffice', default='soffice', help="the soffice executable (default: %(default)s)")
+    parser.add_argument('--unoserver', metavar='HOST:PORT', help="convert with a running unoserver instead of soffice")
+    parser.add_argument('--compression', choices=['store', 'fast', 'default', 'smallest'],
+                        help="how much to compress the documents, by default 'store' for documents that are converted "
+                        "to pdf and 'default' otherwise")
+    parser.add_argument('--prune', action='store_true',
+                        help="drop the slide layouts, masters and media a rendered pptx does not use")
+    parser.add_argument('--quiet', action='store_true', help="don't print progress")
+    return parser
+
+
+def get_converter(args):
+    if args.unoserver:
+        host, _, port = args.unoserver.rpartition(':')
+        return UnoserverConverter(host=host or '127.0.0.1', port=int(port))
+    return SofficeConverter(executable=args.soffice, batch_size=args.batch_size, workers=args.converter_workers)
+
+
+def get_renderer(args, template_format, output_format):
+    # render the template's own format in the workers, the conversion to pdf is done in batches by the job
+    if args.compression:
+        compression = Compression.get(args.compression)
+    else:
+        # compressing documents that only go into the converter is wasted work
+        compression = Compression.STORE if output_format == 'pdf' else None
+
+    if template_format == 'docx':
+        return DocxBatchRenderer(args.template, strict=args.strict, compression=compression, workers=args.workers,
+                                 filename=args.filename)
+
+    from bureaucracy.powerpoint.batch import BatchRenderer
+    return BatchRenderer(args.template, compression=compression, prune_unused=args.prune, workers=args.workers,
+                         filename=args.filename)
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+
+    extension = os.path.splitext(args.template)[1].lower()
+    if extension not in FORMATS:
+        parser.error("The template should be a .docx or .pptx file")
+    template_format = extension[1:]
+    output_format = args.format or template_format
+    if output_format not in FORMATS[extension]:
+        parser.error("A {} template can't be rendered to {}".format(template_format, output_format))
+
+    if args.prune and template_format != 'pptx':
+        parser.error("Only pptx templates can be pruned")
+
+    input_format = args.input_format or ('csv' if args.contexts.lower().endswith('.csv') else 'jsonl')
+
+    # load the template and open the contexts before creating the output, which is not removed on errors
+    renderer = get_renderer(args, template_format, output_format)
+    infile = sys.stdin if args.contexts == '-' else open(args.contexts, newline='', encoding='utf-8')
+    try:
+        output = get_output(parser, args)
+        converter = get_converter(args) if output_format == 'pdf' else None
+        job = Job(output, converter=converter, batch_size=args.batch_size, converter_workers=args.converter_workers,
+                  source_format=template_format)
+        skip = (lambda index, name: output.exists(job.output_name(name))) if args.resume else None
+        progress = None if args.quiet else ProgressPrinter(sys.stderr)
+
+        try:
+            report = renderer.run(READERS[input_format](infile), callback=job, progress=progress, skip=skip)
+        finally:
+            # an archive is finished whatever happens, so it holds the documents written so far
+            job.finish()
+    except ValueError as exc:
+        sys.stderr.write("{}: error: {}\n".format(parser.prog, exc))
+        return 2
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+
+    elapsed = time.perf_counter() - report.started
+    print("Wrote {} of {} documents in {:.1f}s ({:.1f} documents/s), {} failed, {} skipped.".format(
+        job.written, report.submitted, elapsed, job.written / elapsed if elapsed else 0.0,
+        len(job.failures), report.skipped))
+    failures = sorted(job.failures, key=lambda failure: failure['index'])
+    for failure in failures:
+        print("  {index} ({name}): {error}".format(**failure))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as outfile:
+            for failure in failures:
+                outfile.write(json.dumps(failure) + '\n')
+    return 1 if job.failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Conversion of rendered documents to other formats, like pdf.
+
+Converting is done by LibreOffice, which only works with files and takes a
+while to start. The converters here amortize that cost: they convert
+batches of documents in a single call, keep a LibreOffice user profile
+around between calls, or hand the work to a LibreOffice that keeps running
+(unoserver).
+"""
+import atexit
+import glob
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+
+from bureaucracy.instrumentation import instrumentation
+from bureaucracy.utils import SharedService
+
+__all__ = ['ConversionError', 'BaseConverter', 'SofficeConverter', 'UnoserverConverter', 'get_default_converter',
+           'set_default_converter']
+
+
+class ConversionError(Exception):
+    pass
+
+
+class BaseConverter(SharedService):
+    """
+    Converts documents, given as bytes, from one format to another.
+    """
+
+    def fingerprint(self):
+        """
+        Return the options of the converter that change its output, as plain values, for cache keys.
+
+        The class of the converter is part of the key already, converters with such options should return them here.
+        """
+        return None
+
+    def convert(self, data: bytes, source_format: str, target_format: str) -> bytes:
+        return self.convert_many([data], source_format, target_format)[0]
+
+    def convert_many(self, documents, source_format: str, target_format: str) -> list:
+        """
+        Convert several documents of the same format at once.
+
+        :return: the converted documents, in the same order.
+        """
+        raise NotImplementedError("You must implement the `convert_many` method.")
+
+    def to_images(self, data: bytes, source_format: str, dpi: int = 96, executable: str = 'pdftoppm') -> list:
+        """
+        Render every page (or slide) of a document to a png image.
+
+        The document is converted to pdf first, which is then rasterized by
+        poppler's ``pdftoppm``.
+
+        :return: a list of png images as bytes, one per page.
+        """
+        pdf = data if source_format == 'pdf' else self.convert(data, source_format, 'pdf')
+        with tempfile.TemporaryDirectory(prefix='bureaucracy-') as tmpdir:
+            pdf_path = os.path.join(tmpdir, 'document.pdf')
+            with open(pdf_path, 'wb') as outfile:
+                outfile.write(pdf)
+
+            _run([executable, '-png', '-r', str(dpi), pdf_path, os.path.join(tmpdir, 'page')])
+
+            images = []
+            # pdftoppm zero-pads the page numbers depending on the page count
+            for path in sorted(glob.glob(os.path.join(tmpdir, 'page-*.png')), key=lambda p: (len(p), p)):
+                with open(path, 'rb') as infile:
+                    images.append(infile.read())
+            return images
+
+
+class SofficeConverter(BaseConverter):
+    """
+    Converts documents with the LibreOffice ``soffice`` command line tool.
+
+    Every call to soffice converts a batch of up to ``batch_size`` documents.
+    Each worker uses its own LibreOffice user profile, which is created
+    on first use and reused afterwards, so soffice does not have to set up a
+    new profile on every call and does not clash with other LibreOffice
+    instances. With more than one worker, conversions can run concurrently
+    from different threads.
+
+    :param executable: the soffice executable.
+    :param batch_size: the maximum number of documents per soffice call.
+    :param workers: the number of soffice processes that may run at once.
+    :param profile_dir: the directory to keep the user profiles in, defaults
+      to a temporary directory that is removed at exit.
+    :param timeout: the maximum number of seconds a single soffice call may take.
+    """
+
+    def __init__(self, executable='soffice', batch_size=50, workers=1, profile_dir=None, timeout=None):
+        self.executable = executable
+        self.batch_size = batch_size
+        self.workers = workers
+        self.timeout = timeout
+
+        if profile_dir is None:
+            profile_dir = tempfile.mkdtemp(prefix='bureaucracy-soffice-')
+            atexit.register(shutil.rmtree, profile_dir, True)
+        self.profile_dir = profile_dir
+
+        self._profiles = queue.Queue()
+        for i in range(workers):
+            self._profiles.put(os.path.join(profile_dir, 'worker-{}'.format(i)))
+
+    def fingerprint(self):
+        # another soffice can be another version of LibreOffice
+        return [self.executable]
+
+    def convert_many(self, documents, source_format: str, target_format: str) -> list:
+        documents = list(documents)
+        converted = []
+        for start in range(0, len(documents), self.batch_size):
+            converted += self._convert_batch(documents[start:start + self.batch_size], source_format, target_format)
+        return converted
+
+    def _convert_batch(self, documents, source_format, target_format):
+        with tempfile.TemporaryDirectory(prefix='bureaucracy-') as tmpdir:
+            in_paths = []
+            for i, data in enumerate(documents):
+                path = os.path.join(tmpdir, 'document-{}.{}'.format(i, source_format))
+                with open(path, 'wb') as outfile:
+                    outfile.write(data)
+                in_paths.append(path)
+
+            instrumentation.count('convert.documents', len(documents), target=target_format)
+            instrumentation.count('convert.bytes_in', sum(len(data) for data in documents), target=target_format)
+
+            outdir = os.path.join(tmpdir, 'out')
+            with instrumentation.timer('convert.wait_for_worker'):
+                profile = self._profiles.get()
+            try:
+                _run([self.executable, '-env:UserInstallation=file://{}'.format(profile), '--headless',
+                      '--convert-to', target_format, '--outdir', outdir] + in_paths, timeout=self.timeout)
+            finally:
+                self._profiles.put(profile)
+
+            converted = []
+            for i in range(len(documents)):
+                path = os.path.join(outdir, 'document-{}.{}'.format(i, target_format))
+                if not os.path.exists(path):
+                    raise ConversionError("soffice did not convert document {} to {}".format(i, target_format))
+                with open(path, 'rb') as infile:
+                    converted.append(infile.read())
+            instrumentation.count('convert.bytes_out', sum(len(data) for data in converted), target=target_format)
+            return converted
+
+
+class UnoserverConverter(BaseConverter):
+    """
+    Converts documents with a long-running LibreOffice, started with ``unoserver``.
+
+    Documents are sent to the server with the ``unoconvert`` client, so
+    there is no LibreOffice start-up cost per conversion at all.
+
+    :param host: the host the unoserver listens on.
+    :param port: the port the unoserver listens on.
+    :param executable: the unoconvert executable.
+    :param timeout: the maximum number of seconds a single conversion may take.
+    """
+
+    def __init__(self, host='127.0.0.1', port=2003, executable='unoconvert', timeout=None):
+        self.host = host
+        self.port = port
+        self.executable = executable
+        self.timeout = timeout
+
+    def fingerprint(self):
+        return [self.host, self.port, self.executable]
+
+    def convert(self, data: bytes, source_format: str, target_format: str) -> bytes:
+        instrumentation.count('convert.documents', 1, target=target_format)
+        instrumentation.count('convert.bytes_in', len(data), target=target_format)
+        # '-' makes unoconvert read from stdin and write to stdout
+        converted = _run([self.executable, '--host', self.host, '--port', str(self.port),
+                          '--convert-to', target_format, '-', '-'],
+                         input=data, timeout=self.timeout)
+        instrumentation.count('convert.bytes_out', len(converted), target=target_format)
+        return converted
+
+    def convert_many(self, documents, source_format: str, target_format: str) -> list:
+        return [self.convert(data, source_format, target_format) for data in documents]
+
+
+def _run(args, input=None, timeout=None):
+    try:
+        with instrumentation.timer('convert.subprocess', executable=os.path.basename(args[0])):
+            result = subprocess.run(args, input=input, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        raise ConversionError("Could not run '{}': {}".format(args[0], exc)) from exc
+    if result.returncode != 0:
+        raise ConversionError("'{}' exited with status {}: {}".format(
+            args[0], result.returncode, result.stderr.decode('utf-8', 'replace').strip()))
+    return result.stdout
+
+
+_default_converter = None
+
+
+def get_default_converter() -> BaseConverter:
+    """
+    Return the converter used by templates that were not given one.
+
+    A single :class:`SofficeConverter` is shared, so its LibreOffice profile
+    is set up only once per process.
+    """
+    global _default_converter
+    if _default_converter is None:
+        _default_converter = SofficeConverter()
+    return _default_converter
+
+
+def set_default_converter(converter: BaseConverter):
+    global _default_converter
+    _default_converter = converter
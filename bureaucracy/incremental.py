@@ -0,0 +1,220 @@
+"""
+Rendering a docx template again and again with small changes, e.g. for a live preview.
+
+An :class:`IncrementalRenderer` keeps the document of its last render and
+remembers which nodes it filled in for every field. Rendering a new context
+only fills in the fields whose value changed and writes just the document
+part into a copy of the otherwise unchanged package, so the time a render
+takes depends on the size of the change rather than the size of the
+document::
+
+    preview = template.incremental()
+    preview.render(context)
+    context['name'] = 'Jane'
+    preview.render(context)  # only the name fields are filled in again
+"""
+from copy import deepcopy
+from io import BytesIO
+
+from docx.oxml import OxmlElement
+from docx.text.paragraph import Paragraph
+from docx.text.run import Run
+from lxml import etree
+
+from bureaucracy.cache import fingerprint
+from bureaucracy.instrumentation import instrumentation
+from bureaucracy.packaging import PackageWriter
+from bureaucracy.replacements import (
+    ParagraphReplacement, Replacement, TextReplacement
+)
+from bureaucracy.template import _complex_field_runs, _is_alone_in_paragraph
+from bureaucracy.utils import namespaced
+
+__all__ = ['IncrementalRenderer']
+
+
+class _Slot:
+    """
+    A field in the rendered document.
+
+    :param field_name: the name of the field.
+    :param nodes: the nodes currently filled in for the field: its run, or
+      its paragraph if the field is the only content of the paragraph.
+    :param skeleton: for fields that are the only content of their
+      paragraph, a copy of the paragraph with an empty run for the field.
+    :param run_index: the position of the empty run in the skeleton.
+    """
+
+    def __init__(self, field_name, nodes, skeleton=None, run_index=None):
+        self.field_name = field_name
+        self.nodes = nodes
+        self.skeleton = skeleton
+        self.run_index = run_index
+        self.key = None
+        self.value = None
+
+
+class IncrementalRenderer:
+    """
+    Renders a template to docx bytes, only filling in the fields that changed since the previous render.
+
+    Contexts that put a paragraph replacement (HTML, table) in a field that
+    shares its paragraph or occurs more than once are rendered in full, and
+    the next render starts over. Templates with repeating regions are always
+    rendered in full. Changes to other values than text, like images, start
+    from a fresh copy of the template, so the parts and styles they add don't
+    pile up. An incremental renderer is not thread-safe.
+
+    :param template: the `DocxTemplate` to render.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the previous render, the next one renders every field.
+        """
+        self._doc = None
+        self._slots = []
+        self._writer = None
+
+    def render(self, context) -> bytes:
+        template = self.template
+        template._check(context)
+
+        if template.get_regions():
+            # the number of copies of a region depends on the context, there's no fixed set of fields to fill in
+            return template._render(context, 'docx')
+
+        with instrumentation.timer('docx.incremental'):
+            if self._doc is None:
+                self._build()
+
+            values = [context.get(slot.field_name, '') for slot in self._slots]
+            if not self._supports(values):
+                self.reset()
+                return template._render(context, 'docx')
+
+            keys = [_value_key(value) for value in values]
+            if any(slot.key is not None and key != slot.key and not key[0] == slot.key[0] == 'text'
+                   for slot, key in zip(self._slots, keys)):
+                # images and html add parts and relationships or change the styles, which are never removed
+                # again: start over from the template, so they don't pile up
+                self._build()
+
+            changed = 0
+            restart = False
+            for slot, value, key in zip(self._slots, values, keys):
+                if key == slot.key:
+                    continue
+                self._fill(slot, value)
+                slot.key, slot.value = key, value
+                changed += 1
+                if key[0] != 'text':
+                    self._writer = None
+                if not slot.nodes:
+                    # nothing left to find the field by, start over next time
+                    restart = True
+            instrumentation.count('docx.incremental.fields', changed)
+
+            data = self._write()
+            if restart:
+                self.reset()
+            return data
+
+    def _supports(self, values):
+        occurrences = {}
+        for slot in self._slots:
+            occurrences[slot.field_name] = occurrences.get(slot.field_name, 0) + 1
+
+        for slot, value in zip(self._slots, values):
+            if isinstance(value, ParagraphReplacement) and (
+                    slot.skeleton is None or occurrences[slot.field_name] > 1):
+                return False
+        return True
+
+    def _build(self):
+        doc = self.template._copy()
+        fields = list(doc.iter_fields())
+        alone = [_is_alone_in_paragraph(field) for _, field in fields]
+
+        # turn every field into an empty run, like `replace_simple_field` and `replace_complex_field` do
+        runs = []
+        for _, field in fields:
+            run = OxmlElement('w:r')
+            if field.tag == namespaced('fldSimple'):
+                field.getparent().replace(field, run)
+            else:
+                opening_run_node, closing_run_node = _complex_field_runs(field)
+                paragraph = opening_run_node.getparent()
+                paragraph[paragraph.index(opening_run_node):paragraph.index(closing_run_node)] = [run]
+            runs.append(run)
+
+        self._slots = []
+        for (field_name, _), run, is_alone in zip(fields, runs, alone):
+            if is_alone:
+                paragraph = run.getparent()
+                self._slots.append(_Slot(field_name, [paragraph], deepcopy(paragraph), paragraph.index(run)))
+            else:
+                self._slots.append(_Slot(field_name, [run]))
+        self._doc = doc
+        self._writer = None
+
+    def _fill(self, slot, value):
+        replacement = value if isinstance(value, Replacement) else TextReplacement(value)
+
+        first, last = slot.nodes[0], slot.nodes[-1]
+        parent = first.getparent()
+        previous, following = first.getprevious(), last.getnext()
+        index = parent.index(first)
+        for node in slot.nodes:
+            parent.remove(node)
+
+        if slot.skeleton is not None:
+            paragraph = deepcopy(slot.skeleton)
+            run_element = paragraph[slot.run_index]
+            parent.insert(index, paragraph)
+        else:
+            paragraph = parent
+            run_element = OxmlElement('w:r')
+            parent.insert(index, run_element)
+
+        replacement.fill(Run(run_element, Paragraph(paragraph, self._doc._body)))
+
+        # whatever the replacement put between the neighbours of the old nodes is the field now
+        node = previous.getnext() if previous is not None else parent[0] if len(parent) else None
+        slot.nodes = []
+        while node is not None and node is not following:
+            slot.nodes.append(node)
+            node = node.getnext()
+
+    def _write(self):
+        doc = self._doc
+        partname = doc.part.partname.lstrip('/')
+        if self._writer is None:
+            handle = BytesIO()
+            doc.save(handle)
+            self._writer = PackageWriter(handle.getvalue(), [partname], compression=doc.compression)
+
+        with instrumentation.timer('docx.save'):
+            xml = etree.tostring(doc._element, encoding='UTF-8', standalone=True)
+            data = self._writer.write({partname: xml})
+        instrumentation.count('docx.bytes_out', len(data))
+        return data
+
+
+def _value_key(value):
+    """
+    Return what identifies a value of the context, to find out whether it changed.
+    """
+    if not isinstance(value, Replacement):
+        return ('text', str(value))
+    if type(value) is TextReplacement:
+        return ('text', str(value.text))
+    try:
+        return ('data', fingerprint(value))
+    except TypeError:
+        # the slot holds on to the value, so its id is not reused
+        return ('object', id(value))
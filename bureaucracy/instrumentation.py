@@ -0,0 +1,166 @@
+"""
+Instrumentation of rendering: durations of the render phases and counters.
+
+Nothing is measured until a sink is attached::
+
+    from bureaucracy.instrumentation import LoggingSink, add_sink
+
+    add_sink(LoggingSink())
+
+Sinks implement :class:`MetricsSink`, or are built from callables with
+:class:`CallbackSink`. Metric names are dotted strings, like
+``docx.replace_fields`` or ``convert.subprocess``. Durations are reported
+in seconds, sizes in bytes.
+"""
+import logging
+import time
+
+__all__ = ['MetricsSink', 'CallbackSink', 'LoggingSink', 'MemorySink', 'Instrumentation', 'instrumentation',
+           'add_sink', 'remove_sink']
+
+logger = logging.getLogger('bureaucracy.metrics')
+
+
+class MetricsSink:
+    """
+    Receives the measurements. Override the methods you are interested in.
+    """
+
+    def timing(self, name: str, seconds: float, tags: dict):
+        pass
+
+    def count(self, name: str, value: int, tags: dict):
+        pass
+
+
+class CallbackSink(MetricsSink):
+    """
+    A sink that calls ``on_timing(name, seconds, tags)`` and ``on_count(name, value, tags)``.
+    """
+
+    def __init__(self, on_timing=None, on_count=None):
+        self.on_timing = on_timing
+        self.on_count = on_count
+
+    def timing(self, name, seconds, tags):
+        if self.on_timing is not None:
+            self.on_timing(name, seconds, tags)
+
+    def count(self, name, value, tags):
+        if self.on_count is not None:
+            self.on_count(name, value, tags)
+
+
+class LoggingSink(MetricsSink):
+    """
+    A sink that logs every measurement to the ``bureaucracy.metrics`` logger.
+    """
+
+    def __init__(self, level=logging.DEBUG):
+        self.level = level
+
+    def timing(self, name, seconds, tags):
+        logger.log(self.level, "%s took %.3f ms %s", name, seconds * 1000, tags)
+
+    def count(self, name, value, tags):
+        logger.log(self.level, "%s: %s %s", name, value, tags)
+
+
+class MemorySink(MetricsSink):
+    """
+    A sink that keeps all measurements in memory, for tests.
+
+    :attr:`timings` and :attr:`counts` are lists of ``(name, value, tags)`` tuples.
+    """
+
+    def __init__(self):
+        self.timings = []
+        self.counts = []
+
+    def timing(self, name, seconds, tags):
+        self.timings.append((name, seconds, tags))
+
+    def count(self, name, value, tags):
+        self.counts.append((name, value, tags))
+
+    def timing_names(self):
+        return [name for name, seconds, tags in self.timings]
+
+    def total(self, name):
+        """
+        Return the sum of all counts with the given name.
+        """
+        return sum(value for count_name, value, tags in self.counts if count_name == name)
+
+    def clear(self):
+        self.timings.clear()
+        self.counts.clear()
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, instrumentation, name, tags):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.tags = tags
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.instrumentation.timing(self.name, time.perf_counter() - self.start, **self.tags)
+        return False
+
+
+class Instrumentation:
+    """
+    Dispatches measurements to the attached sinks.
+
+    When no sinks are attached, :meth:`timer` returns a shared no-op context
+    manager and nothing is measured.
+    """
+
+    def __init__(self):
+        self.sinks = []
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def add_sink(self, sink: MetricsSink):
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink: MetricsSink):
+        self.sinks.remove(sink)
+
+    def timer(self, name, **tags):
+        """
+        Return a context manager that reports the duration of its block.
+        """
+        if not self.sinks:
+            return NULL_TIMER
+        return _Timer(self, name, tags)
+
+    def timing(self, name, seconds, **tags):
+        for sink in self.sinks:
+            sink.timing(name, seconds, tags)
+
+    def count(self, name, value=1, **tags):
+        for sink in self.sinks:
+            sink.count(name, value, tags)
+
+
+instrumentation = Instrumentation()
+add_sink = instrumentation.add_sink
+remove_sink = instrumentation.remove_sink
@@ -0,0 +1,196 @@
+"""
+Writing office documents at the zip level.
+
+A rendered document usually differs from its template in one or two parts
+only, like ``word/document.xml``. Instead of serializing and compressing
+every part of the package again for every render, a :class:`PackageWriter`
+compresses the unchanging parts once and only adds the changed parts to a
+copy of that archive.
+
+How the parts are compressed is set with a :class:`Compression`. Documents
+that go straight into a converter don't need compressing at all, documents
+that are archived are worth compressing as well as possible::
+
+    DocxTemplate('letter.docx', compression=Compression.STORE)
+    DocxTemplate('letter.docx', compression=Compression.SMALLEST)
+"""
+import os
+import zipfile
+from io import BytesIO
+from xml.sax.saxutils import quoteattr
+
+__all__ = ['Compression', 'PackageWriter', 'save_package']
+
+# media that is compressed already, deflating it again costs time and saves (next to) nothing
+MEDIA_EXTENSIONS = {
+    '.avi', '.gif', '.jfif', '.jpeg', '.jpg', '.m4a', '.mov', '.mp3', '.mp4', '.png', '.wdp', '.webp', '.wmv',
+    '.docx', '.pptx', '.xlsx', '.zip',
+}
+
+
+class Compression:
+    """
+    How to compress the parts of a package.
+
+    :param level: the compression level of the deflated parts, from 0 (fastest) to 9 (smallest). None uses zlib's
+      default, which is what python-docx and python-pptx use.
+    :param method: ``zipfile.ZIP_DEFLATED`` or ``zipfile.ZIP_STORED``. Office does not read the other methods.
+    :param store_media: store images and other media that is compressed already as-is.
+    """
+    # set below
+    STORE = FAST = DEFAULT = SMALLEST = None
+
+    def __init__(self, level: int = None, method: int = zipfile.ZIP_DEFLATED, store_media: bool = True):
+        if method not in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+            raise ValueError("Unsupported compression method {}, use ZIP_DEFLATED or ZIP_STORED".format(method))
+        if level is not None and not 0 <= level <= 9:
+            raise ValueError("Invalid compression level {}, use 0 to 9".format(level))
+        self.level = level
+        self.method = method
+        self.store_media = store_media
+
+    @classmethod
+    def get(cls, name: str) -> 'Compression':
+        """
+        Return the preset called ``name``: 'store', 'fast', 'default' or 'smallest'.
+        """
+        presets = {'store': cls.STORE, 'fast': cls.FAST, 'default': cls.DEFAULT, 'smallest': cls.SMALLEST}
+        if name not in presets:
+            raise ValueError("Unknown compression '{}', use one of {}".format(name, ', '.join(presets)))
+        return presets[name]
+
+    def options(self, name: str):
+        """
+        Return the compression method and level of the zip entry ``name``.
+        """
+        if self.method == zipfile.ZIP_STORED or (
+                self.store_media and os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS):
+            return zipfile.ZIP_STORED, None
+        return self.method, self.level
+
+    def fingerprint(self):
+        return [self.method, self.level, self.store_media]
+
+    def __eq__(self, other):
+        return isinstance(other, Compression) and self.fingerprint() == other.fingerprint()
+
+    def __hash__(self):
+        return hash(tuple(self.fingerprint()))
+
+    def __repr__(self):
+        return '<Compression method={} level={} store_media={}>'.format(self.method, self.level, self.store_media)
+
+
+Compression.STORE = Compression(method=zipfile.ZIP_STORED)
+Compression.FAST = Compression(level=1)
+Compression.DEFAULT = Compression()
+Compression.SMALLEST = Compression(level=9)
+
+
+def save_package(package, outfile, compression: Compression):
+    """
+    Save a python-docx or python-pptx package like its ``save`` method does, but compress every part as
+    ``compression`` says while writing it.
+
+    :param package: the ``OpcPackage`` of a document or presentation.
+    :param outfile: a path or a file-like object.
+    """
+    parts = list(package.iter_parts())
+    for part in parts:
+        # python-pptx 0.6.19 and later have no hook before saving
+        before_marshal = getattr(part, 'before_marshal', None)
+        if before_marshal is not None:
+            before_marshal()
+
+    with zipfile.ZipFile(outfile, 'w') as zout:
+        def write(name, data):
+            compress_type, level = compression.options(name)
+            zout.writestr(name, data, compress_type=compress_type, compresslevel=level)
+
+        write('[Content_Types].xml', _content_types(parts))
+        # python-pptx 0.6.19 and later keep the relationships of the package private
+        package_rels = package.rels if hasattr(package, 'rels') else package._rels
+        write('_rels/.rels', package_rels.xml)
+        for part in parts:
+            write(part.partname.membername, part.blob)
+            if len(part.rels):
+                write(part.partname.rels_uri.membername, part.rels.xml)
+
+
+def _content_types(parts) -> bytes:
+    """
+    Return the ``[Content_Types].xml`` of a package: a content type per extension, taken from the first part with
+    that extension, and the content type of every part that differs from the one of its extension.
+    """
+    defaults = {'rels': 'application/vnd.openxmlformats-package.relationships+xml', 'xml': 'application/xml'}
+    overrides = {}
+    for part in parts:
+        extension = part.partname.ext.lower()
+        # xml parts are told apart by name, except for plain xml like custom xml data
+        default = defaults['xml'] if extension == 'xml' else defaults.setdefault(extension, part.content_type)
+        if part.content_type != default:
+            overrides[part.partname] = part.content_type
+
+    def attribute(value):
+        return quoteattr(str(value))
+
+    xml = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n',
+           '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">']
+    xml += ['<Default Extension={} ContentType={}/>'.format(attribute(extension), attribute(content_type))
+            for extension, content_type in sorted(defaults.items())]
+    xml += ['<Override PartName={} ContentType={}/>'.format(attribute(partname), attribute(content_type))
+            for partname, content_type in sorted(overrides.items())]
+    xml.append('</Types>')
+    return ''.join(xml).encode('utf-8')
+
+
+class PackageWriter:
+    """
+    Writes packages that share all but a few parts with a source package.
+
+    :param source: the source package (a docx, pptx, ...) as bytes.
+    :param replaced: the names of the zip entries that are replaced on every
+      write, like ``'word/document.xml'``. They are left out of the shared
+      base archive.
+    :param compression: a :class:`Compression` for all parts. By default the
+      parts of the source keep their compression and the replaced parts are
+      deflated.
+    """
+
+    def __init__(self, source: bytes, replaced, compression: Compression = None):
+        self.replaced = set(replaced)
+        self.compression = compression
+
+        handle = BytesIO()
+        with zipfile.ZipFile(BytesIO(source)) as zin, zipfile.ZipFile(handle, 'w') as zout:
+            for info in zin.infolist():
+                if info.filename in self.replaced:
+                    continue
+                # read before changing the compression of the entry, which the reader uses to decompress it
+                data = zin.read(info)
+                if compression is None:
+                    zout.writestr(info, data)
+                else:
+                    compress_type, level = compression.options(info.filename)
+                    info.compress_type = compress_type
+                    zout.writestr(info, data, compresslevel=level)
+        self.base = handle.getvalue()
+
+    def write(self, parts: dict) -> bytes:
+        """
+        Return the package with ``parts``, a dict of zip entry names and bytes, added to the base archive.
+        """
+        missing = self.replaced - set(parts)
+        if missing:
+            raise ValueError("No contents given for the parts {}".format(', '.join(sorted(missing))))
+
+        handle = BytesIO()
+        handle.write(self.base)
+        handle.seek(0)
+        # appending only rewrites the central directory of the base archive
+        with zipfile.ZipFile(handle, 'a') as zout:
+            for name, data in parts.items():
+                compress_type, level = (zipfile.ZIP_DEFLATED, None) if self.compression is None else \
+                    self.compression.options(name)
+                zout.writestr(name, data, compress_type=compress_type, compresslevel=level)
+        return handle.getvalue()
@@ -2,6 +2,33 @@
 This package implements the API to feed a powerpoint presentation as a template
 to a source of data. The actual template contents can be templated out with
 your favourite template engine.
+
+The public names are loaded on first access, so python-pptx is only
+imported when it is needed.
 """
+from importlib import import_module
+
+# public name -> (module, attribute)
+_LAZY_ATTRIBUTES = {
+    'Template': ('bureaucracy.powerpoint.core', 'Template'),
+    'RenderContext': ('bureaucracy.powerpoint.core', 'RenderContext'),
+    'BatchRenderer': ('bureaucracy.powerpoint.batch', 'BatchRenderer'),
+    'VariableIndex': ('bureaucracy.powerpoint.core', 'VariableIndex'),
+    'ChartData': ('bureaucracy.powerpoint.charts', 'ChartData'),
+}
+
+__all__ = ['Template', 'RenderContext', 'VariableIndex', 'BatchRenderer', 'ChartData']
+
+
+def __getattr__(name):
+    try:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name)) from None
+    value = getattr(import_module(module_name), attribute)
+    globals()[name] = value
+    return value
+
 
-from .core import *  # noqa
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
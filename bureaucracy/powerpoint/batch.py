@@ -0,0 +1,52 @@
+"""
+Render a powerpoint template for many contexts in a pool of processes.
+"""
+from io import BytesIO
+
+from bureaucracy.artifacts import is_artifact
+from bureaucracy.batch import BaseBatchRenderer
+
+from .core import Template
+from .engines import BaseEngine
+
+__all__ = ['BatchRenderer']
+
+
+class BatchRenderer(BaseBatchRenderer):
+    """
+    Render a powerpoint template for many contexts in a pool of processes.
+
+    The layouts of the template are analysed once, every worker loads the
+    analysed template and renders a fresh copy of it for every context::
+
+        renderer = BatchRenderer('template.pptx', engine=MyEngine())
+        report = renderer.run(contexts, outdir='decks')
+
+    :param template: a path or file-like object with the template, or with a compiled template artifact.
+    :param engine: the template engine, must be picklable.
+    :param format: 'pptx' or 'pdf'. Every worker converts its own documents.
+    :param compression: a :class:`bureaucracy.packaging.Compression` for the presentations.
+    :param prune_unused: drop the layouts, masters and media the rendered slides don't use.
+
+    See :class:`bureaucracy.batch.BaseBatchRenderer` for the other options.
+    """
+    extension = 'pptx'
+
+    def __init__(self, template, engine: BaseEngine = None, format='pptx', compression=None, prune_unused=False,
+                 **kwargs):
+        super().__init__(template, **kwargs)
+        self.engine = engine
+        self.extension = format
+        self.compression = compression
+        self.prune_unused = prune_unused
+        self.compile()
+
+    def compile(self):
+        if not is_artifact(self.source):
+            self.source = Template(BytesIO(self.source)).to_artifact()
+
+    def load(self):
+        return Template.from_artifact(self.source, compression=self.compression, prune_unused=self.prune_unused)
+
+    def render_one(self, template: Template, context):
+        return template.render_to_bytes(context, format=self.extension, engine=self.engine)
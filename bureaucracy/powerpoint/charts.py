@@ -0,0 +1,180 @@
+"""
+Filling the charts on template slides with data.
+
+A chart is filled with the :class:`ChartData` in the context under the name
+of its shape, as set in the selection pane::
+
+    context = {
+        'sales': ChartData(['Q1', 'Q2', 'Q3'], {'2023': [10, 12, 9], '2024': [11, 15, 14]}),
+    }
+
+The series of the chart are rewritten from the data in one go: the points of
+every series are built as a single XML fragment and the embedded workbook is
+written column by column, so charts with thousands of points stay cheap.
+Series added to a chart take the formatting of its last series.
+"""
+import math
+from collections.abc import Mapping
+from copy import deepcopy
+from decimal import Decimal
+from io import BytesIO
+from numbers import Real
+from xml.sax.saxutils import escape
+
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls, qn
+
+from .engines import BaseEngine
+
+__all__ = ['ChartData', 'ChartContainer']
+
+CONTEXT_KEY_FOR_CHART = 'PPT_CURRENT_CHART'
+
+# plots with x and y values instead of categories
+XY_PLOTS = {qn('c:scatterChart'), qn('c:bubbleChart')}
+
+
+class ChartData:
+    """
+    The categories and series of a chart, as columns.
+
+    :param categories: the labels of the categories.
+    :param series: a mapping of series names to their values, or a list of
+      (name, values) tuples. Every series has a value per category, ``None``
+      leaves a gap.
+    :param number_format: the Excel number format of the values.
+    """
+
+    def __init__(self, categories, series, number_format: str = 'General'):
+        self.categories = [str(category) for category in categories]
+        items = series.items() if isinstance(series, Mapping) else series
+        self.series = [(str(name), list(values)) for name, values in items]
+        self.number_format = number_format
+
+        if not self.categories:
+            raise ValueError("A chart needs at least one category")
+        if not self.series:
+            raise ValueError("A chart needs at least one series")
+        for name, values in self.series:
+            if len(values) != len(self.categories):
+                raise ValueError("Series '{}' has {} values for {} categories".format(
+                    name, len(values), len(self.categories)))
+            for value in values:
+                # the values are written to the chart as they are, anything but a finite number corrupts it
+                if value is not None and (isinstance(value, bool) or not isinstance(value, (Real, Decimal))
+                                          or not math.isfinite(value)):
+                    raise ValueError("Series '{}' has the value {!r}, use numbers or None".format(name, value))
+
+    def fingerprint(self):
+        return [self.categories, self.series, self.number_format]
+
+
+class ChartContainer:
+    def __init__(self, graphic_frame, slide=None):
+        self.graphic_frame = graphic_frame
+        self.chart = graphic_frame.chart
+        self.slide = slide
+
+    @property
+    def name(self):
+        return self.graphic_frame.name
+
+    def render(self, engine: BaseEngine, context: dict):
+        context[CONTEXT_KEY_FOR_CHART] = self
+
+        data = context.get(self.name)
+        if isinstance(data, ChartData):
+            self.fill(data)
+
+    def fill(self, data: ChartData):
+        """
+        Replace the categories and series of the chart, and its embedded workbook, by ``data``.
+        """
+        plot_area = self.chart._chartSpace.plotArea
+        if any(plot.tag in XY_PLOTS for plot in plot_area.iter_xCharts()):
+            raise ValueError("Chart '{}' has x and y values, only category charts can be filled".format(self.name))
+
+        sers = _adjust_series_count(plot_area, len(data.series))
+        count = len(data.categories)
+        categories_ref = 'Sheet1!$A$2:$A${}'.format(count + 1)
+        categories = _str_ref('c:cat', categories_ref, data.categories)
+
+        for column, (ser, (name, values)) in enumerate(zip(sers, data.series), 1):
+            column_name = _column_name(column)
+            ser._remove_tx()
+            ser._insert_tx(_str_ref('c:tx', 'Sheet1!${}$1'.format(column_name), [name]))
+            ser._remove_cat()
+            ser._insert_cat(deepcopy(categories))
+            ser._remove_val()
+            ser._insert_val(_num_ref('c:val', 'Sheet1!${0}$2:${0}${1}'.format(column_name, count + 1),
+                                     values, data.number_format))
+
+        self.chart._workbook.update_from_xlsx_blob(_xlsx_blob(data))
+
+
+def _adjust_series_count(plot_area, count):
+    """
+    Add copies of the last series or remove series from the end, until there are ``count`` of them.
+    """
+    sers = list(plot_area.sers)
+    while len(sers) < count:
+        ser = deepcopy(sers[-1])
+        ser.idx.val = plot_area.next_idx
+        ser.order.val = plot_area.next_order
+        sers[-1].addnext(ser)
+        sers.append(ser)
+
+    for ser in sers[count:]:
+        ser.getparent().remove(ser)
+    for plot in list(plot_area.iter_xCharts()):
+        if not plot.sers:
+            plot_area.remove(plot)
+    return sers[:count]
+
+
+def _column_name(index):
+    """
+    Return the Excel name of the column with the 0-based ``index``: A, B, ..., Z, AA, ...
+    """
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(ord('A') + remainder) + name
+    return name
+
+
+def _str_ref(tag, ref, values):
+    points = ''.join('<c:pt idx="{}"><c:v>{}</c:v></c:pt>'.format(index, escape(value))
+                     for index, value in enumerate(values))
+    return parse_xml(
+        '<{tag} {ns}><c:strRef><c:f>{ref}</c:f><c:strCache><c:ptCount val="{count}"/>{points}</c:strCache>'
+        '</c:strRef></{tag}>'.format(tag=tag, ns=nsdecls('c'), ref=ref, count=len(values), points=points))
+
+
+def _num_ref(tag, ref, values, number_format):
+    points = ''.join('<c:pt idx="{}"><c:v>{}</c:v></c:pt>'.format(index, value)
+                     for index, value in enumerate(values) if value is not None)
+    return parse_xml(
+        '<{tag} {ns}><c:numRef><c:f>{ref}</c:f><c:numCache><c:formatCode>{format}</c:formatCode>'
+        '<c:ptCount val="{count}"/>{points}</c:numCache></c:numRef></{tag}>'.format(
+            tag=tag, ns=nsdecls('c'), ref=ref, format=escape(number_format), count=len(values), points=points))
+
+
+def _xlsx_blob(data: ChartData) -> bytes:
+    """
+    Return the workbook of a chart: the categories in the first column and a column per series.
+    """
+    # like python-pptx, only import xlsxwriter when a chart is filled
+    from xlsxwriter import Workbook
+
+    handle = BytesIO()
+    workbook = Workbook(handle, {'in_memory': True})
+    worksheet = workbook.add_worksheet()
+    number_format = workbook.add_format({'num_format': data.number_format})
+    worksheet.write_column(1, 0, data.categories)
+    for column, (name, values) in enumerate(data.series, 1):
+        worksheet.write(0, column, name)
+        worksheet.write_column(1, column, values, number_format)
+    workbook.close()
+    return handle.getvalue()
@@ -1,13 +1,50 @@
 """
 Public interface to use powerpoint presentations as export template.
 """
+import hashlib
+import os
+from collections import ChainMap, OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from io import BytesIO
+from stat import S_ISREG
+
 from pptx import Presentation
 
-from .engines import PythonEngine
-from .slides import SlideContainer
+from bureaucracy.artifacts import _from_artifact, dump_artifact, load_artifact
+from bureaucracy.cache import BaseCache, cache_key, fingerprint
+from bureaucracy.converters import BaseConverter, get_default_converter
+from bureaucracy.instrumentation import instrumentation
+from bureaucracy.packaging import Compression, save_package
+from bureaucracy.profiling import RenderProfiler
+
+from .charts import CONTEXT_KEY_FOR_CHART
+from .engines import BaseEngine, PythonEngine
+from .images import ImageCache
+from .placeholders import CONTEXT_KEY_FOR_PLACEHOLDER
+from .pruning import PruneReport, prune_presentation
+from .slides import CONTEXT_KEY_FOR_SLIDE, SlideContainer
+from .tables import CONTEXT_KEY_FOR_TABLE, TableContainer
+
+__all__ = ['Template', 'RenderContext', 'VariableIndex']
+
+# set by the render itself, not by the caller
+RENDER_VARIABLES = {CONTEXT_KEY_FOR_SLIDE, CONTEXT_KEY_FOR_PLACEHOLDER, CONTEXT_KEY_FOR_TABLE, CONTEXT_KEY_FOR_CHART}
 
-__all__ = ['Template']
+
+class RenderContext(ChainMap):
+    """
+    The context of a single render: an overlay on the context of the caller.
+
+    Everything that is set during the render (the current slide, placeholder
+    or table, values set by control placeholders) ends up in the overlay, so
+    the caller's context is never modified and can be shared between renders
+    running in different threads.
+    """
+
+    def __init__(self, context):
+        super().__init__({}, context)
 
 
 class TemplateIterator:
@@ -20,16 +57,63 @@ class TemplateIterator:
     def __init__(self, slides):
         self.slides = slides
         self.current = 0
+        self.skipped = set()
+
+    def __iter__(self):
+        return self
 
     def __next__(self):
         """
         Return the next slide in the slideset, which may have been inserted.
+
+        Slides whose id was passed to :meth:`skip` are passed over.
+        """
+        while True:
+            if self.current >= len(self.slides):
+                raise StopIteration
+            slide = self.slides[self.current]
+            self.current += 1
+            if slide.slide_id not in self.skipped:
+                return slide
+
+    def skip(self, slide_ids):
+        """
+        Do not return the slides with the given ids, e.g. because they are already rendered.
+        """
+        self.skipped.update(slide_ids)
+
+
+class VariableIndex:
+    """
+    The context variables the fragments of a template use, see :meth:`Template.get_variables`.
+
+    :param slides: the set of variables of every slide, in order. This
+      includes the fragments of the layout placeholders that are not filled
+      in on the slide, of the first cells of its tables and the names of
+      its charts.
+    :param layouts: the set of variables of the placeholders of every slide
+      layout in use, by layout name.
+    """
+
+    def __init__(self, slides, layouts):
+        self.slides = slides
+        self.layouts = layouts
+
+    @property
+    def names(self) -> set:
+        """
+        All variables the template uses.
         """
-        if self.current >= len(self.slides):
-            raise StopIteration
-        slide = self.slides[self.current]
-        self.current += 1
-        return slide
+        return set().union(*self.slides)
+
+    def missing(self, context) -> list:
+        """
+        Return the variables that are not in ``context``, sorted.
+
+        Charts without data are left as they are, and variables that control
+        placeholders set during the render are reported too.
+        """
+        return sorted(self.names - set(context))
 
 
 class Template:
@@ -37,10 +121,42 @@ class Template:
     A powerpoint presentation that serves as a template.
 
     :param filepath: path to the powerpoint file on disk or filelike object.
+    :param image_cache: the :class:`ImageCache` used for picture placeholders.
+      Pass the same cache to several templates to share images between them.
+    :param converter: the converter used for pdf and image output, defaults
+      to the shared default converter.
+    :param cache: a :class:`bureaucracy.cache.BaseCache` to keep the output
+      of :meth:`render_to_bytes` in.
+    :param compression: a :class:`bureaucracy.packaging.Compression` for the
+      saved presentations, by default every part is deflated like
+      python-pptx does.
+    :param profiler: a :class:`bureaucracy.profiling.RenderProfiler` to
+      capture slow renders with.
+    :param prune_unused: drop the layouts, masters and media the slides
+      don't use when saving, see :meth:`prune`.
     """
 
-    def __init__(self, pptx):
-        self._presentation = Presentation(pptx)
+    def __init__(self, pptx, image_cache: ImageCache = None, converter: BaseConverter = None, cache: BaseCache = None,
+                 compression: Compression = None, profiler: RenderProfiler = None, prune_unused: bool = False):
+        if hasattr(pptx, 'read'):
+            self._source = pptx.read()
+        else:
+            with open(pptx, 'rb') as infile:
+                self._source = infile.read()
+        instrumentation.count('pptx.bytes_in', len(self._source))
+        with instrumentation.timer('pptx.load'):
+            self._presentation = Presentation(BytesIO(self._source))
+        self.image_cache = image_cache if image_cache is not None else ImageCache()
+        self.converter = converter
+        self.cache = cache
+        self.compression = compression
+        self.profiler = profiler
+        self.prune_unused = prune_unused
+        self.prune_report = None
+        self._rendered = False
+        self._layout_cache = {}
+        self._variables = {}
+        self._hash = None
 
     def __iter__(self):
         return TemplateIterator(self._presentation.slides)
@@ -52,17 +168,305 @@ class Template:
         """
         return [layout.name for layout in self._presentation.slide_layouts]
 
-    def render(self, context, engine=PythonEngine()):
+    def _slide_container(self, slide):
+        return SlideContainer(slide, self._presentation, image_cache=self.image_cache,
+                              layout_cache=self._layout_cache)
+
+    def get_variables(self, engine: BaseEngine = None) -> VariableIndex:
+        """
+        Find the context variables the template uses, without rendering it.
+
+        The fragments are parsed with the ``get_variables`` method of the
+        engine. The result is computed once per engine configuration and
+        shared with the copies of the template. A rendered template reports
+        the variables of the file it was loaded from.
+
+        :param engine: the template engine, defaults to the :class:`PythonEngine`.
+        """
+        if self._rendered:
+            # the fragments are rendered already, find them in a pristine copy
+            return self.copy().get_variables(engine)
+
+        engine = engine or PythonEngine()
+        try:
+            key = (type(engine), fingerprint(engine.fingerprint()))
+        except TypeError:
+            # the options of the engine can't be told apart, don't share the result
+            key = None
+        if key is None or key not in self._variables:
+            with instrumentation.timer('pptx.variables'):
+                variables = self._find_variables(engine)
+            if key is None:
+                return variables
+            self._variables[key] = variables
+        return self._variables[key]
+
+    def _find_variables(self, engine):
+        parsed = {}
+
+        def variables(fragment):
+            if fragment not in parsed:
+                parsed[fragment] = engine.get_variables(fragment) - RENDER_VARIABLES
+            return parsed[fragment]
+
+        slides = []
+        layouts = {}
+        for slide in self._presentation.slides:
+            container = self._slide_container(slide)
+            names = set()
+            for fragment in container.extract_template_code().values():
+                names |= variables(fragment)
 
-        for slide in self:
-            slide = SlideContainer(slide, self._presentation)
-            slide.render(engine, context)
+            layout_names = layouts.setdefault(slide.slide_layout.name, set())
+            for fragment in container.extract_layout_template_code().values():
+                layout_names |= variables(fragment)
+
+            for shape in slide.shapes:
+                if shape.has_table:
+                    try:
+                        names |= variables(TableContainer(shape.table)[0, 0].text)
+                    except IndexError:
+                        pass
+            names.update(chart.name for chart in container.charts())
+            slides.append(names)
+        return VariableIndex(slides, layouts)
+
+    def get_chart_names(self):
+        """
+        Get the names of the charts on the slides, which are filled with the `ChartData` under that name in the
+        context.
+        """
+        return {chart.name for slide in self._presentation.slides for chart in self._slide_container(slide).charts()}
+
+    def analyse(self):
+        """
+        Extract and order the template code of all slide layouts in use up front.
+
+        This happens on the first render anyway, but analysing once before
+        making copies of the template saves every copy the work.
+        """
+        for slide in self._presentation.slides:
+            if slide.shapes:
+                self._slide_container(slide).extract_layout_template_code()
+
+    def copy(self):
+        """
+        Return a new, unrendered template from the same file, sharing the image cache and analysis.
+        """
+        template = type(self)(BytesIO(self._source), image_cache=self.image_cache, converter=self.converter,
+                              cache=self.cache, compression=self.compression, profiler=self.profiler,
+                              prune_unused=self.prune_unused)
+        template._layout_cache = self._layout_cache
+        template._variables = self._variables
+        template._hash = self._hash
+        return template
+
+    def render(self, context, engine=None):
+        """
+        Render the template in place with the given context.
 
-    def save_to(self, outfile):
-        self._presentation.save(outfile)
+        The context itself is left untouched, see :class:`RenderContext`.
 
-    def to_bytes(self):
-        handle = BytesIO()
-        self._presentation.save(handle)
-        handle.seek(0)
-        return handle.read()
+        :param engine: the template engine to render the fragments with,
+          defaults to the :class:`PythonEngine`.
+        """
+        profile = self.profiler.capture('pptx', context) if self.profiler is not None else nullcontext()
+        engine = (engine or PythonEngine()).start_render()
+        self._rendered = True
+        context = RenderContext(context)
+
+        with profile, instrumentation.timer('pptx.render'):
+            slides = iter(self)
+            for slide in slides:
+                slide = self._slide_container(slide)
+                slide.render(engine, context)
+                slides.skip(slide.duplicates)
+                instrumentation.count('pptx.slides')
+
+    def render_to_bytes(self, context, format='pptx', engine=None):
+        """
+        Render a copy of the template and return it as bytes.
+
+        With a cache, the output is looked up by the template, the context,
+        the format and the engine first. Values in the context are
+        fingerprinted by their data. Strings that are paths of files count
+        with the modification time and size of the file, so a changed image
+        is not served from the cache.
+
+        :param format: 'pptx' or 'pdf'.
+        :param engine: the template engine, see :meth:`render`.
+        """
+        def render():
+            template = self.copy()
+            template.render(context, engine=engine)
+            return template.to_bytes(format=format)
+
+        if self.cache is None:
+            return render()
+
+        if self._hash is None:
+            self._hash = hashlib.sha256(self._source).hexdigest()
+        key = cache_key(self._hash, context, engine or PythonEngine(), self.image_cache,
+                        _files(context, self.image_cache), self.compression, self.prune_unused,
+                        self.converter or get_default_converter())
+        return self.cache.get_or_render(key and '{}.{}'.format(key, format), render, format)
+
+    def render_many(self, contexts, engine=None, workers=None):
+        """
+        Render a copy of the template for every context, in a pool of threads.
+
+        This template itself is not rendered, so it can be reused.
+
+        :param contexts: an iterable of contexts.
+        :param engine: the template engine, see :meth:`render`.
+        :param workers: the maximum number of threads, see
+          :class:`concurrent.futures.ThreadPoolExecutor`.
+        :return: a list of rendered templates, in the order of the contexts.
+        """
+        def render(context):
+            template = self.copy()
+            template.render(context, engine=engine)
+            return template
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(render, contexts))
+
+    def save_to(self, outfile, format='pptx'):
+        """
+        Save the presentation to a path or file-like object.
+
+        :param format: 'pptx' or 'pdf'.
+        """
+        if format == 'pptx':
+            with instrumentation.timer('pptx.save'):
+                self._save(outfile)
+            return
+
+        data = self.to_bytes(format=format)
+        if hasattr(outfile, 'write'):
+            outfile.write(data)
+        else:
+            with open(outfile, 'wb') as handle:
+                handle.write(data)
+
+    def to_bytes(self, format='pptx'):
+        """
+        Return the presentation as bytes.
+
+        :param format: 'pptx' or 'pdf'.
+        """
+        if format not in ('pptx', 'pdf'):
+            raise ValueError("Unsupported format '{}'.".format(format))
+
+        with instrumentation.timer('pptx.save'):
+            handle = BytesIO()
+            self._save(handle)
+        data = handle.getvalue()
+        instrumentation.count('pptx.bytes_out', len(data))
+
+        if format == 'pdf':
+            with instrumentation.timer('pptx.convert', format=format):
+                data = self._get_converter().convert(data, 'pptx', 'pdf')
+        return data
+
+    def prune(self) -> PruneReport:
+        """
+        Remove the slides, layouts, masters and media the presentation does not use anymore.
+
+        Prune a rendered presentation, the layouts of a template are needed to render it.
+        The report is kept in :attr:`prune_report` as well.
+
+        :return: a :class:`bureaucracy.powerpoint.pruning.PruneReport` with the removed parts and the bytes saved.
+        """
+        self._rendered = True
+        self.prune_report = prune_presentation(self._presentation)
+        return self.prune_report
+
+    def to_artifact(self) -> bytes:
+        """
+        Return the template and the template code of its slide layouts, in order, as bytes.
+
+        Load it again with :meth:`from_artifact` without analysing the
+        layouts, see :mod:`bureaucracy.artifacts`. The artifact of a rendered
+        (or pruned) presentation holds the presentation as it is now.
+        """
+        self.analyse()
+        with instrumentation.timer('pptx.artifact'):
+            if self._rendered:
+                handle = BytesIO()
+                self._presentation.save(handle)
+                package = handle.getvalue()
+            else:
+                package = self._source
+            analysis = {
+                'layouts': {key: list(fragments.items()) for key, fragments in self._layout_cache.items()},
+                'hash': hashlib.sha256(package).hexdigest(),
+            }
+            return dump_artifact('pptx', analysis, {'package': package})
+
+    @classmethod
+    def from_artifact(cls, artifact: bytes, **kwargs) -> 'Template':
+        """
+        Load a template from the bytes returned by :meth:`to_artifact`.
+
+        :param kwargs: the options of the template, see :class:`Template`.
+        :raises bureaucracy.artifacts.ArtifactError: if the artifact is not of
+          this version of bureaucracy, or corrupt.
+        """
+        analysis, blobs = load_artifact(artifact, 'pptx')
+        template = cls(BytesIO(blobs['package']), **kwargs)
+        template._layout_cache = {
+            key: OrderedDict((idx, fragment) for idx, fragment in fragments)
+            for key, fragments in analysis['layouts'].items()
+        }
+        template._hash = analysis['hash']
+        return template
+
+    def __reduce__(self):
+        # python-pptx objects can't be pickled, a template is pickled as an artifact, see `_from_artifact`
+        options = {'image_cache': self.image_cache, 'compression': self.compression, 'prune_unused': self.prune_unused}
+        return _from_artifact, (type(self), self.to_artifact(), options)
+
+    def _save(self, outfile):
+        if self.prune_unused:
+            self.prune()
+        if self.compression is None:
+            self._presentation.save(outfile)
+        else:
+            save_package(self._presentation.part.package, outfile, self.compression)
+
+    def thumbnails(self, dpi=96):
+        """
+        Return a png image of every slide, as bytes.
+
+        :param dpi: the resolution of the images.
+        """
+        return self._get_converter().to_images(self.to_bytes(), 'pptx', dpi=dpi)
+
+    def _get_converter(self):
+        return self.converter or get_default_converter()
+
+
+def _files(value, image_cache, files=None):
+    """
+    Return the paths, modification times and sizes of the files the strings in a context refer to, sorted.
+
+    Registered images are left out, they're part of the fingerprint of the image cache.
+    """
+    files = set() if files is None else files
+    if isinstance(value, str):
+        if '\n' not in value and value not in image_cache._registered:
+            try:
+                stat = os.stat(value)
+            except (OSError, ValueError):
+                pass
+            else:
+                if S_ISREG(stat.st_mode):
+                    files.add((value, stat.st_mtime_ns, stat.st_size))
+    elif isinstance(value, Mapping):
+        for item in value.values():
+            _files(item, image_cache, files)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _files(item, image_cache, files)
+    return sorted(files)
@@ -1,6 +1,11 @@
 """
 This module defines the base engine to render template fragments.
 """
+import re
+from string import Formatter
+
+# the name a format string field starts with, before any attribute access or indexing
+FIELD_NAME = re.compile(r'[^.\[]*')
 
 
 class BaseEngine:
@@ -8,6 +13,30 @@ class BaseEngine:
     def render(self, fragment, context):
         raise NotImplementedError("You must implement the `render` method.")
 
+    def get_variables(self, fragment) -> set:
+        """
+        Return the names of the context variables a fragment uses, without rendering it.
+        """
+        raise NotImplementedError("You must implement the `get_variables` method.")
+
+    def fingerprint(self):
+        """
+        Return the options of the engine that change its output, as plain values, for cache keys.
+
+        The class of the engine is part of the key already, engines with options should return them here.
+        """
+        return None
+
+    def start_render(self):
+        """
+        Return the engine to use for a single render of a template.
+
+        Engines that keep state between the fragments of a render must return
+        a fresh instance here, so concurrent renders don't share that state.
+        Stateless engines can return themselves.
+        """
+        return self
+
 
 class PythonEngine(BaseEngine):
     """
@@ -16,3 +45,17 @@ class PythonEngine(BaseEngine):
 
     def render(self, fragment, context):
         return fragment.format(**context)
+
+    def get_variables(self, fragment):
+        names = set()
+        for _, field_name, format_spec, _ in Formatter().parse(fragment):
+            if field_name is None:
+                continue
+            name = FIELD_NAME.match(field_name).group()
+            # positional fields ('{}', '{0}') can't be filled from the context
+            if name and not name.isdigit():
+                names.add(name)
+            if format_spec:
+                # nested fields, like '{value:{width}}'
+                names |= self.get_variables(format_spec)
+        return names
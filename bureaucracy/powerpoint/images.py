@@ -0,0 +1,222 @@
+"""
+Shared image cache for picture placeholders.
+
+Inserting a picture with python-pptx reads, hashes and measures the image
+every time, and looks up existing image parts by re-hashing every image in
+the package. The :class:`ImageCache` does all that work once per image and
+keeps an index of the image parts per presentation, so stamping the same
+image on many slides costs next to nothing.
+"""
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from PIL import Image as PILImage
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.oxml.shapes.picture import CT_Picture
+from pptx.parts.image import Image, ImagePart
+from pptx.shapes.placeholder import PlaceholderPicture
+from pptx.util import Emu
+
+__all__ = ['CachedImage', 'ImageCache']
+
+# PIL formats we know how to write back when downscaling
+DOWNSCALE_FORMATS = {'JPEG', 'PNG'}
+
+
+class CachedImage:
+    """
+    An image that is read, hashed and measured only once.
+
+    :param blob: the binary contents of the image.
+    :param filename: the original filename of the image, if any.
+    """
+
+    def __init__(self, blob: bytes, filename: str = None):
+        image = Image(blob, filename)
+        self.blob = blob
+        self.filename = filename
+        self.sha1 = hashlib.sha1(blob).hexdigest()
+        self.ext = image.ext
+        self.content_type = image.content_type
+        self.size = image.size
+        self.dpi = image.dpi
+        self._scaled = {}
+
+    def fingerprint(self):
+        return self.sha1
+
+    @property
+    def desc(self):
+        return self.filename or 'image.{}'.format(self.ext)
+
+    def fit(self, width: int, height: int, dpi: int):
+        """
+        Return a version of the image that is no larger than needed to cover a box.
+
+        The image is cropped to fill the box, so it only needs to cover it in
+        both directions at the given resolution. Images that are small enough
+        already, or in a format we can't write, are returned as-is.
+
+        :param width: the width of the box in EMU.
+        :param height: the height of the box in EMU.
+        :param dpi: the resolution the image should have in the box.
+        """
+        target = (round(Emu(width).inches * dpi), round(Emu(height).inches * dpi))
+        if target not in self._scaled:
+            self._scaled[target] = self._downscale(*target)
+        return self._scaled[target]
+
+    def _downscale(self, target_width, target_height):
+        width, height = self.size
+        scale = max(target_width / width, target_height / height)
+        if scale >= 1 or not target_width or not target_height:
+            return self
+
+        pil_image = PILImage.open(BytesIO(self.blob))
+        if pil_image.format not in DOWNSCALE_FORMATS:
+            return self
+
+        resized = pil_image.resize((max(1, round(width * scale)), max(1, round(height * scale))), PILImage.LANCZOS)
+        handle = BytesIO()
+        if pil_image.format == 'JPEG':
+            resized.save(handle, 'JPEG', quality=90, optimize=True)
+        else:
+            resized.save(handle, 'PNG', optimize=True)
+
+        blob = handle.getvalue()
+        if len(blob) >= len(self.blob):
+            return self
+        return CachedImage(blob, self.filename)
+
+
+class ImageCache:
+    """
+    Cache of images to insert into picture placeholders.
+
+    Images are identified by a registered key, a path on disk, bytes or a
+    file-like object. A single cache can be shared between templates and
+    renders, and is safe to use from multiple threads.
+
+    :param downscale: if True, images larger than needed for the placeholder
+      they are inserted into are downscaled, which makes decks smaller.
+    :param dpi: the resolution to downscale to.
+    :param max_entries: the maximum number of unregistered images to keep,
+      the least recently used ones are dropped first.
+    """
+
+    def __init__(self, downscale: bool = False, dpi: int = 150, max_entries: int = 256):
+        self.downscale = downscale
+        self.dpi = dpi
+        self.max_entries = max_entries
+        self._registered = {}
+        self._images = OrderedDict()
+        self._part_indexes = weakref.WeakKeyDictionary()
+        self._lock = threading.RLock()
+
+    def __reduce__(self):
+        # the loaded images and image parts belong to the process, only the registered images are pickled
+        with self._lock:
+            registered = dict(self._registered)
+        return type(self), (self.downscale, self.dpi, self.max_entries), {'_registered': registered}
+
+    def fingerprint(self):
+        # the options and registered images a render depends on, for cache keys, see bureaucracy.cache
+        with self._lock:
+            registered = {key: image.sha1 for key, image in self._registered.items()}
+        return [self.downscale, self.dpi, registered]
+
+    def register(self, key: str, source):
+        """
+        Register an image under a key, so template fragments can render to that key.
+
+        :param source: a path, bytes, a file-like object or a :class:`CachedImage`.
+        """
+        image = self.get(source)
+        if image is None:
+            raise ValueError("File '{}' does not exist.".format(source))
+        with self._lock:
+            self._registered[key] = image
+        return image
+
+    def get(self, source):
+        """
+        Return the :class:`CachedImage` for a source, or None if it's a path that does not exist.
+        """
+        if isinstance(source, CachedImage):
+            return source
+
+        if hasattr(source, 'read'):
+            source = source.read()
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            blob = bytes(source)
+            return self._get_or_load(('sha1', hashlib.sha1(blob).hexdigest()), lambda: CachedImage(blob))
+
+        with self._lock:
+            if source in self._registered:
+                return self._registered[source]
+
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+
+        def load():
+            with open(source, 'rb') as handle:
+                return CachedImage(handle.read(), os.path.basename(source))
+
+        return self._get_or_load(('path', source, stat.st_mtime_ns, stat.st_size), load)
+
+    def _get_or_load(self, key, load):
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+                return self._images[key]
+
+        image = load()
+        with self._lock:
+            self._images[key] = image
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+        return image
+
+    def get_or_add_image_part(self, package, image: CachedImage):
+        """
+        Return the image part holding ``image`` in ``package``, adding one if needed.
+        """
+        with self._lock:
+            index = self._part_indexes.get(package)
+            if index is None:
+                index = self._part_indexes[package] = {part.sha1: part for part in package._image_parts}
+
+            if image.sha1 not in index:
+                partname = package.next_image_partname(image.ext)
+                index[image.sha1] = ImagePart(partname, image.content_type, image.blob, package, image.filename)
+            return index[image.sha1]
+
+    def insert_picture(self, placeholder, image: CachedImage):
+        """
+        Replace a picture placeholder by a picture of ``image``, cropped to fit.
+
+        This mirrors python-pptx' ``PicturePlaceholder.insert_picture``, but
+        uses the cached image and image parts.
+
+        :return: the new ``PlaceholderPicture``.
+        """
+        if self.downscale:
+            image = image.fit(placeholder.width, placeholder.height, self.dpi)
+
+        image_part = self.get_or_add_image_part(placeholder.part.package, image)
+        rId = placeholder.part.relate_to(image_part, RT.IMAGE)
+        # python-pptx interpolates these into the XML as-is
+        desc, name = (escape(value, {'"': '&quot;'}) for value in (image.desc, placeholder.name))
+        pic = CT_Picture.new_ph_pic(placeholder.shape_id, name, desc, rId)
+        pic.crop_to_fit(image.size, (placeholder.width, placeholder.height))
+        parent = placeholder._parent
+        placeholder._replace_placeholder_with(pic)
+        return PlaceholderPicture(pic, parent)
@@ -1,9 +1,9 @@
-import os
 import warnings
 
 from pptx.enum.shapes import PP_PLACEHOLDER
 
 from .engines import BaseEngine
+from .images import ImageCache
 
 CONTEXT_KEY_FOR_PLACEHOLDER = 'PPT_CURRENT_PLACEHOLDER'
 
@@ -15,9 +15,10 @@ class AlreadyRenderedException(Exception):
 
 
 class PlaceholderContainer:
-    def __init__(self, placeholder, fragment: str):
+    def __init__(self, placeholder, fragment: str, image_cache: ImageCache = None):
         self.placeholder = placeholder
         self.fragment = fragment
+        self.image_cache = image_cache if image_cache is not None else ImageCache()
 
     def render(self, engine: BaseEngine, context: dict):
         context[CONTEXT_KEY_FOR_PLACEHOLDER] = self
@@ -28,18 +29,26 @@ class PlaceholderContainer:
                 return  # TODO placeholder delete if placeholder.text is empty?
 
             if self.placeholder.placeholder_format.type == PP_PLACEHOLDER.PICTURE:
-                rendered = rendered.strip()
+                if isinstance(rendered, str):
+                    rendered = rendered.strip()
                 self.render_picture(rendered)
             else:
                 self.placeholder.text = rendered
         except AlreadyRenderedException:
             pass
 
-    def render_picture(self, path):
-        if os.path.exists(path):
-            self.placeholder = self.placeholder.insert_picture(path)
+    def render_picture(self, source):
+        """
+        Insert a picture into the placeholder.
+
+        :param source: a key registered in the image cache, a path, bytes or a
+          file-like object.
+        """
+        image = self.image_cache.get(source)
+        if image is not None:
+            self.placeholder = self.image_cache.insert_picture(self.placeholder, image)
         else:
-            warnings.warn("File '{}' does not exist.")
+            warnings.warn("File '{}' does not exist.".format(source))
 
     def insert_link(self, url, description, add_break=False):
         """
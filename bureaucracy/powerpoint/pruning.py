@@ -0,0 +1,135 @@
+"""
+Dropping the parts of a rendered presentation that none of its slides use.
+
+Corporate templates come with dozens of slide layouts, several masters and
+large background images, while a rendered deck uses a handful of them. The
+parts of a presentation are saved by following its relationships, so
+pruning comes down to removing the relationships nothing refers to anymore:
+
+* slides that are no longer in the slide list,
+* layouts that no slide is based on, and masters none of whose layouts are
+  used,
+* pictures, media, charts and hyperlinks that were related to a slide,
+  layout or master but are not in its XML anymore, like the image of a
+  picture placeholder that was removed during the render.
+"""
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.package import XmlPart
+
+from bureaucracy.instrumentation import instrumentation
+from bureaucracy.utils import R_NAMESPACE
+
+__all__ = ['PruneReport', 'prune_presentation']
+
+# relationships that only exist because an element refers to them
+EXPLICIT_RELATIONSHIPS = {
+    RT.AUDIO, RT.CHART, RT.HYPERLINK, RT.IMAGE, RT.MEDIA, RT.OLE_OBJECT, RT.PACKAGE, RT.SLIDE, RT.VIDEO,
+}
+
+
+class PruneReport:
+    """
+    The parts removed from a presentation.
+
+    :param removed: a dict of the names of the removed parts and their size in bytes, uncompressed.
+    """
+
+    def __init__(self, removed):
+        self.removed = removed
+
+    @property
+    def bytes(self):
+        """
+        The number of bytes saved, before compression.
+        """
+        return sum(self.removed.values())
+
+    def _count(self, folder):
+        return sum(1 for partname in self.removed if partname.startswith(folder))
+
+    @property
+    def slides(self):
+        return self._count('/ppt/slides/')
+
+    @property
+    def layouts(self):
+        return self._count('/ppt/slideLayouts/')
+
+    @property
+    def masters(self):
+        return self._count('/ppt/slideMasters/')
+
+    @property
+    def media(self):
+        return self._count('/ppt/media/')
+
+    def __repr__(self):
+        return '<PruneReport {} bytes: {} slides, {} layouts, {} masters, {} media>'.format(
+            self.bytes, self.slides, self.layouts, self.masters, self.media)
+
+
+def prune_presentation(presentation) -> PruneReport:
+    """
+    Remove the slides, layouts, masters and media ``presentation`` does not use anymore.
+
+    A master and a layout are kept when there are no slides, since a presentation needs at least one of both.
+    """
+    package = presentation.part.package
+    before = list(package.iter_parts())
+
+    with instrumentation.timer('pptx.prune'):
+        _drop_unreferenced(presentation.part)
+
+        used_layouts = {slide.slide_layout.part for slide in presentation.slides}
+        masters = presentation.slide_masters
+        used_masters = [
+            master for master in masters if any(layout.part in used_layouts for layout in master.slide_layouts)
+        ] or [masters[0]]
+
+        keep = {master.part for master in used_masters}
+        for sldMasterId in list(masters._sldMasterIdLst):
+            if presentation.part.related_parts[sldMasterId.rId] not in keep:
+                _remove(presentation.part, sldMasterId)
+
+        for master in used_masters:
+            layouts = master.slide_layouts
+            keep = {layout.part for layout in layouts if layout.part in used_layouts} or {layouts[0].part}
+            for sldLayoutId in list(layouts._sldLayoutIdLst):
+                if master.part.related_parts[sldLayoutId.rId] not in keep:
+                    _remove(master.part, sldLayoutId)
+
+        for part in list(package.iter_parts()):
+            if isinstance(part, XmlPart):
+                _drop_unreferenced(part)
+
+        kept = set(package.iter_parts())
+        report = PruneReport({str(part.partname): len(part.blob) for part in before if part not in kept})
+
+    instrumentation.count('pptx.pruned_parts', len(report.removed))
+    instrumentation.count('pptx.pruned_bytes', report.bytes)
+    return report
+
+
+def _remove(part, id_element):
+    """
+    Remove an element of an id list, like ``p:sldMasterId``, and the relationship it refers to.
+    """
+    rId = id_element.rId
+    id_element.getparent().remove(id_element)
+    if rId not in _references(part):
+        del part.rels[rId]
+
+
+def _references(part):
+    """
+    Return the ids of the relationships the XML of ``part`` refers to, as r:id, r:embed, r:link...
+    """
+    return {value for element in part._element.iter() for name, value in element.attrib.items()
+            if name.startswith(R_NAMESPACE)}
+
+
+def _drop_unreferenced(part):
+    referenced = _references(part)
+    for rId, rel in list(part.rels.items()):
+        if rel.reltype in EXPLICIT_RELATIONSHIPS and rId not in referenced:
+            del part.rels[rId]
@@ -1,13 +1,18 @@
 from collections import OrderedDict
-from copy import copy
+from copy import copy, deepcopy
 
 from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
 from pptx.slide import Slide
 
+from bureaucracy.instrumentation import instrumentation
 from bureaucracy.powerpoint.tables import TableContainer
+from bureaucracy.utils import remap_relationships
 
+from .charts import ChartContainer
 from .engines import BaseEngine
 from .exceptions import TemplateSyntaxError
+from .images import ImageCache
 from .placeholders import AlreadyRenderedException, PlaceholderContainer
 from .shapes import ShapeContainer
 
@@ -22,9 +27,17 @@ class StopSlideRender(Exception):
 
 
 class SlideContainer:
-    def __init__(self, slide: Slide, presentation: Presentation):
+    def __init__(self, slide: Slide, presentation: Presentation, duplicates=None, image_cache: ImageCache = None,
+                 layout_cache: dict = None):
         self.slide = slide
         self.presentation = presentation
+        self.image_cache = image_cache if image_cache is not None else ImageCache()
+        # template code per slide layout partname, shared by all slides of a template
+        self.layout_cache = layout_cache if layout_cache is not None else {}
+        # ids of the slides that were copied from this one (or from its copies) while rendering
+        self.duplicates = duplicates if duplicates is not None else []
+        # callbacks to run once the slide is rendered, None when it is not rendering
+        self._after_render = None
 
     def __getattr__(self, name):
         """
@@ -89,11 +102,10 @@ class SlideContainer:
         :return: an OrderedDict with placeholder id's as key and template code
           as value.
         """
-        fragments = {}
+        if not self.slide.shapes:
+            return OrderedDict()
 
-        # set up the slide layout placeholder as template code
-        for placeholder in self.slide.slide_layout.placeholders:
-            fragments[placeholder.placeholder_format.idx] = placeholder.text
+        fragments = self.extract_layout_template_code().copy()
 
         # if a value exists for the placeholder in the slide itself, ignore the
         # template code
@@ -102,20 +114,65 @@ class SlideContainer:
                 continue
             del fragments[placeholder.placeholder_format.idx]
 
-        idxes = self.get_placeholder_idx_in_correct_order(fragments)
-        # return the template bits in the right order
-        return OrderedDict((idx, fragments[idx]) for idx in idxes)
+        return fragments
+
+    def extract_layout_template_code(self):
+        """
+        Extract the template code from the placeholders of the slide layout.
+
+        This only depends on the layout, so the result is cached per layout
+        in the layout cache.
+
+        :return: an OrderedDict with placeholder id's as key and template code
+          as value, in the order of evaluation.
+        """
+        layout = self.slide.slide_layout
+        key = str(layout.part.partname)
+        if key not in self.layout_cache:
+            fragments = {}
+
+            # set up the slide layout placeholder as template code
+            for placeholder in layout.placeholders:
+                fragments[placeholder.placeholder_format.idx] = placeholder.text
+
+            idxes = self.get_placeholder_idx_in_correct_order(fragments)
+            # keep the template bits in the right order
+            self.layout_cache[key] = OrderedDict((idx, fragments[idx]) for idx in idxes)
+        return self.layout_cache[key]
 
     def render(self, engine: BaseEngine, context: dict):
         """
         Delegate the rendering to the underlying placeholders.
         """
+        self._after_render = []
+        try:
+            self._render(engine, context)
+            callbacks = self._after_render
+        finally:
+            self._after_render = None
+        # the last callback first, so slides inserted by earlier ones end up in front
+        for callback in reversed(callbacks):
+            callback()
+
+    def after_render(self, callback):
+        """
+        Call ``callback`` once the slide is rendered completely, or right away when it is not being rendered.
+
+        Use this to copy the slide, so the copy has everything on it rendered.
+        """
+        if self._after_render is None:
+            callback()
+        else:
+            self._after_render.append(callback)
+
+    def _render(self, engine: BaseEngine, context: dict):
         context[CONTEXT_KEY_FOR_SLIDE] = self
 
         fragments = self.extract_template_code()
+        instrumentation.count('pptx.placeholders', len(fragments))
         for idx, fragment in fragments.items():
             try:
-                placeholder = PlaceholderContainer(self.slide.placeholders[idx], fragment)
+                placeholder = PlaceholderContainer(self.slide.placeholders[idx], fragment, self.image_cache)
             except KeyError:
                 raise TemplateSyntaxError(
                     'Altough it is present on the slide master, the placeholder does '
@@ -129,7 +186,8 @@ class SlideContainer:
                 if placeholder.is_empty:
                     placeholder.remove()
 
-        tables = [TableContainer(shape.table) for shape in self.slide.shapes if shape.has_table]
+        tables = [TableContainer(shape.table, self) for shape in self.slide.shapes if shape.has_table]
+        instrumentation.count('pptx.tables', len(tables))
 
         for table in tables:
             try:
@@ -137,15 +195,28 @@ class SlideContainer:
             except AlreadyRenderedException:
                 pass
 
+        charts = self.charts()
+        instrumentation.count('pptx.charts', len(charts))
+        for chart in charts:
+            chart.render(engine, context)
+
+    def charts(self):
+        """
+        Return a :class:`ChartContainer` for every chart on the slide.
+        """
+        return [ChartContainer(shape, self) for shape in self.slide.shapes if shape.has_chart]
+
     def insert_another(self):
         """
         Inserts the same slide into the presentation after the current position.
 
         NOTE: there's no insert slide method, only append to the end of the
         presentation, so we're using private API here.
+
+        :return: the newly inserted slide.
         """
         layout = self.slide.slide_layout
-        self.presentation.slides.add_slide(layout)
+        new_slide = self.presentation.slides.add_slide(layout)
 
         current_index = self.presentation.slides.index(self.slide)
         # always at the end, and the ID is fixed (does not indicate position)
@@ -153,3 +224,36 @@ class SlideContainer:
         slide_list = self.presentation.slides._sldIdLst
         slide_list.insert(current_index + 1, copy(slide_list[-1]))
         del slide_list[-1]
+        return new_slide
+
+    def duplicate(self):
+        """
+        Inserts a copy of the slide as it is now, shapes included, after the current position.
+
+        Unlike :meth:`insert_another`, the copy is not rendered by the template:
+        it already holds the rendered content of this slide.
+
+        :return: a :class:`SlideContainer` for the copy.
+        """
+        new_slide = self.insert_another()
+        self.duplicates.append(new_slide.slide_id)
+
+        source_tree = self.slide.shapes._spTree
+        target_tree = new_slide.shapes._spTree
+        for child in list(target_tree):
+            target_tree.remove(child)
+        for child in source_tree:
+            target_tree.append(deepcopy(child))
+
+        # relationships (pictures, hyperlinks...) have to be re-created on the new slide part
+        source_part, target_part = self.slide.part, new_slide.part
+
+        def relate(rel):
+            # the new slide already has its layout
+            if rel.reltype != RT.SLIDE_LAYOUT:
+                return target_part.relate_to(rel.target_part, rel.reltype)
+
+        remap_relationships(target_tree.iter(), source_part, target_part, relate)
+
+        return SlideContainer(new_slide, self.presentation, duplicates=self.duplicates,
+                              image_cache=self.image_cache, layout_cache=self.layout_cache)
@@ -1,13 +1,20 @@
+from copy import deepcopy
+
+from pptx.oxml.ns import qn
 from pptx.shapes.table import Table, _Cell
 
 from bureaucracy.powerpoint.engines import BaseEngine
 
 CONTEXT_KEY_FOR_TABLE = 'PPT_CURRENT_TABLE'
 
+# path from an a:tr to the text nodes of its cells, once every cell is reduced to a single run
+CELL_TEXT_PATH = './' + '/'.join(qn(tag) for tag in ('a:tc', 'a:txBody', 'a:p', 'a:r', 'a:t'))
+
 
 class TableContainer(object):
-    def __init__(self, table: Table):
+    def __init__(self, table: Table, slide=None):
         self.table = table
+        self.slide = slide
 
     def render(self, engine: BaseEngine, context: dict):
         context[CONTEXT_KEY_FOR_TABLE] = self
@@ -30,6 +37,131 @@ class TableContainer(object):
     def column_count(self):
         return len(self.table.columns)
 
+    def fill(self, data, header_rows=0, max_rows=None):
+        """
+        Fill the table with a 2-D iterable of values in a single pass.
+
+        The first ``header_rows`` rows of the table are left alone. The other
+        rows are replaced by one row per item in ``data``, each a copy of the
+        last row of the table so the template's formatting is kept. Values are
+        written straight into the ``a:tc`` elements, bypassing the python-pptx
+        cell proxies. All rows are checked before the table is changed.
+
+        If ``max_rows`` is given, at most that many data rows are put in this
+        table. The remaining rows are split over continuation slides, which
+        are copies of the current slide inserted right after it. This
+        requires the table to know its slide. During a render, the slide is
+        copied once it is rendered completely, and the tables on the copies
+        are added to the returned list then.
+
+        :param data: iterable of rows, each an iterable of values. Values are
+          converted with ``str``, ``None`` becomes an empty cell.
+        :param header_rows: the number of leading rows to keep as-is. Header
+          rows are repeated on continuation slides.
+        :param max_rows: the maximum number of data rows per table.
+        :return: a list of the filled tables, starting with this one.
+        """
+        if header_rows >= self.row_count:
+            raise ValueError("The table needs at least one row below its {} header row(s)".format(header_rows))
+        if max_rows is not None and max_rows < 1:
+            raise ValueError("max_rows should be a positive number")
+
+        n_cols = self.column_count
+        rows = []
+        for row_idx, values in enumerate(data):
+            values = list(values)
+            if len(values) > n_cols:
+                raise ValueError("Row {} has {} values, but the table only has {} columns".format(
+                    row_idx, len(values), n_cols))
+            rows.append(values)
+
+        size = max_rows or len(rows)
+        chunks = [rows[start:start + size] for start in range(0, len(rows), size)] or [[]]
+        if len(chunks) > 1 and self.slide is None:
+            raise ValueError("The data does not fit in {} rows and the table has no slide "
+                             "to continue on".format(max_rows))
+
+        self._fill_rows(chunks[0], header_rows)
+        tables = [self]
+        if len(chunks) > 1:
+            # the copies of the slide should have the rest of the slide rendered as well
+            self.slide.after_render(lambda: self._continue(tables, chunks[1:], header_rows))
+        return tables
+
+    def _fill_rows(self, rows, header_rows):
+        tbl = self.table._tbl
+        tr_lst = tbl.tr_lst
+        prototype = _prepare_row(deepcopy(tr_lst[-1]))
+
+        for tr in tr_lst[header_rows:]:
+            tbl.remove(tr)
+
+        anchor = tr_lst[header_rows - 1] if header_rows else tbl.tblGrid
+        for values in rows:
+            tr = deepcopy(prototype)
+            text_nodes = tr.findall(CELL_TEXT_PATH)
+            for node, value in zip(text_nodes, values):
+                node.text = '' if value is None else str(value)
+            anchor.addnext(tr)
+            anchor = tr
+
+        # python-pptx' notify_height_changed is quadratic in the number of rows
+        self.table._graphic_frame.height = sum(int(tr.get('h')) for tr in tbl.tr_lst)
+
+    def _continue(self, tables, chunks, header_rows):
+        """
+        Put every chunk of rows on a copy of the slide of the last table, and add those tables to ``tables``.
+        """
+        table = self
+        for chunk in chunks:
+            table = table._copy_slide()
+            table._fill_rows(chunk, header_rows)
+            tables.append(table)
+
+    def _copy_slide(self):
+        """
+        Copy the slide this table is on and return the table on the copy.
+        """
+        graphic_frame = self.table._graphic_frame
+        position = self.slide.shapes.index(graphic_frame)
+        continuation = self.slide.duplicate()
+        return TableContainer(continuation.shapes[position].table, continuation)
+
+
+def _prepare_row(tr):
+    """
+    Reduce every cell in the row ``tr`` to a single paragraph with a single, empty run.
+
+    Formatting of the first paragraph and run is kept, so the cleaned row can be
+    copied for each data row.
+    """
+    for tc in tr.tc_lst:
+        txBody = tc.get_or_add_txBody()
+        paragraphs = txBody.findall(qn('a:p'))
+        for p in paragraphs[1:]:
+            txBody.remove(p)
+        p = paragraphs[0]
+
+        runs = p.findall(qn('a:r'))
+        run_props = runs[0].find(qn('a:rPr')) if runs else p.find(qn('a:endParaRPr'))
+        for child in list(p):
+            if child.tag != qn('a:pPr') and child.tag != qn('a:endParaRPr'):
+                p.remove(child)
+
+        r = p.makeelement(qn('a:r'), {})
+        if run_props is not None:
+            rPr = deepcopy(run_props)
+            rPr.tag = qn('a:rPr')
+            r.append(rPr)
+        r.append(r.makeelement(qn('a:t'), {}))
+
+        end_props = p.find(qn('a:endParaRPr'))
+        if end_props is not None:
+            end_props.addprevious(r)
+        else:
+            p.append(r)
+    return tr
+
 
 class CellContainer(object):
     def __init__(self, cell: _Cell):
@@ -41,4 +173,4 @@ class CellContainer(object):
 
     @text.setter
     def text(self, text):
-        self.cell.text = text
\ No newline at end of file
+        self.cell.text = text
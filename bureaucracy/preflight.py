@@ -0,0 +1,82 @@
+"""
+Checking a context against a template before rendering it.
+
+Strict templates check every context before they copy the document, so a
+bad context is rejected before any work is done, with a report of
+everything that is wrong with it instead of just the first problem found.
+"""
+
+__all__ = ['Problem', 'PreflightReport', 'PreflightError']
+
+# problem codes
+MISSING = 'missing'
+POSITION = 'position'
+INVALID = 'invalid'
+
+
+class Problem:
+    """
+    Something wrong with the value for a field.
+
+    :param field: the name of the field.
+    :param code: 'missing' if the context has no value for the field,
+      'position' if the replacement can't be used where the field is and
+      'invalid' if the replacement itself is broken.
+    :param message: a description of the problem.
+    """
+
+    def __init__(self, field, code, message):
+        self.field = field
+        self.code = code
+        self.message = message
+
+    def as_dict(self):
+        return {'field': self.field, 'code': self.code, 'message': self.message}
+
+    def __eq__(self, other):
+        return isinstance(other, Problem) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return '<Problem {} {!r}: {}>'.format(self.code, self.field, self.message)
+
+    def __str__(self):
+        return self.message
+
+
+class PreflightReport:
+    """
+    The problems found checking a context.
+    """
+
+    def __init__(self, problems=None):
+        self.problems = list(problems or [])
+
+    @property
+    def ok(self):
+        return not self.problems
+
+    def add(self, field, code, message):
+        self.problems.append(Problem(field, code, message))
+
+    def as_dicts(self):
+        return [problem.as_dict() for problem in self.problems]
+
+    def raise_for_problems(self):
+        if self.problems:
+            raise PreflightError(self)
+
+    def __str__(self):
+        return '; '.join(str(problem) for problem in self.problems) or 'ok'
+
+
+class PreflightError(ValueError):
+    """
+    Raised when a strict template is rendered with a context that has problems.
+
+    :attr:`problems` holds the list of :class:`Problem` instances.
+    """
+
+    def __init__(self, report: PreflightReport):
+        super().__init__(str(report))
+        self.report = report
+        self.problems = report.problems
@@ -0,0 +1,196 @@
+"""
+Capturing profiles of slow renders, to analyse them offline.
+
+Templates given a profiler run every render under :mod:`cProfile` and,
+optionally, :mod:`tracemalloc`. Renders that take longer than the threshold,
+and a sampled fraction of the others, are written to a directory::
+
+    from bureaucracy.profiling import RenderProfiler
+
+    profiler = RenderProfiler('/var/log/bureaucracy/profiles', threshold=10, sample_rate=0.001)
+    template = DocxTemplate('letter.docx', profiler=profiler)
+
+Every capture is a directory with ``profile.prof`` (load it with
+:mod:`pstats` or snakeviz), ``allocations.tracemalloc`` (a
+:class:`tracemalloc.Snapshot` of the memory still allocated at the end of
+the render) and ``capture.json``, with the duration, the peak memory, the
+counts and phase timings reported to :mod:`bureaucracy.instrumentation`
+(number of fields, slides, ...) and a fingerprint of the context. Only the
+most recent captures are kept.
+
+Profiling slows renders down, so only attach a profiler where that is
+acceptable.
+"""
+import cProfile
+import datetime
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from bureaucracy.cache import fingerprint
+from bureaucracy.instrumentation import MetricsSink, instrumentation
+from bureaucracy.utils import SharedService
+
+__all__ = ['RenderProfiler']
+
+logger = logging.getLogger('bureaucracy')
+
+# the directory name of a capture: the time, the process id and the kind of render. Anything else in the
+# directory is left alone by the rotation.
+CAPTURE_NAME = re.compile(r'capture-\d{8}-\d{6}-\d{6}-\d+-\w+$')
+
+
+class RenderProfiler(SharedService, MetricsSink):
+    """
+    Profiles renders and writes the slow ones to a directory.
+
+    :param directory: the directory to write the captures to, created if it doesn't exist.
+    :param threshold: the duration in seconds from which a render is captured.
+    :param sample_rate: the fraction of the other renders to capture, from 0 to 1.
+    :param max_captures: the number of captures to keep, older ones are removed.
+    :param trace_allocations: trace the memory allocations with tracemalloc, which is slow. The peak memory of
+      renders that run at the same time covers all of them.
+    """
+
+    def __init__(self, directory, threshold: float = 10.0, sample_rate: float = 0.0, max_captures: int = 20,
+                 trace_allocations: bool = False):
+        self.directory = directory
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.max_captures = max_captures
+        self.trace_allocations = trace_allocations
+        os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._started_tracing = False
+
+    @contextmanager
+    def capture(self, kind: str, context=None):
+        """
+        Profile the block, a render of a ``kind`` ('docx', 'pptx') template with ``context``.
+
+        Renders within the block, like sub-templates, are part of its capture.
+        """
+        if getattr(self._local, 'capture', None) is not None:
+            yield
+            return
+
+        capture = {'counts': {}, 'timings': {}}
+        self._local.capture = capture
+        self._start()
+        profile = cProfile.Profile()
+        error = None
+        started = datetime.datetime.now()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        except BaseException as exc:
+            error = repr(exc)
+            raise
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - start
+            self._local.capture = None
+
+            write = duration >= self.threshold or random.random() < self.sample_rate
+            snapshot, peak = None, None
+            if self.trace_allocations:
+                peak = tracemalloc.get_traced_memory()[1]
+                if write:
+                    snapshot = tracemalloc.take_snapshot()
+            self._stop()
+
+            if write:
+                capture.update({
+                    'kind': kind,
+                    'started': started.isoformat(),
+                    'duration': duration,
+                    'threshold': self.threshold,
+                    'sampled': duration < self.threshold,
+                    'error': error,
+                    'peak_memory': peak,
+                    'context': _fingerprint(context),
+                })
+                try:
+                    self._write(capture, profile, snapshot)
+                except OSError:
+                    logger.exception("Could not write the profile of a %s render", kind)
+
+    def _start(self):
+        with self._lock:
+            if self._active == 0:
+                # collect the counts and timings of the renders
+                instrumentation.add_sink(self)
+                if self.trace_allocations:
+                    if not tracemalloc.is_tracing():
+                        tracemalloc.start()
+                        self._started_tracing = True
+                    if hasattr(tracemalloc, 'reset_peak'):
+                        # Python 3.9+, before that the peak is the highest since tracing started
+                        tracemalloc.reset_peak()
+            self._active += 1
+
+    def _stop(self):
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                instrumentation.remove_sink(self)
+                if self._started_tracing:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+
+    def timing(self, name, seconds, tags):
+        capture = getattr(self._local, 'capture', None)
+        if capture is not None:
+            capture['timings'][name] = capture['timings'].get(name, 0.0) + seconds
+
+    def count(self, name, value, tags):
+        capture = getattr(self._local, 'capture', None)
+        if capture is not None:
+            capture['counts'][name] = capture['counts'].get(name, 0) + value
+
+    def _write(self, capture, profile, snapshot):
+        # the names sort by time, for the rotation
+        started = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        name = 'capture-{}-{}-{}'.format(started, os.getpid(), capture['kind'])
+        path = os.path.join(self.directory, name)
+        os.makedirs(path)
+        profile.dump_stats(os.path.join(path, 'profile.prof'))
+        if snapshot is not None:
+            snapshot.dump(os.path.join(path, 'allocations.tracemalloc'))
+        with open(os.path.join(path, 'capture.json'), 'w') as outfile:
+            json.dump(capture, outfile, indent=2)
+        logger.warning("A %s render took %.1fs, its profile was written to %s", capture['kind'], capture['duration'],
+                       path)
+        self._rotate()
+
+    def captures(self):
+        """
+        Return the paths of the captures, oldest first.
+        """
+        with os.scandir(self.directory) as scan:
+            return sorted(entry.path for entry in scan if entry.is_dir() and CAPTURE_NAME.match(entry.name))
+
+    def _rotate(self):
+        captures = self.captures()
+        for path in captures[:max(len(captures) - self.max_captures, 0)]:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _fingerprint(context):
+    if context is None:
+        return None
+    try:
+        return fingerprint(context)
+    except TypeError:
+        return None
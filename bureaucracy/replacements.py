@@ -1,18 +1,40 @@
 import os
 import tempfile
-from copy import copy
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy, deepcopy
+from io import BytesIO
+from weakref import WeakKeyDictionary
 
-import pypandoc
 from docx import Document
-from docx.oxml import CT_Tbl
+from docx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.oxml import CT_Tbl, parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.parts.numbering import NumberingPart
 from docx.table import Table
 from docx.text.paragraph import Paragraph
 
+from bureaucracy.instrumentation import instrumentation
+from bureaucracy.utils import remap_relationships
+
 
 class Replacement(object):
+    # replacements that can only be filled in once, because they move their nodes into the document
+    single_use = False
+
     def fill(self, el):
         raise NotImplementedError
 
+    def check(self):
+        """
+        Return a list of the problems that would make filling in this replacement fail, used by the preflight.
+        """
+        return []
+
+    # Replacements that implement `fingerprint` can be part of cached renders, see bureaucracy.cache. It returns
+    # the data the replacement fills in, as plain values.
+
 
 class RunReplacement(Replacement):
     pass
@@ -36,26 +58,66 @@ class ImageReplacement(RunReplacement):
     def fill(self, run):
         run.add_picture(self.filename, self.width, self.height)
 
+    def check(self):
+        if not hasattr(self.filename, 'read') and not os.path.isfile(self.filename):
+            return ["File '{}' does not exist".format(self.filename)]
+        return []
 
-class HTMLReplacement(ParagraphReplacement):
-    def __init__(self, html):
-        # fixme: pandoc doesn't allow us to generate a docx stream in memory, so we have to use a temporary file,
-        # which makes this part slow in comparison to other replacements. if anyone knows about a good html to
-        # docx converter; help yourself.
+    def fingerprint(self):
+        if hasattr(self.filename, 'read'):
+            position = self.filename.tell()
+            data = self.filename.read()
+            self.filename.seek(position)
+        else:
+            with open(self.filename, 'rb') as infile:
+                data = infile.read()
+        return [data, self.width, self.height]
 
-        _, tmp_file_name = tempfile.mkstemp(suffix='.docx')
-        pypandoc.convert(html, format='html', to='docx', outputfile=tmp_file_name)
-        doc = Document(tmp_file_name)
-
-        # find all paragraphs in the output
-        self.par_nodes = doc._element.xpath('./w:body/w:p')
 
-        # we just add all styles in the output document. This opens us up to the possibility of clashing styles,
-        # but for now that doesn't seem to be an issue. only adding the styles used in the output of pandoc and their
-        # ancestors in the style hierarchy would be the ideal solutionm, but this works for now.
-        self.styles = doc.styles
-
-        os.remove(tmp_file_name)
+class HTMLReplacement(ParagraphReplacement):
+    single_use = True
+
+    def __init__(self, html, converted=None):
+        """
+        :param html: the html to fill in.
+        :param converted: the paragraphs and styles pandoc converted ``html`` to already, see `convert_many`.
+        """
+        self.html = html
+        self.par_nodes, self.styles = converted if converted is not None else _convert_html(html)
+
+    @classmethod
+    def convert_many(cls, fragments, workers=None):
+        """
+        Convert many html fragments at once, in a pool of threads running pandoc.
+
+        Identical fragments are converted only once.
+        :param fragments: an iterable of html strings, or a dict with html strings as values
+        :param workers: the maximum number of pandoc processes at once, defaults to the number of CPUs
+        :return: a list of replacements in the order of the fragments, or a dict with the keys of ``fragments``
+        """
+        keys = None
+        if isinstance(fragments, Mapping):
+            keys, fragments = list(fragments.keys()), list(fragments.values())
+        else:
+            fragments = list(fragments)
+
+        unique = list(dict.fromkeys(fragments))
+        instrumentation.count('html.deduplicated', len(fragments) - len(unique))
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            converted = dict(zip(unique, executor.map(_convert_html, unique)))
+
+        replacements = []
+        seen = set()
+        for html in fragments:
+            par_nodes, styles = converted[html]
+            if html in seen:
+                # filling in moves the paragraphs into the document, so every replacement needs its own
+                par_nodes = [deepcopy(node) for node in par_nodes]
+            seen.add(html)
+
+            replacements.append(cls(html, converted=(par_nodes, styles)))
+
+        return dict(zip(keys, replacements)) if keys is not None else replacements
 
     def fill_paragraph(self, par):
         body_el = par._element.getparent()
@@ -65,23 +127,21 @@ class HTMLReplacement(ParagraphReplacement):
         for style in self.styles:
             par.part.document.styles._element.append(copy(style._element))
 
+    def fingerprint(self):
+        return self.html
+
 
 class TableReplacement(ParagraphReplacement):
     def __init__(self, data, headers):
-        if not isinstance(data, (list, tuple)) or any(not isinstance(d, (list, tuple)) for d in data):
-            raise Exception("data should be a list or tuple of lists or tuples")
-        if headers and not isinstance(headers, (list, tuple)):
-            raise Exception("headers should be a list or tuple")
-
-        if isinstance(data, (list, tuple)) and data:
-            if any(len(d) != len(data[0]) for d in data):
-                raise ValueError("Data contains rows of varying sizes")
-            if headers and len(data[0]) != len(headers):
-                raise ValueError("Data and header lengths do not match")
+        for error in _table_errors(data, headers):
+            raise error
 
         self.headers = headers
         self.data = data
 
+    def check(self):
+        return [str(error) for error in _table_errors(self.data, self.headers)]
+
     def fill_paragraph(self, par):
 
         nr_rows = len(self.data) if self.data else 0
@@ -104,6 +164,206 @@ class TableReplacement(ParagraphReplacement):
             for col_idx, cell_value in enumerate(row_values):
                 table.rows[row_idx].cells[col_idx].text = str(cell_value)
 
+    def fingerprint(self):
+        return [self.headers, self.data]
+
+
+class TemplateReplacement(ParagraphReplacement):
+    """
+    Inserts the body of another template, rendered with its own context.
+
+    The styles and numbering definitions of the template are added to the
+    output document once, however often the template is inserted, and its
+    images are added once per image.
+
+    :param template: the `DocxTemplate` to insert. Load it once and reuse it, so it is parsed and compiled once.
+    :param context: the context to render it with.
+    """
+
+    def __init__(self, template, context=None):
+        self.template = template
+        self.context = context if context is not None else {}
+
+    def check(self):
+        if not self.template.strict:
+            return []
+        return [str(problem) for problem in self.template.preflight(self.context).problems]
+
+    def fill_paragraph(self, par):
+        root, source = self.template.render_element(self.context)
+        body = root.find(qn('w:body'))
+        # the document keeps its own sections: the section breaks of the template are left out with their headers
+        # and footers, and so are the paragraphs that held nothing but a section break
+        nodes = []
+        for node in body:
+            if node.tag == qn('w:sectPr'):
+                continue
+            breaks = list(node.iter(qn('w:sectPr')))
+            for sect_pr in breaks:
+                sect_pr.getparent().remove(sect_pr)
+            if breaks and node.tag == qn('w:p') and all(child.tag == qn('w:pPr') for child in node):
+                continue
+            nodes.append(node)
+
+        part = par.part
+        merged = _merged_templates.setdefault(part, {})
+        key = self.template._content_hash()
+        if key not in merged:
+            # numbering first, the styles may refer to it
+            numbering = _merge_numbering(source.part, part)
+            _merge_styles(source.part, part, numbering)
+            merged[key] = numbering
+        numbering = merged[key]
+
+        with instrumentation.timer('docx.subtemplate.relate'):
+            _relate(nodes, source.part, part)
+        if numbering:
+            _renumber(nodes, numbering)
+
+        body_el = par._element.getparent()
+        par_idx = body_el.index(par._element)
+        body_el[par_idx:par_idx + 1] = nodes
+
+    def fingerprint(self):
+        return [self.template._content_hash(), self.context]
+
+
+# per output document part, the numbering map of every template inserted in it, by content hash
+_merged_templates = WeakKeyDictionary()
+
+
+def _relate(nodes, source_part, target_part):
+    """
+    Point the relationship ids in the nodes from the source part to the same targets of the target part.
+    """
+    def relate(rel):
+        if rel.reltype != RT.IMAGE:
+            raise ValueError("Can't insert a template with a relationship of type {}".format(rel.reltype))
+        # images are stored once per document, by their hash
+        rId, _ = target_part.get_or_add_image(BytesIO(rel.target_part.blob))
+        return rId
+
+    remap_relationships((element for node in nodes for element in node.iter()), source_part, target_part, relate)
+
+
+def _merge_styles(source_part, target_part, numbering):
+    """
+    Add the styles of the source document that the target document does not have.
+    """
+    target = target_part.styles.element
+    existing = set(target.xpath('./w:style/@w:styleId'))
+    for style in source_part.styles.element.xpath('./w:style'):
+        if style.get(qn('w:styleId')) not in existing:
+            style = deepcopy(style)
+            if numbering:
+                _renumber([style], numbering)
+            target.append(style)
+
+
+def _merge_numbering(source_part, target_part):
+    """
+    Add the numbering definitions of the source document to the target document, under new ids.
+
+    :return: a dict with the new id of every numbering definition, by its old id.
+    """
+    try:
+        source = source_part.part_related_by(RT.NUMBERING).element
+    except KeyError:
+        return {}
+    if not source.xpath('./w:num'):
+        return {}
+
+    try:
+        target = target_part.part_related_by(RT.NUMBERING).element
+    except KeyError:
+        target = parse_xml('<w:numbering {}/>'.format(nsdecls('w')))
+        numbering_part = NumberingPart(PackURI('/word/numbering.xml'), CT.WML_NUMBERING, target,
+                                       target_part.package)
+        target_part.relate_to(numbering_part, RT.NUMBERING)
+
+    next_abstract_id = max([int(value) for value in target.xpath('./w:abstractNum/@w:abstractNumId')] + [-1]) + 1
+    next_id = max([int(value) for value in target.xpath('./w:num/@w:numId')] + [0]) + 1
+
+    abstract_ids = {}
+    # abstract numbering definitions go before the numbering definitions
+    first_num = next(iter(target.xpath('./w:num')), None)
+    for abstract in source.xpath('./w:abstractNum'):
+        abstract = deepcopy(abstract)
+        abstract_ids[abstract.get(qn('w:abstractNumId'))] = str(next_abstract_id)
+        abstract.set(qn('w:abstractNumId'), str(next_abstract_id))
+        next_abstract_id += 1
+        if first_num is not None:
+            first_num.addprevious(abstract)
+        else:
+            target.append(abstract)
+
+    ids = {}
+    for num in source.xpath('./w:num'):
+        num = deepcopy(num)
+        ids[num.get(qn('w:numId'))] = str(next_id)
+        num.set(qn('w:numId'), str(next_id))
+        next_id += 1
+        for abstract_id in num.xpath('./w:abstractNumId'):
+            abstract_id.set(qn('w:val'), abstract_ids.get(abstract_id.get(qn('w:val')), abstract_id.get(qn('w:val'))))
+        target.append(num)
+    return ids
+
+
+def _renumber(nodes, numbering):
+    for node in nodes:
+        for num_id in node.iter(qn('w:numId')):
+            value = num_id.get(qn('w:val'))
+            if value in numbering:
+                num_id.set(qn('w:val'), numbering[value])
+
+
+def _convert_html(html):
+    """
+    Convert html to docx with pandoc and return the paragraphs and styles of the result.
+    """
+    # fixme: pandoc doesn't allow us to generate a docx stream in memory, so we have to use a temporary file,
+    # which makes this part slow in comparison to other replacements. if anyone knows about a good html to
+    # docx converter; help yourself.
+
+    import pypandoc  # imported here, pypandoc looks for the pandoc executable on import
+
+    handle, tmp_file_name = tempfile.mkstemp(suffix='.docx')
+    os.close(handle)
+    try:
+        if instrumentation.enabled:
+            instrumentation.count('html.bytes_in', len(html.encode('utf-8')))
+        with instrumentation.timer('html.pandoc'):
+            pypandoc.convert_text(html, 'docx', format='html', outputfile=tmp_file_name)
+        doc = Document(tmp_file_name)
+    finally:
+        os.remove(tmp_file_name)
+
+    # find all paragraphs in the output
+    par_nodes = doc._element.xpath('./w:body/w:p')
+
+    # we just add all styles in the output document. This opens us up to the possibility of clashing styles,
+    # but for now that doesn't seem to be an issue. only adding the styles used in the output of pandoc and their
+    # ancestors in the style hierarchy would be the ideal solutionm, but this works for now.
+    return par_nodes, doc.styles
+
+
+def _table_errors(data, headers):
+    """
+    Yield the errors in the data and headers of a table, as exceptions.
+    """
+    if not isinstance(data, (list, tuple)) or any(not isinstance(d, (list, tuple)) for d in data):
+        yield Exception("data should be a list or tuple of lists or tuples")
+        return
+    if headers and not isinstance(headers, (list, tuple)):
+        yield Exception("headers should be a list or tuple")
+        return
+
+    if data:
+        if any(len(d) != len(data[0]) for d in data):
+            yield ValueError("Data contains rows of varying sizes")
+        elif headers and len(data[0]) != len(headers):
+            yield ValueError("Data and header lengths do not match")
+
 
 class TextReplacement(RunReplacement):
     def __init__(self, text):
@@ -111,3 +371,6 @@ class TextReplacement(RunReplacement):
 
     def fill(self, run):
         run.text = str(self.text)
+
+    def fingerprint(self):
+        return self.text
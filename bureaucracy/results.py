@@ -0,0 +1,109 @@
+"""
+The outcome of a render, which produces the formats a caller asks for.
+"""
+import os
+import threading
+
+__all__ = ['RenderResult', 'DocxRenderResult']
+
+
+class RenderResult:
+    """
+    Holds a rendered document and produces it in the supported formats on demand.
+
+    Every format is produced at most once and kept, so asking for the docx
+    and the pdf of a render costs a single render and a single conversion.
+    Results are safe to share between threads.
+
+    :param cache: a :class:`bureaucracy.cache.BaseCache` to look the formats up in, and store them.
+    :param key: the cache key of the render.
+    """
+    formats = ()
+
+    def __init__(self, cache=None, key=None):
+        self.cache = cache
+        self.key = key
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def produce(self, format: str) -> bytes:
+        """
+        Produce the document in ``format``, called once per format.
+        """
+        raise NotImplementedError("You must implement the `produce` method.")
+
+    def get(self, format: str) -> bytes:
+        """
+        Return the document as bytes in ``format``.
+        """
+        if format not in self.formats:
+            raise ValueError("Unsupported format '{}', use one of {}".format(format, ', '.join(self.formats)))
+        with self._lock:
+            return self._get(format)
+
+    def _get(self, format):
+        # called with the lock held
+        if format not in self._data:
+            if self.cache is not None and self.key is not None:
+                key = '{}.{}'.format(self.key, format)
+                self._data[format] = self.cache.get_or_render(key, lambda: self.produce(format), format)
+            else:
+                self._data[format] = self.produce(format)
+        return self._data[format]
+
+    def getbuffer(self, format: str) -> memoryview:
+        """
+        Return a read-only view on the document in ``format``, without copying it.
+        """
+        return memoryview(self.get(format))
+
+    def save(self, path, format: str = None):
+        """
+        Write the document to ``path``, in the format of its extension unless ``format`` is given.
+        """
+        if format is None:
+            format = os.path.splitext(path)[1].lstrip('.').lower()
+        with open(path, 'wb') as outfile:
+            outfile.write(self.getbuffer(format))
+
+    def is_cached(self, format: str) -> bool:
+        return format in self._data
+
+    def __repr__(self):
+        return '<{} cached: {}>'.format(type(self).__name__, ', '.join(sorted(self._data)) or '-')
+
+
+class DocxRenderResult(RenderResult):
+    """
+    A rendered docx template, as returned by ``DocxTemplate.render(context, format=None)``.
+
+    :param template: the template that was rendered, which converts the document to pdf.
+    :param document: the rendered document, if it was rendered with the python-docx object model.
+    :param data: the rendered document as docx bytes.
+
+    See :class:`RenderResult` for the other options.
+    """
+    formats = ('docx', 'pdf')
+
+    def __init__(self, template, document=None, data=None, **kwargs):
+        super().__init__(**kwargs)
+        self.template = template
+        self._document = document
+        if data is not None:
+            self._data['docx'] = data
+
+    @property
+    def docx(self) -> bytes:
+        return self.get('docx')
+
+    @property
+    def pdf(self) -> bytes:
+        return self.get('pdf')
+
+    def produce(self, format):
+        if format == 'docx':
+            data = self._document._to_docx_bytes()
+            # the bytes are all we need from now on
+            self._document = None
+            return data
+        return self.template._convert(self._get('docx'))
@@ -0,0 +1,273 @@
+"""
+Sharing a converter between interactive requests and bulk jobs.
+
+A :class:`ConversionScheduler` sits in front of a converter and runs the
+conversions submitted to it in a fixed number of threads, by priority:
+'interactive' conversions (someone is waiting for a download) go before
+'default' ones, which go before 'batch' ones. Bulk conversions are split in
+small jobs, so an interactive conversion never waits for more than one of
+them, and workers can be reserved for interactive conversions so it
+doesn't even have to wait for that::
+
+    scheduler = ConversionScheduler(SofficeConverter(workers=4), workers=4, reserved_workers=1)
+
+    DocxTemplate('letter.docx', converter=scheduler.for_priority('interactive', timeout=10))
+    DocxBatchRenderer(...)  # with a converter=scheduler.for_priority('batch')
+
+A conversion that doesn't start within its timeout is dropped and fails
+with :class:`DeadlineExceeded`, nobody is waiting for it anymore. The number
+of queued conversions is limited per priority: when a queue is full,
+submitting blocks until there is room (or the timeout passes), or fails
+right away with :class:`QueueFull`.
+
+The depth of the queue is reported to :mod:`bureaucracy.instrumentation`
+as ``convert.queue_depth`` on every submit, the time every job waited as
+``convert.queue_wait`` and the jobs that were dropped as
+``convert.rejected`` and ``convert.expired``, all tagged with the priority.
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+from bureaucracy.converters import BaseConverter, ConversionError
+from bureaucracy.instrumentation import instrumentation
+from bureaucracy.utils import SharedService
+
+__all__ = ['PRIORITIES', 'QueueFull', 'DeadlineExceeded', 'ConversionScheduler', 'ScheduledConverter']
+
+# from most to least urgent
+PRIORITIES = ('interactive', 'default', 'batch')
+
+INTERACTIVE = 0
+NO_DEADLINE = float('inf')
+
+
+class QueueFull(ConversionError):
+    pass
+
+
+class DeadlineExceeded(ConversionError):
+    pass
+
+
+class _Job:
+    def __init__(self, documents, source_format, target_format, priority):
+        self.documents = documents
+        self.source_format = source_format
+        self.target_format = target_format
+        self.priority = priority
+        self.queued = time.monotonic()
+        self.future = Future()
+
+
+class ConversionScheduler(SharedService):
+    """
+    Runs conversions with a converter by priority, in a pool of threads.
+
+    Jobs of the same priority start in order of their deadline, then in the order they were submitted.
+
+    :param converter: the :class:`bureaucracy.converters.BaseConverter` that does the conversions. It should be able
+      to run ``workers`` conversions at once, like a :class:`SofficeConverter` with as many workers.
+    :param workers: the number of conversions to run at once.
+    :param reserved_workers: the number of workers that only run interactive conversions.
+    :param max_queue: the maximum number of jobs waiting to start, per priority.
+    :param block: when a queue is full, wait for room instead of raising :class:`QueueFull`.
+    :param batch_size: the maximum number of documents per job. Larger conversions are split.
+    """
+
+    def __init__(self, converter: BaseConverter, workers: int = 1, reserved_workers: int = 0, max_queue: int = 100,
+                 block: bool = True, batch_size: int = 10):
+        if not 0 <= reserved_workers < workers:
+            raise ValueError("Reserve fewer workers than the {} there are, for the other priorities".format(workers))
+        self.converter = converter
+        self.workers = workers
+        self.reserved_workers = reserved_workers
+        self.max_queue = max_queue
+        self.block = block
+        self.batch_size = batch_size
+
+        self._heap = []
+        self._depth = dict.fromkeys(PRIORITIES, 0)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def for_priority(self, priority: str = 'default', timeout: float = None) -> 'ScheduledConverter':
+        """
+        Return a converter that submits its conversions to this scheduler, to pass to templates.
+
+        :param priority: 'interactive', 'default' or 'batch'.
+        :param timeout: the number of seconds a conversion may wait for a worker.
+        """
+        _rank(priority)
+        return ScheduledConverter(self, priority, timeout)
+
+    def depth(self, priority: str = None) -> int:
+        """
+        Return the number of jobs waiting to start, of ``priority`` or in total.
+        """
+        with self._condition:
+            return self._depth[priority] if priority is not None else len(self._heap)
+
+    def submit(self, documents, source_format: str, target_format: str, priority: str = 'default',
+               timeout: float = None) -> Future:
+        """
+        Queue the conversion of ``documents`` as a single job.
+
+        :param timeout: the number of seconds the job may wait to start, including the time it waits for room in
+          the queue.
+        :return: a :class:`concurrent.futures.Future` of the list of converted documents.
+        """
+        rank = _rank(priority)
+        job = _Job(list(documents), source_format, target_format, priority)
+        deadline = NO_DEADLINE if timeout is None else job.queued + timeout
+
+        with self._condition:
+            if self._closed:
+                raise ConversionError("The scheduler is shut down")
+            self._start()
+
+            while self._depth[priority] >= self.max_queue:
+                self._expire()
+                if self._depth[priority] < self.max_queue:
+                    break
+                if not self.block:
+                    instrumentation.count('convert.rejected', 1, priority=priority)
+                    raise QueueFull("There are {} {} conversions waiting already".format(
+                        self._depth[priority], priority))
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    instrumentation.count('convert.expired', 1, priority=priority)
+                    raise DeadlineExceeded("No room in the queue within {}s".format(timeout))
+                self._condition.wait(None if deadline == NO_DEADLINE else remaining)
+
+            heapq.heappush(self._heap, (rank, deadline, next(self._sequence), job))
+            self._depth[priority] += 1
+            instrumentation.count('convert.queue_depth', self._depth[priority], priority=priority)
+            self._condition.notify_all()
+        return job.future
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop the workers once the queued jobs are done.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _start(self):
+        # called with the lock held
+        while len(self._threads) < self.workers:
+            reserved = len(self._threads) < self.reserved_workers
+            thread = threading.Thread(target=self._work, args=(reserved,), daemon=True,
+                                      name='bureaucracy-convert-{}'.format(len(self._threads)))
+            thread.start()
+            self._threads.append(thread)
+
+    def _expire(self):
+        """
+        Drop the queued jobs whose deadline passed, called with the lock held.
+        """
+        now = time.monotonic()
+        expired = [entry for entry in self._heap if entry[1] < now]
+        if not expired:
+            return
+        self._heap = [entry for entry in self._heap if entry[1] >= now]
+        heapq.heapify(self._heap)
+        for entry in expired:
+            self._depth[entry[3].priority] -= 1
+            self._drop(entry[3])
+        self._condition.notify_all()
+
+    def _drop(self, job):
+        instrumentation.count('convert.expired', 1, priority=job.priority)
+        if job.future.set_running_or_notify_cancel():
+            job.future.set_exception(DeadlineExceeded("The conversion did not start in time"))
+
+    def _next(self, reserved):
+        """
+        Wait for a job this worker may run and take it from the queue, or return None when shut down.
+        """
+        with self._condition:
+            while True:
+                if self._heap and (not reserved or self._heap[0][0] == INTERACTIVE):
+                    rank, deadline, sequence, job = heapq.heappop(self._heap)
+                    self._depth[job.priority] -= 1
+                    # there's room for a blocked submit
+                    self._condition.notify_all()
+                    return job, deadline
+                if self._closed:
+                    # the other workers finish the queue
+                    return None
+                self._condition.wait()
+
+    def _work(self, reserved):
+        while True:
+            taken = self._next(reserved)
+            if taken is None:
+                return
+            job, deadline = taken
+
+            now = time.monotonic()
+            instrumentation.timing('convert.queue_wait', now - job.queued, priority=job.priority)
+            if now > deadline:
+                self._drop(job)
+                continue
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                converted = self.converter.convert_many(job.documents, job.source_format, job.target_format)
+            except Exception as exc:
+                job.future.set_exception(exc)
+            else:
+                job.future.set_result(converted)
+
+
+class ScheduledConverter(BaseConverter):
+    """
+    A converter that runs its conversions through a :class:`ConversionScheduler`, see
+    :meth:`ConversionScheduler.for_priority`.
+    """
+
+    def __init__(self, scheduler: ConversionScheduler, priority: str = 'default', timeout: float = None):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.timeout = timeout
+
+    def fingerprint(self):
+        converter = self.scheduler.converter
+        return [type(converter).__name__, converter.fingerprint()]
+
+    def convert_many(self, documents, source_format: str, target_format: str) -> list:
+        documents = list(documents)
+        size = self.scheduler.batch_size
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        futures = []
+        try:
+            for start in range(0, len(documents), size):
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                futures.append(self.scheduler.submit(documents[start:start + size], source_format, target_format,
+                                                     priority=self.priority, timeout=timeout))
+            converted = []
+            for future in futures:
+                converted += future.result()
+        except BaseException:
+            # the other jobs of the conversion are no use anymore
+            for future in futures:
+                future.cancel()
+            raise
+        return converted
+
+
+def _rank(priority):
+    try:
+        return PRIORITIES.index(priority)
+    except ValueError:
+        raise ValueError("Unknown priority '{}', use one of {}".format(priority, ', '.join(PRIORITIES))) from None
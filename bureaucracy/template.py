@@ -1,23 +1,35 @@
+import hashlib
 import itertools
 import logging
 import os
 import re
-import shutil
-import subprocess
-import tempfile
+from collections import ChainMap
+from collections.abc import Mapping
+from contextlib import nullcontext
 from copy import deepcopy
 from io import BytesIO
 
 from docx.document import Document
 from docx.opc.constants import CONTENT_TYPE
+from docx.oxml import OxmlElement
 from docx.package import Package
 from docx.text.paragraph import Paragraph
 from docx.text.run import Run
+from lxml import etree
 from lxml.etree import tostring
 
-from bureaucracy.replacements import (HTMLReplacement, ImageReplacement,
-                                      Replacement, TableReplacement,
-                                      TextReplacement)
+from bureaucracy.artifacts import _from_artifact, dump_artifact, load_artifact
+from bureaucracy.cache import BaseCache, cache_key
+from bureaucracy.converters import BaseConverter, get_default_converter
+from bureaucracy.instrumentation import instrumentation
+from bureaucracy.packaging import Compression, PackageWriter, save_package
+from bureaucracy.preflight import INVALID, MISSING, POSITION, PreflightReport
+from bureaucracy.profiling import RenderProfiler
+from bureaucracy.replacements import (
+    HTMLReplacement, ImageReplacement, ParagraphReplacement, Replacement,
+    TableReplacement, TextReplacement
+)
+from bureaucracy.results import DocxRenderResult
 from bureaucracy.utils import namespaced
 
 r = re.compile(r' MERGEFIELD +"?([^ ]+?)"? +(|\\\* MERGEFORMAT )', re.I)  # fixme. it might be not a simple as that
@@ -28,14 +40,34 @@ logger = logging.getLogger('bureaucracy')
 
 
 class DocxTemplate(Document):
-    def __init__(self, docx, strict=False):
+    def __init__(self, docx, strict=False, converter: BaseConverter = None, fast=True, cache: BaseCache = None,
+                 compression: Compression = None, profiler: RenderProfiler = None):
         """
         Initialize the DocxTemplate with the given docx file or stream.
         :param docx: A string or file like object (django.core.File objects work) representing a docx file.
         :param strict: will make the template render throw an error when fields and context do not match if True
+        :param converter: the converter used to generate pdfs, defaults to the shared default converter
+        :param fast: render contexts with only text values without the python-docx object model, see `_render_fast`
+        :param cache: a `bureaucracy.cache.BaseCache` to keep rendered documents in, see `render`
+        :param compression: a `bureaucracy.packaging.Compression` for the rendered documents, by default every part
+          is deflated like python-docx does
+        :param profiler: a `bureaucracy.profiling.RenderProfiler` to capture slow renders with
         """
         self.strict = strict
-        document_part = Package.open(docx).main_document_part
+        self.converter = converter
+        self.fast = fast
+        self.cache = cache
+        self.compression = compression
+        self.profiler = profiler
+        self._compiled = None
+        self._hash = None
+        self._positions = None
+        self._regions = None
+        self._snapshot = None
+        if instrumentation.enabled:
+            instrumentation.count('docx.bytes_in', _size_of(docx))
+        with instrumentation.timer('docx.load'):
+            document_part = Package.open(docx).main_document_part
         if document_part.content_type != CONTENT_TYPE.WML_DOCUMENT_MAIN:
             tmpl = "file '%s' is not a Word file, content type is '%s'"
             raise ValueError(tmpl % (docx, document_part.content_type))
@@ -44,9 +76,85 @@ class DocxTemplate(Document):
     def get_field_names(self):
         """
         Get the name of the mailmerge fields included in the document
-        :return: a set of the fields' names
+        :return: a set of the fields' names, with the names of the regions instead of the fields in them
         """
-        return {rv[0] for rv in self.iter_fields()}
+        return set(self._field_positions()) | set(self.get_regions())
+
+    def _field_positions(self):
+        """
+        Return, for every field name, a list with for each occurrence of the field whether it's the only content
+        of its paragraph. Computed once, until the fields are replaced or the template is changed.
+        """
+        self._forget_if_changed()
+        if self._positions is None:
+            regions, fields = _find_regions(list(self.iter_fields()), self.strict)
+            positions = {}
+            for field_name, field in fields:
+                positions.setdefault(field_name, []).append(_is_alone_in_paragraph(field))
+            self._regions = {region.name: {field_name for field_name, _ in region.fields} for region in regions}
+            self._positions = positions
+        return self._positions
+
+    def get_regions(self):
+        """
+        Get the repeating regions in the document, between TableStart:name and TableEnd:name fields
+        :return: a dict with the names of the regions and the set of the names of the fields in each region
+        """
+        self._field_positions()
+        return self._regions
+
+    def preflight(self, context):
+        """
+        Check a context against the fields of the template, without changing anything.
+
+        Strict templates do this before every render.
+        :return: a `bureaucracy.preflight.PreflightReport` with the missing fields, the replacements that can't be
+          used where their field is and the replacements that are broken.
+        """
+        report = PreflightReport()
+        for field_name, alone in self._field_positions().items():
+            if field_name not in context:
+                report.add(field_name, MISSING, 'Could not find field name {} in context'.format(field_name))
+                continue
+
+            replacement = context[field_name]
+            if not isinstance(replacement, Replacement):
+                continue
+
+            if replacement.single_use and len(alone) > 1:
+                report.add(field_name, POSITION, 'Field {} occurs {} times, but a {} can only fill one'.format(
+                    field_name, len(alone), type(replacement).__name__))
+            elif isinstance(replacement, ParagraphReplacement) and not all(alone):
+                # a paragraph replacement replaces the whole paragraph of the field
+                report.add(field_name, POSITION, 'Field {} shares its paragraph with other content, which a {} '
+                           'would remove'.format(field_name, type(replacement).__name__))
+
+            for message in replacement.check():
+                report.add(field_name, INVALID, 'Invalid value for field {}: {}'.format(field_name, message))
+
+        for region_name, field_names in self.get_regions().items():
+            if region_name not in context:
+                report.add(region_name, MISSING, 'Could not find field name {} in context'.format(region_name))
+                continue
+
+            items = context[region_name]
+            if not isinstance(items, (list, tuple)):
+                report.add(region_name, INVALID, 'Region {} needs a list of dicts'.format(region_name))
+                continue
+            for index, item in enumerate(items):
+                if not isinstance(item, Mapping):
+                    report.add(region_name, INVALID, 'Item {} of region {} is not a dict'.format(index, region_name))
+                    continue
+                for field_name in sorted(field_names):
+                    if field_name not in item and field_name not in context:
+                        report.add('{}[{}].{}'.format(region_name, index, field_name), MISSING,
+                                   'Could not find field name {} in item {} of region {}'.format(
+                                       field_name, index, region_name))
+        return report
+
+    def _check(self, context):
+        if self.strict:
+            self.preflight(context).raise_for_problems()
 
     def iter_fields(self):
         """
@@ -94,26 +202,8 @@ class DocxTemplate(Document):
         #  3. <w:fldChar w:fldCharType="end"/> Marks the end of the field
         #
 
-        # get the run this field is in
+        opening_run_node, closing_run_node = _complex_field_runs(field)
         instr_run_node = field.getparent()
-        assert instr_run_node.tag == namespaced('r')
-
-        # we now look for the run containing of the opening fldChar for this instrText, which is the first one
-        # with an opening fldChar we encounter before the run with instrText
-        opening_run_node = instr_run_node
-        while not opening_run_node.xpath('w:fldChar[@w:fldCharType="begin"]'):
-            opening_run_node = opening_run_node.getprevious()
-            if opening_run_node is None:
-                raise ValueError(
-                    "Could not find beginning of field with instr node '{}'?! Is the document malformed?".format(field))
-
-        # idem for the run containing the closing fldChar, but of course now looking ahead
-        closing_run_node = instr_run_node
-        while not closing_run_node.xpath('w:fldChar[@w:fldCharType="end"]'):
-            closing_run_node = closing_run_node.getnext()
-            if closing_run_node is None:
-                raise ValueError(
-                    "Could not find end of field with instr node '{}'?! Is the document malformed?".format(field))
 
         # now replace all runs between the opening and closing runs
         current_paragraph = Paragraph(instr_run_node.getparent(), self._body)
@@ -130,7 +220,19 @@ class DocxTemplate(Document):
         unused_fields = set()
         unused_values = set(context.keys())
 
-        for field_name, field in self.iter_fields():
+        with instrumentation.timer('docx.iter_fields'):
+            fields = list(self.iter_fields())
+        self._positions = None
+        instrumentation.count('docx.fields', len(fields))
+
+        regions, fields = _find_regions(fields, self.strict)
+        for region in regions:
+            unused_values.discard(region.name)
+            unused_values.difference_update(field_name for field_name, _ in region.fields)
+            with instrumentation.timer('docx.region', region=region.name):
+                self.expand_region(region, context)
+
+        for field_name, field in fields:
 
             if field_name in context:
                 unused_values.discard(field_name)
@@ -144,10 +246,11 @@ class DocxTemplate(Document):
                     replacement = TextReplacement('')
                     unused_fields.add(field_name)
 
-            if field.tag == namespaced('fldSimple'):
-                self.replace_simple_field(field, replacement)
-            elif field.tag == namespaced('instrText'):
-                self.replace_complex_field(field, replacement)
+            with instrumentation.timer('docx.fill', replacement=type(replacement).__name__):
+                if field.tag == namespaced('fldSimple'):
+                    self.replace_simple_field(field, replacement)
+                elif field.tag == namespaced('instrText'):
+                    self.replace_complex_field(field, replacement)
 
         if unused_fields:
             logger.warn("Fields %s were present in the document, but not in the context. They were removed",
@@ -157,63 +260,423 @@ class DocxTemplate(Document):
                 "Values %s were present in the context, but no corresponding fields were found in the document.",
                 unused_values)
 
-    def render(self, context, format='docx'):
-        doc = deepcopy(self)  # take a copy so we can keep using this instance to generate from other contexts
-        doc.replace_fields(context)
+    # A region is a range of table rows or paragraphs between a TableStart:name and a TableEnd:name field. The
+    # context holds a list of dicts for it, and the region is repeated for every item. The positions of the
+    # fields in the region are worked out once, so every copy only costs a deep copy and the replacements.
 
-        if format == 'docx':
-            handle = BytesIO()
-            doc.save(handle)
-            handle.seek(0)
-            return handle.read()
-        elif format == 'pdf':
-            return doc.to_pdf_bytes()
+    def expand_region(self, region, context):
+        """
+        Replace a region by a copy of it for every item in the list under the region's name in the context.
+
+        The fields in a copy are filled in with the values of the item, or of the context if the item does not
+        have them. The TableStart and TableEnd fields are removed, with their paragraph if it holds nothing else.
+        """
+        if region.name in context:
+            items = context[region.name]
+        elif self.strict:
+            raise ValueError('Could not find field name {} in context'.format(region.name))
         else:
-            raise Exception('Unsupported format.')
+            logger.warning("Region %s was present in the document, but not in the context. It was removed",
+                           region.name)
+            items = []
+        if not isinstance(items, (list, tuple)):
+            raise ValueError('Region {} needs a list of dicts, not {!r}'.format(region.name, items))
+
+        nodes = region.nodes
+        # a paragraph that only holds a marker is left out of the copies, the other markers are emptied
+        dropped = set()
+        markers = []
+        for marker in region.markers:
+            paragraph = marker.getparent()
+            if marker.tag == namespaced('instrText'):
+                paragraph = paragraph.getparent()
+            if paragraph in nodes and _is_alone_in_paragraph(marker):
+                dropped.add(nodes.index(paragraph))
+            else:
+                markers.append((None, _relative_path(marker, nodes)))
+        fields = markers + [(field_name, _relative_path(field, nodes)) for field_name, field in region.fields]
 
-    def render_and_save(self, path, context, format='docx'):
-        doc = deepcopy(self)  # take a copy so we can keep using this instance to generate from other contexts
-        doc.replace_fields(context)
-
-        if format == 'docx':
-            doc.save(path)
-        elif format == 'pdf':
-            doc.to_pdf(path)
-
-    # what follows is a hack.
-    # To be able to generate a pdf document/bytes from a merged document, we call libreoffice's headless
-    # command line utility to to the generation. The problem is is that that tool only works with files,
-    # not with bytestreams or strings, so we save this docx in a tmp dir, throw that into soffice, which
-    # generates a pdf file in the same dir with the same name. Then we return bytes dumped into that file or move
-    # the file to the desired path, depending on whether we're saving or rendering directly to a stream.
-    # All this also makes rendering to pdf very slow. when doing a lot of renders, it might be a good idea to use
-    # the batch functionality in the soffice convert tool.
+        copies = []
+        filled = []
+        unused_fields = set()
+        for index, item in enumerate(items):
+            if not isinstance(item, Mapping):
+                raise ValueError('Item {} of region {} is not a dict'.format(index, region.name))
+            values = ChainMap(item, context)
+
+            item_nodes = [deepcopy(node) for node in nodes]
+            # look up all fields before changing anything, changes shift the positions of later nodes
+            for field_name, path in fields:
+                if field_name is None:
+                    value = ''
+                elif field_name in values:
+                    value = values[field_name]
+                elif self.strict:
+                    raise ValueError('Could not find field name {} in item {} of region {}'.format(
+                        field_name, index, region.name))
+                else:
+                    value = ''
+                    unused_fields.add(field_name)
+                filled.append((_locate(item_nodes[path[0]], path[1:]), value))
+            copies.extend(node for node_index, node in enumerate(item_nodes) if node_index not in dropped)
 
-    def _to_pdf(self, path=None):
-        _, tmp_doc_path = tempfile.mkstemp(suffix='.docx')
-        soffice_outdir = tempfile.gettempdir()
-        tmp_pdf_outfilename = '{}.pdf'.format(tmp_doc_path.split(os.sep)[-1].split('.')[0])
-        tmp_pdf_path = os.path.join(soffice_outdir, tmp_pdf_outfilename)
-
-        self.save(tmp_doc_path)
-        try:
-            subprocess.call(['soffice', '--headless',
-                             '--convert-to', 'pdf',
-                             tmp_doc_path, '--outdir', soffice_outdir],
-                            stdout=subprocess.DEVNULL)
-
-            if path:
-                shutil.move(tmp_pdf_path, path)
+        parent = nodes[0].getparent()
+        start = parent.index(nodes[0])
+        parent[start:start + len(nodes)] = copies
+        # the copies are in the document now, so paragraph replacements can replace their paragraphs
+        for field, value in filled:
+            self._fill_field(field, value)
+        instrumentation.count('docx.region_items', len(items), region=region.name)
+
+        if unused_fields:
+            logger.warning("Fields %s were present in region %s, but not in its items. They were removed",
+                           unused_fields, region.name)
+
+    def _fill_field(self, field, value):
+        """
+        Replace a field by a run with a value, a replacement or anything else, which is filled in as text.
+        """
+        run = OxmlElement('w:r')
+        if field.tag == namespaced('fldSimple'):
+            field.getparent().replace(field, run)
+        else:
+            opening_run_node, closing_run_node = _complex_field_runs(field)
+            paragraph = opening_run_node.getparent()
+            paragraph[paragraph.index(opening_run_node):paragraph.index(closing_run_node)] = [run]
+
+        if isinstance(value, Replacement):
+            value.fill(Run(run, Paragraph(run.getparent(), self._body)))
+        else:
+            run.text = str(value)
+
+    def _copy(self):
+        with instrumentation.timer('docx.copy'):
+            return deepcopy(self)  # take a copy so we can keep using this instance to generate from other contexts
+
+    def save(self, path_or_stream):
+        """
+        Save the document to a path or file-like object, compressed as `compression` says.
+        """
+        if self.compression is None:
+            super().save(path_or_stream)
+        else:
+            save_package(self.part.package, path_or_stream, self.compression)
+
+    def _to_docx_bytes(self):
+        with instrumentation.timer('docx.save'):
+            handle = BytesIO()
+            self.save(handle)
+        data = handle.getvalue()
+        instrumentation.count('docx.bytes_out', len(data))
+        return data
+
+    # Most contexts only hold text. For those, building python-docx proxies for every field and deep copying and
+    # serializing the whole package is wasted work: `_render_fast` copies just the document element, replaces
+    # the fields found by `_compile` with plain lxml operations and only writes the document part into a copy
+    # of the otherwise unchanged package.
+    #
+    # What is computed about a template (the fields and regions, the content hash and the compiled fast path) is
+    # kept until the template changes. Renders compare the nodes of the fields and the parts of the package to a
+    # snapshot taken with the analysis, so fields and parts added, moved or removed through python-docx are noticed.
+
+    def refresh(self):
+        """
+        Forget what was computed about the template: its fields, regions, content hash and compiled fast path.
+
+        Renders notice fields and parts that were added, moved or removed since and refresh the template themselves.
+        Call this after changing a part in place in any other way, like the text of a header or a style, so the
+        next renders don't use the part as it was.
+        """
+        self._compiled = None
+        self._hash = None
+        self._positions = None
+        self._regions = None
+        self._snapshot = None
+
+    def _forget_if_changed(self):
+        if self._snapshot is None:
+            self._snapshot = _Snapshot(self)
+        elif not self._snapshot.matches(self):
+            self.refresh()
+            self._snapshot = _Snapshot(self)
+
+    def _cache_key(self, context):
+        if self.cache is None:
+            return None
+        return cache_key(self._content_hash(), context, self.compression, self.converter or get_default_converter())
+
+    def _content_hash(self):
+        """
+        Return a hash of the parts and relationships of the template, computed once until the template changes.
+        """
+        self._forget_if_changed()
+        if self._hash is None:
+            digest = hashlib.sha256()
+            for part in sorted(self.part.package.iter_parts(), key=lambda part: part.partname):
+                blob = part.blob or b''
+                digest.update('{}:{}:'.format(part.partname, len(blob)).encode('utf-8'))
+                digest.update(blob)
+                for rel in sorted(part.rels.values(), key=lambda rel: rel.rId):
+                    digest.update('{} {} {};'.format(rel.rId, rel.reltype, rel.target_ref).encode('utf-8'))
+            self._hash = digest.hexdigest()
+        return self._hash
+
+    def _compile(self):
+        self._forget_if_changed()
+        if self._compiled is None or self._compiled.compression != self.compression:
+            with instrumentation.timer('docx.compile'):
+                self._compiled = _CompiledTemplate.from_template(self)
+        return self._compiled
+
+    def to_artifact(self):
+        """
+        Return the template and its analysis (fields, regions and the positions of the fields) as bytes, to load it
+        again with `from_artifact` without analysing it. See bureaucracy.artifacts.
+        """
+        with instrumentation.timer('docx.artifact'):
+            handle = BytesIO()
+            # the compression is an option of the loaded template, like for a template file
+            Document.save(self, handle)
+            analysis = {
+                'positions': self._field_positions(),
+                'regions': {name: sorted(field_names) for name, field_names in self.get_regions().items()},
+                'partname': self.part.partname.lstrip('/'),
+                'fields': _field_paths(self),
+                'hash': self._content_hash(),
+            }
+            return dump_artifact('docx', analysis, {'package': handle.getvalue()})
+
+    @classmethod
+    def from_artifact(cls, artifact, **kwargs):
+        """
+        Load a template from the bytes returned by `to_artifact`.
+        :param kwargs: the options of the template, see `__init__`
+        :raises bureaucracy.artifacts.ArtifactError: if the artifact is not of this version of bureaucracy, or corrupt
+        """
+        analysis, blobs = load_artifact(artifact, 'docx')
+        template = cls(BytesIO(blobs['package']), **kwargs)
+        template._positions = analysis['positions']
+        template._regions = {name: set(field_names) for name, field_names in analysis['regions'].items()}
+        template._hash = analysis['hash']
+        fields = [(field_name, tuple(start), end and tuple(end)) for field_name, start, end in analysis['fields']]
+        template._compiled = _CompiledTemplate(analysis['partname'], template.compression, blobs['package'], fields)
+        return template
+
+    def __reduce__(self):
+        # python-docx objects can't be pickled, a template is pickled as an artifact, see `_from_artifact`
+        options = {'strict': self.strict, 'fast': self.fast, 'compression': self.compression}
+        return _from_artifact, (type(self), self.to_artifact(), options)
+
+    def __deepcopy__(self, memo):
+        # copy the attributes like a deep copy does without `__reduce__`
+        clone = type(self).__new__(type(self))
+        memo[id(self)] = clone
+        # the copy is about to be filled in, it analyses itself if it needs to
+        clone.__dict__.update(deepcopy(dict(self.__dict__, _snapshot=None), memo))
+        clone.refresh()
+        return clone
+
+    def _render_fast(self, context):
+        """
+        Render a context with only text values to docx bytes.
+
+        The template is compiled again when it changes, see `refresh`.
+
+        :return: the docx bytes, or None if the context has values that need the python-docx object model.
+        """
+        root = self._fill_fast(context)
+        if root is None:
+            return None
+
+        compiled = self._compile()
+        with instrumentation.timer('docx.save'):
+            xml = etree.tostring(root, encoding='UTF-8', standalone=True)
+            data = compiled.writer.write({compiled.partname: xml})
+        instrumentation.count('docx.bytes_out', len(data))
+        return data
+
+    def _fill_fast(self, context):
+        """
+        Fill in a context with only text values in a copy of the document element.
+
+        :return: the copy, or None if the context has values that need the python-docx object model.
+        """
+        if not self.fast:
+            return None
+
+        if self.get_regions():
+            return None
+
+        compiled = self._compile()
+        values = []
+        unused_fields = set()
+        for field_name, start, end in compiled.fields:
+            if field_name in context:
+                value = context[field_name]
+                if isinstance(value, Replacement):
+                    if type(value) is not TextReplacement:
+                        return None
+                    value = value.text
+            elif self.strict:
+                raise ValueError('Could not find field name {} in context'.format(field_name))
+            else:
+                value = ''
+                unused_fields.add(field_name)
+            values.append(str(value))
+        instrumentation.count('docx.fields', len(values))
+
+        with instrumentation.timer('docx.copy'):
+            root = deepcopy(self._element)
+
+        with instrumentation.timer('docx.fill', replacement='fast'):
+            # look up all nodes before changing anything, changes shift the positions of later nodes
+            located = [(_locate(root, start), end and _locate(root, end)) for _, start, end in compiled.fields]
+            for (start, end), value in zip(located, values):
+                run = OxmlElement('w:r')
+                run.text = value
+                parent = start.getparent()
+                if end is None:
+                    parent.replace(start, run)
+                else:
+                    parent[parent.index(start):parent.index(end)] = [run]
+
+        if unused_fields:
+            logger.warning("Fields %s were present in the document, but not in the context. They were removed",
+                           unused_fields)
+        unused_values = set(context.keys()).difference(field_name for field_name, _, _ in compiled.fields)
+        if unused_values:
+            logger.warning(
+                "Values %s were present in the context, but no corresponding fields were found in the document.",
+                unused_values)
+        return root
+
+    def render_element(self, context):
+        """
+        Render the template with a context without saving it, e.g. to insert it into another document.
+
+        :return: the rendered document element and the `DocxTemplate` whose parts (styles, numbering, images) it
+          refers to: this template if only text was filled in, or else the rendered copy.
+        """
+        self._check(context)
+        with instrumentation.timer('docx.render', format='element'):
+            root = self._fill_fast(context)
+            if root is not None:
+                return root, self
+
+            doc = self._copy()
+            doc.replace_fields(context)
+            return doc._element, doc
+
+    def render(self, context, format='docx'):
+        """
+        Render the template with a context.
+
+        :param format: 'docx' or 'pdf' to get the document as bytes, or None to get a `DocxRenderResult`, which
+          produces (and caches) the formats asked for later on.
+        """
+        with self._profile(context):
+            self._check(context)
+            key = self._cache_key(context)
+            if format is None:
+                return self._render_result(context, key)
+            if key is not None:
+                return self.cache.get_or_render('{}.{}'.format(key, format), lambda: self._render(context, format),
+                                                format)
+            return self._render(context, format)
+
+    def _profile(self, context):
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.capture('docx', context)
+
+    def _render(self, context, format):
+        with instrumentation.timer('docx.render', format=format):
+            data = self._render_fast(context) if format in ('docx', 'pdf') else None
+            if data is not None:
+                return data if format == 'docx' else self._convert(data)
+
+            doc = self._copy()
+            doc.replace_fields(context)
+
+            if format == 'docx':
+                return doc._to_docx_bytes()
+            elif format == 'pdf':
+                return doc.to_pdf_bytes()
             else:
-                with open(tmp_pdf_path, 'rb') as f:
-                    return f.read()
+                raise Exception('Unsupported format.')
+
+    def _render_result(self, context, key):
+        options = {'cache': self.cache, 'key': key}
+        if key is not None:
+            data = self.cache.get('{}.docx'.format(key))
+            if data is not None:
+                instrumentation.count('cache.hits', format='docx')
+                return DocxRenderResult(self, data=data, **options)
+
+        with instrumentation.timer('docx.render', format='result'):
+            data = self._render_fast(context)
+            if data is None:
+                doc = self._copy()
+                doc.replace_fields(context)
+                return DocxRenderResult(self, document=doc, **options)
+
+        if key is not None:
+            self.cache.set('{}.docx'.format(key), data)
+        return DocxRenderResult(self, data=data, **options)
+
+    def incremental(self):
+        """
+        Return an `IncrementalRenderer` for this template, which only fills in the fields that changed between
+        renders, e.g. for a live preview. See bureaucracy.incremental.
+        """
+        from bureaucracy.incremental import IncrementalRenderer
+        return IncrementalRenderer(self)
+
+    def render_and_save(self, path, context, format='docx'):
+        with self._profile(context):
+            self._render_and_save(path, context, format)
+
+    def _render_and_save(self, path, context, format):
+        self._check(context)
+        if self.cache is not None:
+            data = self.render(context, format)
+            with open(path, 'wb') as outfile:
+                outfile.write(data)
+            return
+
+        with instrumentation.timer('docx.render', format=format):
+            data = self._render_fast(context) if format in ('docx', 'pdf') else None
+            if data is not None:
+                with open(path, 'wb') as outfile:
+                    outfile.write(data if format == 'docx' else self._convert(data))
+                return
+
+            doc = self._copy()
+            doc.replace_fields(context)
+
+            if format == 'docx':
+                with instrumentation.timer('docx.save'):
+                    doc.save(path)
+            elif format == 'pdf':
+                doc.to_pdf(path)
+
+    # To generate a pdf document/bytes from a merged document, we hand it to a converter, by default
+    # libreoffice's headless command line utility. That is slow, so when doing a lot of renders, use a
+    # converter that converts in batches or talks to a running libreoffice, see bureaucracy.converters.
+
+    def _convert(self, data):
+        converter = self.converter or get_default_converter()
+        with instrumentation.timer('docx.convert', format='pdf'):
+            return converter.convert(data, 'docx', 'pdf')
 
-        finally:
-            if os.path.exists(tmp_doc_path):
-                os.remove(tmp_doc_path)
+    def _to_pdf(self, path=None):
+        pdf = self._convert(self._to_docx_bytes())
 
-            if os.path.exists(tmp_pdf_path):
-                os.remove(tmp_pdf_path)
+        if path:
+            with open(path, 'wb') as outfile:
+                outfile.write(pdf)
+        else:
+            return pdf
 
     def to_pdf(self, path):
         self._to_pdf(path)
@@ -225,6 +688,267 @@ class DocxTemplate(Document):
         return tostring(self._element, pretty_print=True).decode('utf-8')
 
 
+class _CompiledTemplate:
+    """
+    What the fast path needs to know about a template: the zip entry of its document part, a writer with all
+    other parts and, for every field, the positions of its node (fldSimple) or of its opening and closing runs.
+    """
+
+    def __init__(self, partname, compression, source, fields):
+        self.partname = partname
+        self.compression = compression
+        self.writer = PackageWriter(source, [partname], compression=compression)
+        self.fields = fields
+
+    @classmethod
+    def from_template(cls, template: DocxTemplate):
+        handle = BytesIO()
+        template.save(handle)
+        return cls(template.part.partname.lstrip('/'), template.compression, handle.getvalue(),
+                   _field_paths(template))
+
+    def __deepcopy__(self, memo):
+        # it only holds positions and bytes, copies of the template can share it
+        return self
+
+
+class _Snapshot:
+    """
+    The structure of a template when it was analysed: the nodes of its fields with their positions, and the
+    relationships of the package and the document part, which change when headers, images, ... are added.
+    """
+
+    def __init__(self, template):
+        self.nodes = _field_nodes(template)
+        self.paths = [_path_of(node) for node in self.nodes]
+        self.rels = _rels_of(template)
+
+    def matches(self, template):
+        # the snapshot keeps the nodes and relationships alive, so they are compared by identity
+        return (self.nodes == _field_nodes(template) and self.rels == _rels_of(template)
+                and all(_path_of(node) == path for node, path in zip(self.nodes, self.paths)))
+
+
+def _field_nodes(template):
+    return list(template._element.iter(namespaced('fldSimple'), namespaced('instrText'), namespaced('fldChar')))
+
+
+def _rels_of(template):
+    return list(template.part.package.rels.values()) + list(template.part.rels.values())
+
+
+def _field_paths(template):
+    """
+    Return the name of every field of ``template`` with the path to its node, or the paths to its opening and
+    closing runs.
+    """
+    fields = []
+    for field_name, field in template.iter_fields():
+        if field.tag == namespaced('fldSimple'):
+            fields.append((field_name, _path_of(field), None))
+        elif field.tag == namespaced('instrText'):
+            opening_run_node, closing_run_node = _complex_field_runs(field)
+            fields.append((field_name, _path_of(opening_run_node), _path_of(closing_run_node)))
+    return fields
+
+
+def _path_of(node):
+    """
+    Return the child indexes leading from the root of the tree to ``node``.
+    """
+    path = []
+    parent = node.getparent()
+    while parent is not None:
+        path.append(parent.index(node))
+        node, parent = parent, parent.getparent()
+    return tuple(reversed(path))
+
+
+def _locate(root, path):
+    node = root
+    for index in path:
+        node = node[index]
+    return node
+
+
+REGION_START = 'TableStart:'
+REGION_END = 'TableEnd:'
+
+
+class _Region:
+    """
+    A repeating region.
+
+    :param name: the name of the region, and of its list of items in the context.
+    :param nodes: the table rows or paragraphs the region consists of.
+    :param markers: the TableStart and TableEnd fields.
+    :param fields: the (field name, field) tuples of the other fields in the region.
+    """
+
+    def __init__(self, name, nodes, markers, fields):
+        self.name = name
+        self.nodes = nodes
+        self.markers = markers
+        self.fields = fields
+
+
+def _find_regions(fields, strict=False):
+    """
+    Find the regions among a list of (field name, field) tuples.
+
+    :param strict: raise a ValueError for a region without exactly one start and one end marker. Otherwise its
+      markers are filled in like other fields, as they were before regions existed.
+    :return: a list of `_Region`s and a list of the fields that are not in a region.
+    """
+    markers = {}
+    other_fields = []
+    for field_name, field in fields:
+        for position, prefix in enumerate((REGION_START, REGION_END)):
+            if field_name.startswith(prefix):
+                markers.setdefault(field_name[len(prefix):], ([], []))[position].append((field_name, field))
+                break
+        else:
+            other_fields.append((field_name, field))
+
+    if not markers:
+        return [], other_fields
+
+    regions = []
+    region_of_node = {}
+    for name, (starts, ends) in markers.items():
+        if len(starts) != 1 or len(ends) != 1:
+            message = 'Region {0} needs one {1}{0} and one {2}{0} field'.format(name, REGION_START, REGION_END)
+            if strict:
+                raise ValueError(message)
+            logger.warning('%s, its markers are filled in like other fields', message)
+            other_fields.extend(starts + ends)
+            continue
+        (_, start), (_, end) = starts[0], ends[0]
+        region = _Region(name, _region_nodes(name, start, end), [start, end], [])
+        for node in region.nodes:
+            if node in region_of_node:
+                raise ValueError('Regions {} and {} overlap'.format(region_of_node[node].name, name))
+            region_of_node[node] = region
+        regions.append(region)
+
+    for region in regions:
+        for marker in region.markers:
+            if _region_of(marker, region_of_node) is not region:
+                raise ValueError('Region {} is nested in another region, which is not supported'.format(region.name))
+
+    top_level_fields = []
+    for field_name, field in other_fields:
+        region = _region_of(field, region_of_node)
+        if region is None:
+            top_level_fields.append((field_name, field))
+        else:
+            region.fields.append((field_name, field))
+    return regions, top_level_fields
+
+
+def _region_of(field, region_of_node):
+    for ancestor in field.iterancestors():
+        if ancestor in region_of_node:
+            return region_of_node[ancestor]
+    return None
+
+
+def _region_nodes(name, start, end):
+    """
+    Return the table rows, or else the paragraphs, from the one with the field ``start`` up to the one with ``end``.
+    """
+    start_paragraph, end_paragraph = (
+        field.getparent() if field.tag == namespaced('fldSimple') else field.getparent().getparent()
+        for field in (start, end))
+
+    start_row = next(start_paragraph.iterancestors(namespaced('tr')), None)
+    end_row = next(end_paragraph.iterancestors(namespaced('tr')), None)
+    if start_row is not None and end_row is not None and start_row.getparent() is end_row.getparent():
+        first, last = start_row, end_row
+    elif start_paragraph.getparent() is end_paragraph.getparent():
+        first, last = start_paragraph, end_paragraph
+    else:
+        raise ValueError('Region {} should start and end in the same table, or next to each other'.format(name))
+
+    parent = first.getparent()
+    if parent.index(last) < parent.index(first):
+        raise ValueError('Region {} ends before it starts'.format(name))
+    return parent[parent.index(first):parent.index(last) + 1]
+
+
+def _relative_path(node, roots):
+    """
+    Return the index of the root in ``roots`` that ``node`` is in, followed by the child indexes leading to it.
+    """
+    path = []
+    while node not in roots:
+        parent = node.getparent()
+        path.append(parent.index(node))
+        node = parent
+    path.append(roots.index(node))
+    return tuple(reversed(path))
+
+
+def _is_alone_in_paragraph(field):
+    """
+    Return whether the paragraph of the field ``field`` (a fldSimple or instrText node) holds no other text.
+    """
+    if field.tag == namespaced('fldSimple'):
+        paragraph = field.getparent()
+        own_nodes = [field]
+    else:
+        opening_run_node, closing_run_node = _complex_field_runs(field)
+        paragraph = opening_run_node.getparent()
+        own_nodes = paragraph[paragraph.index(opening_run_node):paragraph.index(closing_run_node) + 1]
+
+    for text_node in paragraph.iter(namespaced('t'), namespaced('fldSimple'), namespaced('instrText')):
+        if not any(node is text_node or node in text_node.iterancestors() for node in own_nodes):
+            return False
+    return True
+
+
+def _complex_field_runs(field):
+    """
+    Return the runs with the opening and closing fldChar of the complex field with instrText node ``field``.
+    """
+    # get the run this field is in
+    instr_run_node = field.getparent()
+    assert instr_run_node.tag == namespaced('r')
+
+    # we now look for the run containing of the opening fldChar for this instrText, which is the first one
+    # with an opening fldChar we encounter before the run with instrText
+    opening_run_node = instr_run_node
+    while not opening_run_node.xpath('w:fldChar[@w:fldCharType="begin"]'):
+        opening_run_node = opening_run_node.getprevious()
+        if opening_run_node is None:
+            raise ValueError(
+                "Could not find beginning of field with instr node '{}'?! Is the document malformed?".format(field))
+
+    # idem for the run containing the closing fldChar, but of course now looking ahead
+    closing_run_node = instr_run_node
+    while not closing_run_node.xpath('w:fldChar[@w:fldCharType="end"]'):
+        closing_run_node = closing_run_node.getnext()
+        if closing_run_node is None:
+            raise ValueError(
+                "Could not find end of field with instr node '{}'?! Is the document malformed?".format(field))
+    return opening_run_node, closing_run_node
+
+
+def _size_of(docx):
+    """
+    Return the size in bytes of a path or seekable file-like object, or 0 if it can't be determined.
+    """
+    try:
+        if hasattr(docx, 'seek'):
+            position = docx.tell()
+            size = docx.seek(0, os.SEEK_END) - position
+            docx.seek(position)
+            return size
+        return os.path.getsize(docx)
+    except (OSError, TypeError, ValueError):
+        return 0
+
+
 if __name__ == '__main__':
     examples_dir = os.path.join(os.path.realpath(os.path.dirname(__file__)), '..', 'examples')
     doc = DocxTemplate(os.path.join(examples_dir, 'sample.docx'))
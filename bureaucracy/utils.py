@@ -1,14 +1,17 @@
-from lxml.etree import tostring
-
-
 NAMESPACES = {
     'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
     'mc': 'http://schemas.openxmlformats.org/markup-compatibility/2006',
     'ct': 'http://schemas.openxmlformats.org/package/2006/content-types',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
 }
 
+# the prefix of the attributes that hold relationship ids, like r:id, r:embed and r:link
+R_NAMESPACE = '{{{}}}'.format(NAMESPACES['r'])
+
 
 def print_node(node):
+    from lxml.etree import tostring
+
     print(tostring(node, pretty_print=True).decode('utf-8'))
 
 
@@ -16,6 +19,39 @@ def namespaced(name, ns='w'):
     return '{{{0}}}{1}'.format(NAMESPACES[ns], name)
 
 
+
+def remap_relationships(elements, source_part, target_part, relate):
+    """
+    Point the relationship ids in the elements from the source part to the same targets of the target part.
+
+    External relationships are copied. Other relationships are passed to ``relate``, which returns the id of the
+    relationship of the target part, or None to keep the id as it is.
+    """
+    rIds = {}
+    for element in elements:
+        for attr, rId in element.attrib.items():
+            if not attr.startswith(R_NAMESPACE) or rId not in source_part.rels:
+                continue
+            if rId not in rIds:
+                rel = source_part.rels[rId]
+                if rel.is_external:
+                    rIds[rId] = target_part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+                else:
+                    rIds[rId] = relate(rel)
+            if rIds[rId] is not None:
+                element.set(attr, rIds[rId])
+
+
+class SharedService:
+    """
+    Mixin for services that templates refer to, like caches, converters and profilers.
+    """
+
+    def __deepcopy__(self, memo):
+        # services are shared, copies of a template use the same one
+        return self
+
+
 DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
 PDF_MIMETYPE = 'application/pdf'
 PPTX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
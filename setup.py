@@ -17,8 +17,14 @@ setup(
         'python-docx',
         'python-pptx>=0.6.2',
     ],
+    python_requires='>=3.7',
     include_package_data=True,
     packages=find_packages(exclude=["tests"]),
+    entry_points={
+        'console_scripts': [
+            'bureaucracy = bureaucracy.cli:main',
+        ],
+    },
 
     setup_requires=['pytest-runner'],
     tests_require=[
@@ -37,8 +43,9 @@ setup(
         'Operating System :: OS Independent',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
         'Topic :: Internet :: WWW/HTTP',
         'Topic :: Internet :: WWW/HTTP :: Dynamic Content',
     ],
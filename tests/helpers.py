@@ -0,0 +1,22 @@
+"""
+Building docx templates with merge fields in the tests.
+"""
+from io import BytesIO
+
+from docx.oxml import parse_xml
+
+FIELD = (
+    '<w:fldSimple xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'w:instr=" MERGEFIELD {0} \\* MERGEFORMAT "><w:r><w:t>«{0}»</w:t></w:r></w:fldSimple>'
+)
+
+
+def add_field(paragraph, name):
+    paragraph._p.append(parse_xml(FIELD.format(name)))
+
+
+def save_document(document):
+    handle = BytesIO()
+    document.save(handle)
+    handle.seek(0)
+    return handle
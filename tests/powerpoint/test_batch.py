@@ -0,0 +1,56 @@
+import os
+
+from pptx import Presentation
+from tests.powerpoint.test_templates import TEST_FILES
+
+from bureaucracy.powerpoint import BatchRenderer
+
+TEMPLATE = str(TEST_FILES / 'empty-and-filled-in-placeholders.pptx')
+
+
+def test_batch_render_in_process():
+    renderer = BatchRenderer(TEMPLATE, workers=0)
+    items = []
+
+    report = renderer.run(({'language': str(i)} for i in range(5)), callback=items.append)
+
+    assert report.submitted == report.succeeded == 5
+    assert report.failed == 0
+    assert [item.name for item in items] == ['00000.pptx', '00001.pptx', '00002.pptx', '00003.pptx', '00004.pptx']
+    assert all(item.data.startswith(b'PK') for item in items)
+
+
+def test_batch_render_to_directory(tmpdir):
+    renderer = BatchRenderer(TEMPLATE, workers=2, filename='deck-{index}.{ext}')
+    progress = []
+
+    contexts = [{'language': 'Python'}, {'language': 'Rust'}, {'no-language': 'Oops'}]
+    report = renderer.run(contexts, outdir=str(tmpdir), progress=lambda report: progress.append(report.completed))
+
+    assert report.submitted == 3
+    assert report.succeeded == 2
+    assert report.failed == 1
+    assert progress == [1, 2, 3]
+
+    error = report.errors[0]
+    assert error.index == 2
+    assert 'KeyError' in error.error
+    assert not os.path.exists(str(tmpdir.join('deck-2.pptx')))
+
+    pres = Presentation(str(tmpdir.join('deck-1.pptx')))
+    assert pres.slides[0].placeholders[11].text == 'A simple Rust string format template'
+
+
+def test_batch_render_bad_filenames(tmpdir):
+    renderer = BatchRenderer(TEMPLATE, workers=2, filename='{name}.{ext}')
+
+    contexts = [{'language': 'Python', 'name': 'python'}, {'language': 'Rust'}, {'language': 'C', 'name': '../c'}]
+    report = renderer.run(contexts, outdir=str(tmpdir.join('out')))
+
+    assert report.submitted == 3
+    assert report.succeeded == 1
+    assert [(error.index, error.name) for error in report.errors] == [(1, None), (2, None)]
+    assert "KeyError('name')" in report.errors[0].error
+    assert 'is not inside the output directory' in report.errors[1].error
+    assert sorted(os.listdir(str(tmpdir))) == ['out']
+    assert os.listdir(str(tmpdir.join('out'))) == ['python.pptx']
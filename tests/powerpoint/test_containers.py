@@ -1,8 +1,18 @@
+from decimal import Decimal
+from io import BytesIO
+
+import pytest
+from pptx import Presentation
+from pptx.chart.data import CategoryChartData
+from pptx.enum.chart import XL_CHART_TYPE
+from pptx.util import Inches
 from tests.powerpoint.test_templates import TEST_FILES
 
-from bureaucracy.powerpoint import Template
+from bureaucracy.powerpoint import ChartData, Template
+from bureaucracy.powerpoint.engines import BaseEngine
 from bureaucracy.powerpoint.placeholders import PlaceholderContainer
 from bureaucracy.powerpoint.slides import SlideContainer
+from bureaucracy.powerpoint.tables import TableContainer
 
 
 def test_insert_another_slide():
@@ -29,3 +39,168 @@ def test_insert_link():
 
     assert ph.text == "foo"
     assert ph.text_frame.paragraphs[0].runs[0].hyperlink.address == "http://www.whygodwhy.com"
+
+
+def _table_template(n_rows=2, n_cols=3, n_tables=1):
+    """
+    Build a presentation with a single slide holding tables, the first cell containing template code.
+    """
+    presentation = Presentation()
+    layout = presentation.slide_layouts[6]
+    for placeholder in list(layout.placeholders):
+        placeholder.element.getparent().remove(placeholder.element)
+    slide = presentation.slides.add_slide(layout)
+    for i in range(n_tables):
+        table = slide.shapes.add_table(n_rows, n_cols, Inches(1), Inches(1 + 2 * i), Inches(6), Inches(1)).table
+        table.cell(0, 0).text = '{PPT_CURRENT_TABLE}'
+    handle = BytesIO()
+    presentation.save(handle)
+    handle.seek(0)
+    return Template(handle)
+
+
+def test_table_fill():
+    template = _table_template()
+    slide = SlideContainer(template._presentation.slides[0], template._presentation)
+    table = TableContainer(template._presentation.slides[0].shapes[0].table, slide)
+
+    tables = table.fill([[i, i * 2, None] for i in range(100)], header_rows=1)
+
+    assert tables == [table]
+    assert table.row_count == 101
+    assert table[0, 0].text == '{PPT_CURRENT_TABLE}'
+    assert table[1, 0].text == '0'
+    assert table[100, 1].text == '198'
+    assert table[100, 2].text == ''
+    assert len(template._presentation.slides) == 1
+
+
+def test_table_fill_too_many_columns():
+    template = _table_template()
+    table = TableContainer(template._presentation.slides[0].shapes[0].table)
+
+    with pytest.raises(ValueError):
+        table.fill([['a', 'b', 'c'], ['a', 'b', 'c', 'd']])
+    # the table is left as it was
+    assert table.row_count == 2
+    assert table[0, 0].text == '{PPT_CURRENT_TABLE}'
+
+
+def test_table_fill_continuation_slides(tmpdir):
+    template = _table_template()
+    slide = SlideContainer(template._presentation.slides[0], template._presentation)
+    table = TableContainer(template._presentation.slides[0].shapes[0].table, slide)
+
+    tables = table.fill([[i] for i in range(25)], header_rows=1, max_rows=10)
+
+    assert len(tables) == 3
+    assert len(template._presentation.slides) == 3
+    assert [t.row_count for t in tables] == [11, 11, 6]
+    assert [t[1, 0].text for t in tables] == ['0', '10', '20']
+    assert all(t[0, 0].text == '{PPT_CURRENT_TABLE}' for t in tables)
+    assert len(slide.duplicates) == 2
+
+    outfile = str(tmpdir.join('continued.pptx'))
+    template.save_to(outfile)
+    pres = Presentation(outfile)
+    assert [s.shapes[0].table.cell(1, 0).text_frame.text for s in pres.slides] == ['0', '10', '20']
+
+
+def test_table_fill_during_render():
+    template = _table_template()
+
+    class FillingEngine(BaseEngine):
+        calls = 0
+
+        def render(self, fragment, context):
+            self.calls += 1
+            context['PPT_CURRENT_TABLE'].fill([[i] for i in range(5)], header_rows=1, max_rows=2)
+
+    engine = FillingEngine()
+    template.render({}, engine=engine)
+
+    # continuation slides are not rendered again
+    assert engine.calls == 1
+    assert len(template._presentation.slides) == 3
+
+
+def test_table_fill_during_render_renders_whole_slide():
+    template = _table_template(n_tables=2)
+
+    class FillingEngine(BaseEngine):
+        def render(self, fragment, context):
+            table = context['PPT_CURRENT_TABLE']
+            if table.table._graphic_frame.top == Inches(1):
+                tables = table.fill([[i] for i in range(5)], header_rows=1, max_rows=2)
+                # the continuation slides are made after the slide is rendered
+                assert tables == [table]
+            else:
+                table[0, 0].text = 'rendered'
+
+    template.render({}, engine=FillingEngine())
+
+    slides = template._presentation.slides
+    assert len(slides) == 3
+    assert [slide.shapes[0].table.cell(1, 0).text_frame.text for slide in slides] == ['0', '2', '4']
+    assert [slide.shapes[1].table.cell(0, 0).text_frame.text for slide in slides] == ['rendered'] * 3
+
+
+def _chart_template(chart_type=XL_CHART_TYPE.COLUMN_CLUSTERED):
+    """
+    Build a presentation with a single slide holding a chart called 'sales', with two series.
+    """
+    presentation = Presentation()
+    layout = presentation.slide_layouts[6]
+    for placeholder in list(layout.placeholders):
+        placeholder.element.getparent().remove(placeholder.element)
+    slide = presentation.slides.add_slide(layout)
+    chart_data = CategoryChartData()
+    chart_data.categories = ['a', 'b']
+    chart_data.add_series('first', (1, 2))
+    chart_data.add_series('second', (3, 4))
+    graphic_frame = slide.shapes.add_chart(chart_type, Inches(1), Inches(1), Inches(6), Inches(4), chart_data)
+    graphic_frame.name = 'sales'
+    handle = BytesIO()
+    presentation.save(handle)
+    handle.seek(0)
+    return Template(handle)
+
+
+def test_chart_fill():
+    template = _chart_template()
+    assert template.get_chart_names() == {'sales'}
+
+    data = ChartData(['Q{}'.format(i) for i in range(1000)],
+                     {'2023': list(range(1000)), '2024': [i / 2 for i in range(1000)], '2025': [None] * 1000})
+    template.render({'sales': data})
+
+    chart = Presentation(BytesIO(template.to_bytes())).slides[0].shapes[0].chart
+    assert [series.name for series in chart.series] == ['2023', '2024', '2025']
+    assert chart.plots[0].categories[999] == 'Q999'
+    assert chart.series[1].values[:3] == (0.0, 0.5, 1.0)
+    assert chart.series[2].values[:1] == (None,)
+    assert chart.part.chart_workbook.xlsx_part is not None
+
+
+def test_chart_fill_fewer_series():
+    template = _chart_template(XL_CHART_TYPE.LINE)
+    template.render({'sales': ChartData(['x', 'y', 'z'], [('only', [1, 2, 3])]), 'other': 'value'})
+
+    chart = Presentation(BytesIO(template.to_bytes())).slides[0].shapes[0].chart
+    assert [series.name for series in chart.series] == ['only']
+    assert chart.series[0].values == (1.0, 2.0, 3.0)
+
+
+def test_chart_data_validation():
+    with pytest.raises(ValueError):
+        ChartData(['a', 'b'], {'short': [1]})
+    with pytest.raises(ValueError):
+        ChartData(['a'], {})
+    with pytest.raises(ValueError):
+        ChartData([], {'empty': []})
+    with pytest.raises(ValueError):
+        ChartData(['a', 'b'], {'text': [1, '2']})
+    with pytest.raises(ValueError):
+        ChartData(['a'], {'nan': [float('nan')]})
+    # gaps and numbers of any kind are fine
+    ChartData(['a', 'b', 'c', 'd'], {'values': [1, None, 2.5, Decimal('3.10')]})
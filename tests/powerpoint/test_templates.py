@@ -1,11 +1,24 @@
 import hashlib
+import json
+import os
+import pickle
+import zipfile
+from io import BytesIO
 from pathlib import Path
 from unittest.mock import patch
 
+import pytest
 from pptx import Presentation
+from pptx.parts.image import Image
 
+from bureaucracy.cache import MemoryCache
+from bureaucracy.converters import BaseConverter, SofficeConverter
+from bureaucracy.instrumentation import MemorySink, add_sink, remove_sink
+from bureaucracy.packaging import Compression
 from bureaucracy.powerpoint import Template
 from bureaucracy.powerpoint.engines import BaseEngine, PythonEngine
+from bureaucracy.powerpoint.images import ImageCache
+from bureaucracy.profiling import RenderProfiler
 
 TEST_FILES = Path(__file__).parent / 'files'
 
@@ -140,13 +153,10 @@ def test_ph_ordering(tmpdir):
     pres = Presentation(outfile)
     assert len(pres.slides) == 1
 
-    expected_calls = [
-        (('{second}', context),),
-        (('{third}', context),),
-        (('{fourth}', context),),
-        (('{first}', context),),
-    ]
-    assert mocked_render.call_args_list == expected_calls
+    fragments = [args[0] for args, kwargs in mocked_render.call_args_list]
+    assert fragments == ['{second}', '{third}', '{fourth}', '{first}']
+    # the engine gets the render context, which is an overlay on the caller's context
+    assert all(args[1].maps[-1] is context for args, kwargs in mocked_render.call_args_list)
 
 
 def test_img_placeholder(tmpdir):
@@ -175,3 +185,358 @@ def test_img_placeholder(tmpdir):
     with open(goat, 'rb') as goat_file:
         expected_img_hexdigest = hashlib.sha1(goat_file.read()).hexdigest()
     assert expected_img_hexdigest == slide.shapes[0].image.sha1
+
+
+def test_img_placeholder_registered_key(tmpdir):
+    image_cache = ImageCache()
+    goat = str(TEST_FILES / 'goat.jpg')
+    image_cache.register('goat', goat)
+
+    template = Template(str(TEST_FILES / 'simple_img.pptx'), image_cache=image_cache)
+    template.render({'goat_here_pls': 'goat'}, engine=PythonEngine())
+    outfile = str(tmpdir.join('registered.pptx'))
+    template.save_to(outfile)
+
+    slide = Presentation(outfile).slides[0]
+    with open(goat, 'rb') as goat_file:
+        assert hashlib.sha1(goat_file.read()).hexdigest() == slide.shapes[0].image.sha1
+
+
+def test_img_placeholder_bytes():
+    with open(str(TEST_FILES / 'goat.jpg'), 'rb') as goat_file:
+        goat = goat_file.read()
+
+    class BytesEngine(BaseEngine):
+        def render(self, fragment, context):
+            return goat
+
+    template = Template(str(TEST_FILES / 'simple_img.pptx'))
+    template.render({}, engine=BytesEngine())
+
+    slide = template._presentation.slides[0]
+    assert slide.shapes[0].image.sha1 == hashlib.sha1(goat).hexdigest()
+
+
+def test_img_placeholder_missing_file():
+    template = Template(str(TEST_FILES / 'simple_img.pptx'))
+    with pytest.warns(UserWarning, match="File 'no-goat.jpg' does not exist."):
+        template.render({'goat_here_pls': 'no-goat.jpg'}, engine=PythonEngine())
+
+
+def test_image_cache_reuses_images():
+    image_cache = ImageCache()
+    goat = str(TEST_FILES / 'goat.jpg')
+
+    with patch('bureaucracy.powerpoint.images.Image', wraps=Image) as mocked_image:
+        for i in range(3):
+            template = Template(str(TEST_FILES / 'simple_img.pptx'), image_cache=image_cache)
+            template.render({'goat_here_pls': goat}, engine=PythonEngine())
+
+    # the image is only read and measured once
+    assert mocked_image.call_count == 1
+
+
+def test_image_cache_downscale():
+    goat = str(TEST_FILES / 'goat.jpg')
+    image_cache = ImageCache(downscale=True, dpi=10)
+    template = Template(str(TEST_FILES / 'simple_img.pptx'), image_cache=image_cache)
+    template.render({'goat_here_pls': goat}, engine=PythonEngine())
+
+    picture = template._presentation.slides[0].shapes[0]
+    assert len(picture.image.blob) < os.path.getsize(goat)
+    assert picture.image.size < image_cache.get(goat).size
+
+
+def test_python_engine_variables():
+    engine = PythonEngine()
+    assert engine.get_variables('{a} {b.attr} {c[0]:>{width}} {} {0} {{literal}}') == {'a', 'b', 'c', 'width'}
+
+
+def test_get_variables():
+    template = Template(str(TEST_FILES / 'ordering-placeholder.pptx'))
+    variables = template.get_variables()
+
+    assert variables.slides == [{'first', 'second', 'third', 'fourth'}]
+    assert variables.layouts == {'repeatable-slide': {'first', 'second', 'third', 'fourth'}}
+    assert variables.missing({'first': 1, 'third': 3}) == ['fourth', 'second']
+    # computed once, and shared with copies
+    assert template.copy().get_variables() is variables
+
+
+def test_get_variables_after_render():
+    template = Template(str(TEST_FILES / 'ordering-placeholder.pptx'))
+    copy = template.copy()
+    copy.render({'first': 1, 'second': 2, 'third': 3, 'fourth': 4})
+
+    expected = [{'first', 'second', 'third', 'fourth'}]
+    assert copy.get_variables().slides == expected
+    assert template.get_variables().slides == expected
+
+
+def test_get_variables_custom_engine():
+    class WordEngine(BaseEngine):
+        def get_variables(self, fragment):
+            return set(fragment.split())
+
+    template = Template(str(TEST_FILES / 'empty-and-filled-in-placeholders.pptx'))
+    variables = template.get_variables(engine=WordEngine())
+
+    assert {'simple', '{language}', 'template'} <= variables.names
+    assert template.get_variables().names == {'language'}
+
+    class PrefixEngine(BaseEngine):
+        def __init__(self, prefix):
+            self.prefix = prefix
+
+        def get_variables(self, fragment):
+            return {self.prefix + word for word in fragment.split()}
+
+        def fingerprint(self):
+            return self.prefix
+
+    # engines of the same class with other options don't share the result
+    assert 'a:simple' in template.get_variables(engine=PrefixEngine('a:')).names
+    assert 'b:simple' in template.get_variables(engine=PrefixEngine('b:')).names
+
+    with pytest.raises(NotImplementedError):
+        template.get_variables(engine=ConstantEngine())
+
+
+def test_render_leaves_context_untouched():
+    template = Template(str(TEST_FILES / 'empty-and-filled-in-placeholders.pptx'))
+    context = {'language': 'Python'}
+    template.render(context)
+
+    assert context == {'language': 'Python'}
+
+
+def test_render_engine_per_render():
+    class CountingEngine(PythonEngine):
+        started = 0
+
+        def start_render(self):
+            CountingEngine.started += 1
+            return CountingEngine()
+
+    engine = CountingEngine()
+    template = Template(str(TEST_FILES / 'empty-and-filled-in-placeholders.pptx'))
+    template.render({'language': 'Python'}, engine=engine)
+    template.render({'language': 'Python'}, engine=engine)
+
+    assert CountingEngine.started == 2
+
+
+def test_render_many():
+    template = Template(str(TEST_FILES / 'empty-and-filled-in-placeholders.pptx'))
+    contexts = [{'language': 'Language {}'.format(i)} for i in range(20)]
+
+    rendered = template.render_many(contexts, workers=4)
+
+    assert len(rendered) == 20
+    for i, result in enumerate(rendered):
+        slide = Presentation(BytesIO(result.to_bytes())).slides[0]
+        assert slide.placeholders[11].text == 'A simple Language {} string format template'.format(i)
+    # the template itself is not rendered
+    assert template._presentation.slides[0].placeholders[11].text == ''
+    assert all(context.keys() == {'language'} for context in contexts)
+
+
+class FakeConverter(BaseConverter):
+    def convert_many(self, documents, source_format, target_format):
+        return [target_format.encode() + b':' + data[:2] for data in documents]
+
+
+def test_template_to_pdf(tmpdir):
+    template = Template(str(TEST_FILES / 'template1.pptx'), converter=FakeConverter())
+    template.render(context={}, engine=ConstantEngine())
+
+    assert template.to_bytes(format='pdf') == b'pdf:PK'
+
+    outfile = str(tmpdir.join('constant-engine.pdf'))
+    template.save_to(outfile, format='pdf')
+    with open(outfile, 'rb') as infile:
+        assert infile.read() == b'pdf:PK'
+
+    with pytest.raises(ValueError):
+        template.to_bytes(format='odp')
+
+
+def test_template_instrumentation():
+    sink = MemorySink()
+    add_sink(sink)
+    try:
+        template = Template(str(TEST_FILES / 'template1.pptx'))
+        template.render(context={}, engine=ConstantEngine())
+        data = template.to_bytes()
+    finally:
+        remove_sink(sink)
+
+    assert {'pptx.load', 'pptx.render', 'pptx.save'} <= set(sink.timing_names())
+    assert sink.total('pptx.slides') == 1
+    assert sink.total('pptx.placeholders') == 31 + 6
+    assert sink.total('pptx.bytes_out') == len(data)
+
+
+def test_render_to_bytes_from_cache():
+    cache = MemoryCache()
+    template = Template(str(TEST_FILES / 'empty-and-filled-in-placeholders.pptx'), converter=FakeConverter(),
+                        cache=cache)
+
+    first = template.render_to_bytes({'language': 'Python'})
+    with patch.object(Template, 'render') as render:
+        assert template.copy().render_to_bytes({'language': 'Python'}) == first
+    render.assert_not_called()
+
+    slide = Presentation(BytesIO(first)).slides[0]
+    assert slide.placeholders[11].text == 'A simple Python string format template'
+
+    assert template.render_to_bytes({'language': 'Python'}, format='pdf') == b'pdf:PK'
+    template.render_to_bytes({'language': 'Rust'})
+    assert len(cache) == 3
+
+
+def test_render_to_bytes_cache_key(tmpdir):
+    cache = MemoryCache()
+    image_cache = ImageCache()
+    template = Template(str(TEST_FILES / 'simple_img.pptx'), image_cache=image_cache, cache=cache)
+    image = tmpdir.join('image.jpg')
+    image.write_binary((TEST_FILES / 'goat.jpg').read_bytes())
+
+    first = template.render_to_bytes({'goat_here_pls': str(image)})
+    assert template.render_to_bytes({'goat_here_pls': str(image)}) == first
+    assert len(cache) == 1
+
+    # a changed image is rendered again
+    image.write_binary(image.read_binary() + b'\0')
+    os.utime(str(image), ns=(1, 1))
+    template.render_to_bytes({'goat_here_pls': str(image)})
+    assert len(cache) == 2
+
+    # as is a render with another registered image or engine configuration
+    image_cache.register('goat', str(TEST_FILES / 'goat.jpg'))
+    template.render_to_bytes({'goat_here_pls': 'goat'})
+    image_cache.register('goat', str(image))
+    template.render_to_bytes({'goat_here_pls': 'goat'})
+    assert len(cache) == 4
+
+    class PrefixEngine(PythonEngine):
+        def __init__(self, prefix):
+            self.prefix = prefix
+
+        def render(self, fragment, context):
+            return self.prefix + super().render(fragment, context)
+
+        def fingerprint(self):
+            return self.prefix
+
+    template = Template(str(TEST_FILES / 'empty-and-filled-in-placeholders.pptx'), cache=cache)
+    one = template.render_to_bytes({'language': 'Python'}, engine=PrefixEngine('one: '))
+    two = template.render_to_bytes({'language': 'Python'}, engine=PrefixEngine('two: '))
+    assert one != two
+
+    # and with another converter
+    size = len(cache)
+    template.converter = SofficeConverter(executable='soffice-7')
+    template.render_to_bytes({'language': 'Python'}, engine=PrefixEngine('one: '))
+    assert len(cache) == size + 1
+
+
+def test_compression():
+    template = Template(str(TEST_FILES / 'simple_img.pptx'), compression=Compression.STORE)
+    stored = template.to_bytes()
+    with zipfile.ZipFile(BytesIO(stored)) as infile:
+        assert {info.compress_type for info in infile.infolist()} == {zipfile.ZIP_STORED}
+
+    template = template.copy()
+    template.compression = Compression.SMALLEST
+    handle = BytesIO()
+    template.save_to(handle)
+    assert len(handle.getvalue()) < len(stored)
+    with zipfile.ZipFile(handle) as infile:
+        compression = {info.filename: info.compress_type for info in infile.infolist()}
+    assert compression['ppt/presentation.xml'] == zipfile.ZIP_DEFLATED
+    assert compression['docProps/thumbnail.jpeg'] == zipfile.ZIP_STORED
+    Presentation(handle)
+
+
+def test_profiler(tmpdir):
+    profiler = RenderProfiler(str(tmpdir), threshold=0)
+    template = Template(str(TEST_FILES / 'template1.pptx'), profiler=profiler)
+    template.copy().render(context={}, engine=ConstantEngine())
+
+    captures = profiler.captures()
+    assert len(captures) == 1
+    with open(os.path.join(captures[0], 'capture.json')) as infile:
+        capture = json.load(infile)
+    assert capture['kind'] == 'pptx'
+    assert capture['counts']['pptx.slides'] == 1
+    assert capture['counts']['pptx.placeholders'] == 31 + 6
+
+
+def test_prune_unused():
+    template = Template(str(TEST_FILES / 'repeatable-slide.pptx'))
+    assert len(template.layouts) == 12
+    unpruned = template.to_bytes()
+
+    # a picture that is no longer on the slide
+    slide = template._presentation.slides[0]
+    picture = slide.shapes.add_picture(str(TEST_FILES / 'goat.jpg'), 0, 0)
+    picture._element.getparent().remove(picture._element)
+
+    template.prune_unused = True
+    data = template.to_bytes()
+
+    report = template.prune_report
+    assert (report.slides, report.layouts, report.masters, report.media) == (0, 11, 0, 1)
+    assert report.bytes > os.path.getsize(str(TEST_FILES / 'goat.jpg'))
+    assert len(data) < len(unpruned)
+
+    pres = Presentation(BytesIO(data))
+    assert [layout.name for layout in pres.slide_layouts] == ['Blank Slide']
+    assert pres.slides[0].slide_layout.name == 'Blank Slide'
+    with zipfile.ZipFile(BytesIO(data)) as infile:
+        assert not [name for name in infile.namelist() if name.startswith('ppt/media/')]
+
+
+def test_prune_removed_slides():
+    template = Template(str(TEST_FILES / 'empty-and-filled-in-placeholders.pptx'))
+    slides = template._presentation.slides
+    slides._sldIdLst.remove(slides._sldIdLst[1])
+
+    report = template.prune()
+
+    assert report.slides == 1
+    assert Template(BytesIO(template.to_bytes())).layouts == ['layout-1']
+
+
+def test_artifact():
+    template = Template(str(TEST_FILES / 'template1.pptx'))
+    artifact = template.to_artifact()
+
+    # the layouts are not analysed again
+    with patch('bureaucracy.powerpoint.slides.SlideContainer.get_placeholder_idx_in_correct_order') as order:
+        loaded = Template.from_artifact(artifact)
+        rendered = loaded.copy()
+        rendered.render(context={}, engine=ConstantEngine())
+    order.assert_not_called()
+
+    assert loaded._layout_cache == template._layout_cache
+    pres = Presentation(BytesIO(rendered.to_bytes()))
+    assert pres.slides[0].placeholders[0].text == 'Constant'
+
+    # a rendered template is saved as it is now
+    again = Template.from_artifact(rendered.to_artifact())
+    assert again._presentation.slides[0].placeholders[0].text == 'Constant'
+
+
+def test_pickle():
+    template = Template(str(TEST_FILES / 'simple_img.pptx'), image_cache=ImageCache(downscale=True),
+                        compression=Compression.STORE)
+    template.image_cache.register('goat', str(TEST_FILES / 'goat.jpg'))
+
+    loaded = pickle.loads(pickle.dumps(template))
+
+    assert loaded.compression == Compression.STORE
+    assert loaded.image_cache.downscale
+    assert loaded.image_cache.get('goat').sha1 == template.image_cache.get('goat').sha1
+    assert loaded.to_bytes().startswith(b'PK')
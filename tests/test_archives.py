@@ -0,0 +1,113 @@
+import io
+import json
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+import docx
+
+from bureaucracy.archives import TarArchive, ZipArchive
+from bureaucracy.batch import DocxBatchRenderer
+
+from .test_fields import resources_dir
+
+TEMPLATE = os.path.join(resources_dir, 'simple_fields.docx')
+
+
+class Unseekable(io.RawIOBase):
+    """
+    A write-only stream, like a socket.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+def contexts():
+    yield {'foo': 'foo 0', 'bar': 'bar', 'baz': 'baz'}
+    yield {'foo': 'only foo'}
+    yield {'foo': 'foo 2', 'bar': 'bar', 'baz': 'baz'}
+
+
+class ArchiveTests(unittest.TestCase):
+    def _render(self, archive):
+        renderer = DocxBatchRenderer(TEMPLATE, strict=True, workers=0)
+        with archive:
+            report = renderer.run(contexts(), callback=archive)
+        self.assertEqual(report.failed, 1)
+
+    def test_zip_to_stream(self):
+        stream = Unseekable()
+        self._render(ZipArchive(stream))
+
+        with zipfile.ZipFile(io.BytesIO(stream.getvalue())) as infile:
+            self.assertEqual(infile.namelist(), ['00000.docx', '00002.docx', 'manifest.json'])
+            # documents are zip files already
+            self.assertEqual(infile.getinfo('00000.docx').compress_type, zipfile.ZIP_STORED)
+            document = docx.Document(io.BytesIO(infile.read('00002.docx')))
+            manifest = json.loads(infile.read('manifest.json'))
+
+        self.assertTrue(document.element.xpath(".//text()='foo 2'"))
+        self.assertEqual(manifest['documents'], ['00000.docx', '00002.docx'])
+        failure, = manifest['failures']
+        self.assertEqual((failure['index'], failure['name']), (1, '00001.docx'))
+        self.assertIn('PreflightError', failure['error'])
+        self.assertEqual([problem['field'] for problem in failure['problems']], ['bar', 'baz'])
+
+    def test_tar(self):
+        stream = Unseekable()
+        self._render(TarArchive(stream, compression='gz'))
+
+        with tarfile.open(fileobj=io.BytesIO(stream.getvalue()), mode='r:gz') as infile:
+            self.assertEqual(infile.getnames(), ['00000.docx', '00002.docx', 'manifest.json'])
+            manifest = json.load(infile.extractfile('manifest.json'))
+        self.assertEqual([failure['index'] for failure in manifest['failures']], [1])
+
+    def test_append(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'letters.zip')
+            with ZipArchive(path) as archive:
+                archive.write('00000.docx', b'first run')
+                archive.fail(1, '00001.docx', 'Oops')
+
+            with ZipArchive(path, append=True) as archive:
+                self.assertTrue(archive.exists('00000.docx'))
+                archive.write('00001.docx', b'second run')
+                with self.assertRaises(ValueError):
+                    archive.write('00000.docx', b'again')
+
+            # resuming again replaces the manifest again
+            with ZipArchive(path, append=True) as archive:
+                archive.fail(2, '00002.docx', 'Oops')
+
+            with zipfile.ZipFile(path) as infile:
+                self.assertEqual(infile.namelist(), ['00000.docx', '00001.docx', 'manifest.json'])
+                self.assertEqual(infile.read('00000.docx'), b'first run')
+                manifest = json.loads(infile.read('manifest.json'))
+        self.assertEqual(manifest, {
+            'documents': ['00000.docx', '00001.docx'],
+            'failures': [{'index': 2, 'name': '00002.docx', 'error': 'Oops'}],
+        })
+
+        with self.assertRaises(ValueError):
+            ZipArchive(io.BytesIO(), append=True)
+
+    def test_no_manifest(self):
+        handle = io.BytesIO()
+        with ZipArchive(handle, manifest=None) as archive:
+            archive.write('letter.pdf', b'%PDF')
+        with zipfile.ZipFile(handle) as infile:
+            self.assertEqual(infile.namelist(), ['letter.pdf'])
+            self.assertEqual(infile.getinfo('letter.pdf').compress_type, zipfile.ZIP_DEFLATED)
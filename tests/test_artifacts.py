@@ -0,0 +1,78 @@
+import pickle
+import struct
+import zipfile
+from io import BytesIO
+
+from bureaucracy import DocxTemplate
+from bureaucracy.artifacts import ArtifactError
+from bureaucracy.instrumentation import MemorySink, add_sink, remove_sink
+from bureaucracy.packaging import Compression
+
+from .test_fields import DocxTestsBase
+from .test_regions import table_template
+
+
+class ArtifactTests(DocxTestsBase):
+    def setUp(self):
+        self.sink = MemorySink()
+        add_sink(self.sink)
+
+    def tearDown(self):
+        remove_sink(self.sink)
+
+    def _read(self, data, name='word/document.xml'):
+        with zipfile.ZipFile(BytesIO(data)) as infile:
+            return infile.read(name)
+
+    def test_round_trip(self):
+        doc = self._get_docx('simple_and_complex_fields')
+        context = {name: 'value of {}'.format(name) for name in doc.get_field_names()}
+        artifact = doc.to_artifact()
+
+        self.sink.clear()
+        loaded = DocxTemplate.from_artifact(artifact)
+        self.assertEqual(loaded.get_field_names(), doc.get_field_names())
+        data = loaded.render(context)
+
+        # nothing was analysed again
+        self.assertNotIn('docx.compile', self.sink.timing_names())
+        self.assertEqual(self._read(data), self._read(doc.render(context)))
+
+    def test_regions(self):
+        doc = DocxTemplate(table_template())
+        loaded = DocxTemplate.from_artifact(doc.to_artifact(), strict=True)
+
+        self.assertEqual(loaded.get_regions(), {'lines': {'description', 'amount'}})
+        self.assertTrue(loaded.strict)
+        context = {'customer': 'ACME', 'lines': [{'description': 'Seeds', 'amount': 3}], 'total': '3'}
+        self.assertEqual(self._read(loaded.render(context)), self._read(doc.render(context)))
+
+    def test_pickle(self):
+        doc = self._get_docx('simple_fields')
+        doc.compression = Compression.STORE
+        context = {'foo': 'foo', 'bar': 'bar', 'baz': 'baz'}
+
+        loaded = pickle.loads(pickle.dumps(doc))
+
+        self.assertEqual(loaded.compression, Compression.STORE)
+        self.assertEqual(loaded._compiled.fields, doc._compile().fields)
+        data = loaded.render(context)
+        with zipfile.ZipFile(BytesIO(data)) as infile:
+            self.assertEqual({info.compress_type for info in infile.infolist()}, {zipfile.ZIP_STORED})
+        self.assertEqual(self._read(data), self._read(doc.render(context)))
+
+    def test_rejected(self):
+        artifact = self._get_docx('simple_fields').to_artifact()
+
+        corrupt = bytearray(artifact)
+        corrupt[-10] ^= 0xff
+        with self.assertRaises(ArtifactError):
+            DocxTemplate.from_artifact(bytes(corrupt))
+
+        version = bytearray(artifact)
+        struct.pack_into('>H', version, 12, 999)
+        with self.assertRaisesRegex(ArtifactError, 'version 999'):
+            DocxTemplate.from_artifact(bytes(version))
+
+        with self.assertRaises(ArtifactError):
+            DocxTemplate.from_artifact(b'PK\x03\x04 not an artifact')
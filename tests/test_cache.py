@@ -0,0 +1,148 @@
+import datetime
+import os
+import tempfile
+import time
+import unittest
+from collections import OrderedDict
+from decimal import Decimal
+from unittest import mock
+
+from bureaucracy.cache import DirectoryCache, MemoryCache, fingerprint
+from bureaucracy.converters import BaseConverter, SofficeConverter
+from bureaucracy.replacements import (
+    ImageReplacement, Replacement, TableReplacement, TextReplacement
+)
+
+from .test_fields import DocxTestsBase, resources_dir
+
+
+class FingerprintTests(unittest.TestCase):
+    def test_stable(self):
+        context = {'name': 'Jane', 'amount': Decimal('12.50'), 'date': datetime.date(2020, 1, 31),
+                   'table': TableReplacement([[1, 2.5]], ['a', 'b']), 'flags': {1, 2}}
+        reordered = OrderedDict(reversed(list(context.items())))
+
+        self.assertEqual(fingerprint(context), fingerprint(reordered))
+        self.assertEqual(fingerprint(context), fingerprint(dict(context, table=TableReplacement([[1, 2.5]], ['a', 'b']))))
+
+    def test_distinguishes_types(self):
+        values = [1, '1', 1.0, True, b'1', [1], None, TextReplacement('1')]
+        self.assertEqual(len({fingerprint(value) for value in values}), len(values))
+        self.assertEqual(fingerprint([1]), fingerprint((1,)))
+
+    def test_replacements_by_data(self):
+        image = os.path.join(resources_dir, 'pigeon.jpg')
+        with open(image, 'rb') as infile:
+            self.assertEqual(fingerprint(ImageReplacement(image)), fingerprint(ImageReplacement(infile)))
+            self.assertEqual(infile.tell(), 0)
+        self.assertNotEqual(fingerprint(ImageReplacement(image)), fingerprint(ImageReplacement(image, width=10)))
+
+    def test_unsupported(self):
+        with self.assertRaises(TypeError):
+            fingerprint({'value': object()})
+        with self.assertRaises(TypeError):
+            fingerprint({'value': Replacement()})
+
+
+class MemoryCacheTests(unittest.TestCase):
+    def test_lru(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set('a', b'a')
+        cache.set('b', b'b')
+        cache.get('a')
+        cache.set('c', b'c')
+
+        self.assertEqual(cache.get('a'), b'a')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    def test_max_bytes(self):
+        cache = MemoryCache(max_bytes=10)
+        cache.set('a', b'x' * 6)
+        cache.set('b', b'x' * 6)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size, 6)
+
+
+class DirectoryCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_get_set(self):
+        cache = DirectoryCache(self.tmpdir.name)
+        self.assertIsNone(cache.get('key.pdf'))
+        cache.set('key.pdf', b'data')
+
+        self.assertEqual(cache.get('key.pdf'), b'data')
+        self.assertEqual(DirectoryCache(self.tmpdir.name).size, 4)
+        with self.assertRaises(ValueError):
+            cache.get('../key')
+
+    def test_evicts_least_recently_used(self):
+        cache = DirectoryCache(self.tmpdir.name, max_bytes=10)
+        cache.set('a', b'x' * 4)
+        cache.set('b', b'x' * 4)
+        past = time.time() - 60
+        os.utime(os.path.join(self.tmpdir.name, 'b'), (past, past))
+        cache.set('c', b'x' * 4)
+
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ['a', 'c'])
+        self.assertEqual(cache.size, 8)
+
+
+class DocxCacheTests(DocxTestsBase):
+    def test_render_from_cache(self):
+        doc = self._get_docx('simple_fields')
+        doc.cache = MemoryCache()
+        doc.converter = mock.Mock(spec=BaseConverter)
+        doc.converter.fingerprint.return_value = None
+        doc.converter.convert.return_value = b'%PDF'
+
+        self.assertEqual(doc.render({'foo': 'foo'}, format='pdf'), b'%PDF')
+        self.assertEqual(doc.render({'foo': 'foo'}, format='pdf'), b'%PDF')
+        self.assertEqual(doc.converter.convert.call_count, 1)
+
+        doc.render({'foo': 'bar'}, format='pdf')
+        self.assertEqual(doc.converter.convert.call_count, 2)
+
+    def test_render_result_from_cache(self):
+        doc = self._get_docx('simple_fields')
+        doc.cache = MemoryCache()
+        doc.converter = mock.Mock(spec=BaseConverter)
+        doc.converter.fingerprint.return_value = None
+        doc.converter.convert.return_value = b'%PDF'
+
+        first = doc.render({'foo': 'foo'}, format=None)
+        first.pdf
+        with mock.patch.object(doc, '_render_fast') as render_fast:
+            second = doc.render({'foo': 'foo'}, format=None)
+            self.assertEqual(second.docx, first.docx)
+            self.assertEqual(second.pdf, b'%PDF')
+        render_fast.assert_not_called()
+        self.assertEqual(doc.converter.convert.call_count, 1)
+
+    def test_key(self):
+        doc = self._get_docx('simple_fields')
+        doc.cache = MemoryCache()
+        doc.render({'foo': 'foo'})
+
+        # another converter makes other pdfs
+        doc.converter = SofficeConverter(executable='soffice-7')
+        doc.render({'foo': 'foo'})
+        self.assertEqual(len(doc.cache), 2)
+
+        # so does a changed template
+        doc.paragraphs[0].insert_paragraph_before('inserted')
+        doc.render({'foo': 'foo'})
+        self.assertEqual(len(doc.cache), 3)
+
+    def test_uncacheable_context(self):
+        doc = self._get_docx('simple_fields')
+        doc.cache = MemoryCache()
+        doc.render({'foo': 'foo', 'unused': object()})
+
+        self.assertEqual(len(doc.cache), 0)
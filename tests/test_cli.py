@@ -0,0 +1,217 @@
+import io
+import json
+import os
+import stat
+import sys
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from contextlib import redirect_stdout
+from unittest import mock
+
+import docx
+
+from bureaucracy.batch import BatchItem
+from bureaucracy.cli import DirectoryOutput, Job, main
+from bureaucracy.converters import BaseConverter
+
+from .test_converters import FAKE_SOFFICE
+from .test_fields import resources_dir
+
+TEMPLATE = os.path.join(resources_dir, 'simple_fields.docx')
+
+
+class CommandLineTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.contexts = os.path.join(self.tmpdir.name, 'contexts.jsonl')
+        with open(self.contexts, 'w') as outfile:
+            for i in range(3):
+                outfile.write(json.dumps({'foo': 'foo {}'.format(i), 'bar': 'bar', 'baz': 'baz'}) + '\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _main(self, *args):
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            status = main([str(arg) for arg in args] + ['--workers', '0', '--quiet'])
+        return status, stdout.getvalue()
+
+    def test_render_to_directory(self):
+        outdir = os.path.join(self.tmpdir.name, 'out')
+        status, output = self._main(TEMPLATE, self.contexts, outdir)
+
+        self.assertEqual(status, 0)
+        self.assertIn('Wrote 3 of 3 documents', output)
+        self.assertEqual(sorted(os.listdir(outdir)), ['00000.docx', '00001.docx', '00002.docx'])
+        document = docx.Document(os.path.join(outdir, '00001.docx'))
+        self.assertTrue(document.element.xpath(".//text()='foo 1'"))
+
+    def test_render_csv_to_zip(self):
+        contexts = os.path.join(self.tmpdir.name, 'contexts.csv')
+        with open(contexts, 'w') as outfile:
+            outfile.write('id,foo,bar,baz\na,1,2,3\nb,4,5,6\n')
+        archive = os.path.join(self.tmpdir.name, 'out.zip')
+
+        status, output = self._main(TEMPLATE, contexts, archive, '--filename', 'letter-{id}.{ext}')
+
+        self.assertEqual(status, 0)
+        with zipfile.ZipFile(archive) as infile:
+            self.assertEqual(sorted(infile.namelist()), ['letter-a.docx', 'letter-b.docx', 'manifest.json'])
+
+    def test_render_to_tar_with_failures(self):
+        with open(self.contexts, 'a') as outfile:
+            outfile.write(json.dumps({'foo': 'only foo'}) + '\n')
+        archive = os.path.join(self.tmpdir.name, 'out.tar.gz')
+
+        status, output = self._main(TEMPLATE, self.contexts, archive, '--strict')
+
+        self.assertEqual(status, 1)
+        with tarfile.open(archive) as infile:
+            self.assertEqual(sorted(infile.getnames()), ['00000.docx', '00001.docx', '00002.docx', 'manifest.json'])
+            manifest = json.load(infile.extractfile('manifest.json'))
+        self.assertEqual([failure['name'] for failure in manifest['failures']], ['00003.docx'])
+
+    def test_resume_skips_existing_outputs(self):
+        outdir = os.path.join(self.tmpdir.name, 'out')
+        os.makedirs(outdir)
+        with open(os.path.join(outdir, '00001.docx'), 'wb') as outfile:
+            outfile.write(b'already there')
+
+        status, output = self._main(TEMPLATE, self.contexts, outdir, '--resume')
+
+        self.assertEqual(status, 0)
+        self.assertIn('Wrote 2 of 2 documents', output)
+        self.assertIn('1 skipped', output)
+        with open(os.path.join(outdir, '00001.docx'), 'rb') as infile:
+            self.assertEqual(infile.read(), b'already there')
+
+    def test_failures(self):
+        with open(self.contexts, 'a') as outfile:
+            outfile.write(json.dumps({'foo': 'only foo'}) + '\n')
+        outdir = os.path.join(self.tmpdir.name, 'out')
+
+        report = os.path.join(self.tmpdir.name, 'report.jsonl')
+        status, output = self._main(TEMPLATE, self.contexts, outdir, '--strict', '--report', report)
+
+        self.assertEqual(status, 1)
+        self.assertIn('1 failed', output)
+        self.assertIn('3 (00003.docx): PreflightError', output)
+        self.assertFalse(os.path.exists(os.path.join(outdir, '00003.docx')))
+        with open(report) as infile:
+            failures = [json.loads(line) for line in infile]
+        self.assertEqual([failure['index'] for failure in failures], [3])
+        self.assertEqual([problem['field'] for problem in failures[0]['problems']], ['bar', 'baz'])
+
+    def test_filename_without_context_key(self):
+        with open(self.contexts, 'a') as outfile:
+            outfile.write(json.dumps({'id': 'x', 'foo': 'foo', 'bar': 'bar', 'baz': 'baz'}) + '\n')
+        outdir = os.path.join(self.tmpdir.name, 'out')
+
+        status, output = self._main(TEMPLATE, self.contexts, outdir, '--filename', 'letter-{id}.{ext}')
+
+        # the contexts without an id fail on their own
+        self.assertEqual(status, 1)
+        self.assertIn('3 failed', output)
+        self.assertIn("KeyError('id')", output)
+        self.assertEqual(os.listdir(outdir), ['letter-x.docx'])
+
+    def test_filename_outside_output(self):
+        outdir = os.path.join(self.tmpdir.name, 'out')
+
+        status, output = self._main(TEMPLATE, self.contexts, outdir, '--filename', '../{foo}.{ext}')
+
+        self.assertEqual(status, 1)
+        self.assertIn('3 failed', output)
+        self.assertIn('is not inside the output directory', output)
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ['contexts.jsonl', 'out'])
+
+    def test_invalid_json(self):
+        with open(self.contexts, 'a') as outfile:
+            outfile.write('{not json\n')
+
+        with redirect_stdout(io.StringIO()), mock.patch('sys.stderr', io.StringIO()) as stderr:
+            status = main([TEMPLATE, self.contexts, os.path.join(self.tmpdir.name, 'out'), '--workers', '0'])
+
+        self.assertEqual(status, 2)
+        self.assertIn('Line 4 is not valid JSON', stderr.getvalue())
+
+    def test_interrupted_run_finishes_archive(self):
+        def contexts(infile):
+            yield {'foo': 'foo', 'bar': 'bar', 'baz': 'baz'}
+            raise KeyboardInterrupt
+
+        archive = os.path.join(self.tmpdir.name, 'out.zip')
+        with mock.patch.dict('bureaucracy.cli.READERS', jsonl=contexts), self.assertRaises(KeyboardInterrupt):
+            self._main(TEMPLATE, self.contexts, archive)
+
+        with zipfile.ZipFile(archive) as infile:
+            self.assertEqual(infile.namelist(), ['00000.docx', 'manifest.json'])
+
+    def test_bad_template_creates_no_output(self):
+        template = os.path.join(self.tmpdir.name, 'broken.docx')
+        with open(template, 'wb') as outfile:
+            outfile.write(b'not a zip file')
+
+        archive = os.path.join(self.tmpdir.name, 'out.zip')
+        with self.assertRaises(Exception):
+            self._main(template, self.contexts, archive)
+        self.assertFalse(os.path.exists(archive))
+
+    def test_convert_to_pdf_in_batches(self):
+        soffice = os.path.join(self.tmpdir.name, 'soffice')
+        with open(soffice, 'w') as outfile:
+            outfile.write(FAKE_SOFFICE.format(python=sys.executable))
+        os.chmod(soffice, os.stat(soffice).st_mode | stat.S_IEXEC)
+        outdir = os.path.join(self.tmpdir.name, 'out')
+
+        status, output = self._main(TEMPLATE, self.contexts, outdir, '--format', 'pdf', '--soffice', soffice,
+                                    '--batch-size', '2')
+
+        self.assertEqual(status, 0)
+        self.assertEqual(sorted(os.listdir(outdir)), ['00000.pdf', '00001.pdf', '00002.pdf'])
+        with open(os.path.join(self.tmpdir.name, 'calls.log')) as log:
+            self.assertEqual(len(log.read().splitlines()), 2)
+
+
+class JobTests(unittest.TestCase):
+    def test_write_failures_after_conversion(self):
+        class Converter(BaseConverter):
+            def convert_many(self, documents, source_format, target_format):
+                return [b'%PDF ' + document for document in documents]
+
+        class Output(DirectoryOutput):
+            def write(self, name, data):
+                if name == '00001.pdf':
+                    raise OSError("Disk full")
+                super().write(name, data)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            job = Job(Output(tmpdir), converter=Converter(), batch_size=2, source_format='docx')
+            for index in range(3):
+                job(BatchItem(index, '{:05d}.docx'.format(index), data=b'document'))
+            job.finish()
+
+            self.assertEqual(sorted(os.listdir(tmpdir)), ['00000.pdf', '00002.pdf'])
+        self.assertEqual(job.written, 2)
+        self.assertEqual(job.failures, [{'index': 1, 'name': '00001.pdf', 'error': "OSError('Disk full')"}])
+
+    def test_conversion_errors_are_raised(self):
+        class Output(DirectoryOutput):
+            def fail(self, index, name, error, problems=None):
+                raise RuntimeError("Closed")
+
+        class Converter(BaseConverter):
+            def convert_many(self, documents, source_format, target_format):
+                raise ValueError("Broken")
+
+            def convert(self, document, source_format, target_format):
+                raise ValueError("Broken")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            job = Job(Output(tmpdir), converter=Converter(), source_format='docx')
+            job(BatchItem(0, '00000.docx', data=b'document'))
+            with self.assertRaises(RuntimeError):
+                job.finish()
@@ -0,0 +1,65 @@
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+from bureaucracy.converters import ConversionError, SofficeConverter
+
+# stands in for soffice: "converts" by copying the input files to the output directory, upper cased
+FAKE_SOFFICE = """#!{python}
+import os, sys
+args = sys.argv[1:]
+with open(os.path.join(os.path.dirname(sys.argv[0]), 'calls.log'), 'a') as log:
+    log.write(' '.join(args) + '\\n')
+fmt = args[args.index('--convert-to') + 1]
+outdir = args[args.index('--outdir') + 1]
+os.makedirs(outdir, exist_ok=True)
+for path in args[args.index('--outdir') + 2:]:
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name.endswith('-5'):
+        continue
+    with open(path, 'rb') as infile, open(os.path.join(outdir, name + '.' + fmt), 'wb') as outfile:
+        outfile.write(infile.read().upper())
+"""
+
+
+class SofficeConverterTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.executable = os.path.join(self.tmpdir.name, 'soffice')
+        with open(self.executable, 'w') as outfile:
+            outfile.write(FAKE_SOFFICE.format(python=sys.executable))
+        os.chmod(self.executable, os.stat(self.executable).st_mode | stat.S_IEXEC)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _calls(self):
+        with open(os.path.join(self.tmpdir.name, 'calls.log')) as log:
+            return log.read().splitlines()
+
+    def test_convert(self):
+        converter = SofficeConverter(executable=self.executable, profile_dir=self.tmpdir.name)
+        self.assertEqual(converter.convert(b'document', 'docx', 'pdf'), b'DOCUMENT')
+
+        calls = self._calls()
+        self.assertEqual(len(calls), 1)
+        self.assertIn('-env:UserInstallation=file://{}'.format(os.path.join(self.tmpdir.name, 'worker-0')), calls[0])
+
+    def test_convert_many_in_batches(self):
+        converter = SofficeConverter(executable=self.executable, batch_size=2)
+        converted = converter.convert_many([b'a', b'b', b'c'], 'docx', 'pdf')
+
+        self.assertEqual(converted, [b'A', b'B', b'C'])
+        self.assertEqual(len(self._calls()), 2)
+
+    def test_missing_output(self):
+        converter = SofficeConverter(executable=self.executable)
+        with self.assertRaises(ConversionError):
+            converter.convert_many([b'a'] * 6, 'docx', 'pdf')
+
+    def test_missing_executable(self):
+        converter = SofficeConverter(executable=os.path.join(self.tmpdir.name, 'nope'))
+        with self.assertRaises(ConversionError):
+            converter.convert(b'a', 'docx', 'pdf')
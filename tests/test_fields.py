@@ -1,7 +1,17 @@
 import os
 import unittest
+from copy import deepcopy
+from io import BytesIO
+from unittest import mock
+
+import docx
 
 from bureaucracy import DocxTemplate
+from bureaucracy.preflight import PreflightError
+from bureaucracy.replacements import (
+    HTMLReplacement, ImageReplacement, TableReplacement
+)
+from bureaucracy.utils import namespaced
 
 resources_dir = os.path.join(os.path.realpath(os.path.dirname(__file__)), 'resources')
 
@@ -64,3 +74,69 @@ class FieldTests(DocxTestsBase):
         self.assertTrue(doc._element.xpath(".//text()='BEEES. AAAAH. BEEEEES'"))
         self.assertTrue(doc._element.xpath(".//text()='ಠ_ಠ unifying matrix conventions is the way of the future, Fred.'"))
         self.assertTrue(doc._element.xpath(".//text()='5.2'"))
+
+
+class PreflightTests(DocxTestsBase):
+    def test_field_names_are_cached(self):
+        doc = self._get_docx('simple_fields')
+        doc.get_field_names()
+        with mock.patch.object(doc, 'iter_fields') as iter_fields:
+            self.assertEqual(doc.get_field_names(), {'foo', 'bar', 'baz'})
+        iter_fields.assert_not_called()
+
+        doc.replace_fields({'foo': 'foo', 'bar': 'bar', 'baz': 'baz'})
+        self.assertEqual(doc.get_field_names(), set())
+
+    def test_report(self):
+        doc = self._get_docx('simple_and_complex_fields')
+        table = TableReplacement([['a', 'b']], ['one', 'two'])
+        table.data.append(['c'])
+        report = doc.preflight({'foo': table, 'bar': HTMLReplacement.__new__(HTMLReplacement), 'baz': 'baz',
+                                'complex': ImageReplacement('missing.jpg'), 'complex2': 'complex2'})
+
+        self.assertFalse(report.ok)
+        self.assertEqual([(problem['field'], problem['code']) for problem in report.as_dicts()], [
+            ('foo', 'invalid'),
+            ('bar', 'position'),  # bar and baz share a paragraph
+            ('simple', 'missing'),
+            ('complex', 'invalid'),
+        ])
+        self.assertTrue(doc.preflight({name: 'value' for name in doc.get_field_names()}).ok)
+
+    def test_paragraph_replacement_position(self):
+        doc = self._get_docx('simple_fields')
+        paragraph = doc._element.xpath('.//w:fldSimple')[0].getparent()
+        paragraph.append(paragraph.makeelement(namespaced('r')))
+        paragraph[-1].append(paragraph.makeelement(namespaced('t')))
+        paragraph[-1][0].text = 'more text'
+        doc._positions = None
+
+        report = doc.preflight({'foo': TableReplacement([['a']], None), 'bar': 'bar', 'baz': 'baz'})
+        self.assertEqual([problem.code for problem in report.problems], ['position'])
+
+    def test_repeated_field(self):
+        doc = self._get_docx('simple_fields')
+        paragraph = doc._element.xpath('.//w:fldSimple')[0].getparent()
+        paragraph.addnext(deepcopy(paragraph))
+        doc._positions = None
+        doc.strict = True
+        context = {'foo': TableReplacement([['a']], None), 'bar': 'bar', 'baz': 'baz'}
+
+        # a table is made for every occurrence, but html can only be filled in once
+        self.assertTrue(doc.preflight(context).ok)
+        report = doc.preflight(dict(context, foo=HTMLReplacement.__new__(HTMLReplacement)))
+        self.assertEqual([problem.code for problem in report.problems], ['position'])
+
+        rendered = docx.Document(BytesIO(doc.render(context)))
+        self.assertEqual(len(rendered.tables), 2)
+
+    def test_strict_render_fails_before_copying(self):
+        doc = self._get_docx('simple_fields')
+        doc.strict = True
+        with mock.patch.object(doc, '_copy') as copy, mock.patch.object(doc, '_render_fast') as render_fast:
+            with self.assertRaises(PreflightError) as cm:
+                doc.render({'foo': 'foo', 'bar': ImageReplacement('missing.jpg')})
+        copy.assert_not_called()
+        render_fast.assert_not_called()
+        self.assertEqual([problem.field for problem in cm.exception.problems], ['bar', 'baz'])
+        self.assertIsInstance(cm.exception, ValueError)
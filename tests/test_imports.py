@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# the cumulative time `import bureaucracy` may take, in microseconds
+IMPORT_TIME_BUDGET = 50000
+
+HEAVY_MODULES = ['docx', 'pptx', 'pypandoc', 'lxml', 'PIL']
+
+package_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def run_python(code, *options):
+    return subprocess.run([sys.executable] + list(options) + ['-c', code], cwd=package_dir,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+
+class ImportTests(unittest.TestCase):
+    def test_no_heavy_imports(self):
+        code = ("import sys, bureaucracy, bureaucracy.powerpoint, bureaucracy.utils; "
+                "print(' '.join(m for m in {} if m in sys.modules))".format(HEAVY_MODULES))
+        self.assertEqual(run_python(code).stdout.decode().strip(), '')
+
+    def test_import_time_budget(self):
+        stderr = run_python('import bureaucracy, bureaucracy.powerpoint', '-X', 'importtime').stderr.decode()
+
+        # lines look like "import time:   self [us] | cumulative | imported package"
+        cumulative = {}
+        for line in stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, total, name = line.split('|')
+                if total.strip().isdigit():
+                    cumulative[name.strip()] = int(total)
+
+        self.assertLess(cumulative['bureaucracy'] + cumulative['bureaucracy.powerpoint'], IMPORT_TIME_BUDGET)
+
+    def test_lazy_attributes(self):
+        import bureaucracy
+        from bureaucracy.replacements import HTMLReplacement
+        from bureaucracy.template import DocxTemplate
+
+        self.assertIs(bureaucracy.DocxTemplate, DocxTemplate)
+        self.assertIs(bureaucracy.HTML, HTMLReplacement)
+        with self.assertRaises(AttributeError):
+            bureaucracy.Nope
@@ -0,0 +1,98 @@
+import os
+import zipfile
+from io import BytesIO
+
+from bureaucracy.instrumentation import MemorySink, add_sink, remove_sink
+from bureaucracy.replacements import ImageReplacement, TableReplacement
+
+from .test_fields import DocxTestsBase, resources_dir
+
+
+class IncrementalRenderTests(DocxTestsBase):
+    def setUp(self):
+        self.sink = MemorySink()
+        add_sink(self.sink)
+
+    def tearDown(self):
+        remove_sink(self.sink)
+
+    def _read(self, data, name='word/document.xml'):
+        with zipfile.ZipFile(BytesIO(data)) as infile:
+            return infile.read(name)
+
+    def _full_render(self, doc, context):
+        doc.fast = False
+        try:
+            return doc.render(context)
+        finally:
+            doc.fast = True
+
+    def test_only_changed_fields_are_filled(self):
+        doc = self._get_docx('simple_and_complex_fields')
+        preview = doc.incremental()
+        context = {name: 'value of {}'.format(name) for name in doc.get_field_names()}
+
+        first = preview.render(context)
+        context['complex2'] = 'changed'
+        self.sink.clear()
+        second = preview.render(context)
+
+        self.assertEqual(self.sink.total('docx.incremental.fields'), 1)
+        self.assertEqual(self._read(first), self._read(self._full_render(doc, dict(context, complex2='value of complex2'))))
+        self.assertEqual(self._read(second), self._read(self._full_render(doc, context)))
+        self.assertEqual(doc.get_field_names(), {'foo', 'bar', 'baz', 'simple', 'complex', 'complex2'})
+
+    def test_rich_replacements(self):
+        doc = self._get_docx('alltypes')
+        preview = doc.incremental()
+        context = {'text': 'text', 'html': 'html', 'image': 'image', 'table': 'table'}
+        preview.render(context)
+
+        context['table'] = TableReplacement([['1', '2']], ['one', 'two'])
+        context['image'] = ImageReplacement(os.path.join(resources_dir, 'pigeon.jpg'))
+        data = preview.render(context)
+        self.assertEqual(self._read(data), self._read(self._full_render(doc, context)))
+        with zipfile.ZipFile(BytesIO(data)) as infile:
+            self.assertTrue(any(name.startswith('word/media/') for name in infile.namelist()))
+
+        context['table'] = 'no table'
+        self.assertEqual(self._read(preview.render(context)), self._read(self._full_render(doc, context)))
+
+    def test_replaced_images_are_dropped(self):
+        doc = self._get_docx('alltypes')
+        preview = doc.incremental()
+        context = {'text': 'text', 'html': 'html', 'image': 'image', 'table': 'table'}
+        goat = os.path.join(os.path.dirname(__file__), 'powerpoint', 'files', 'goat.jpg')
+
+        def media(data):
+            with zipfile.ZipFile(BytesIO(data)) as infile:
+                return [name for name in infile.namelist() if name.startswith('word/media/')]
+
+        for source in [os.path.join(resources_dir, 'pigeon.jpg'), goat] * 3:
+            context['image'] = ImageReplacement(source)
+            self.assertEqual(len(media(preview.render(context))), 1)
+
+        context['image'] = 'no image'
+        data = preview.render(context)
+        self.assertEqual(media(data), [])
+        self.assertEqual(self._read(data, 'word/_rels/document.xml.rels'),
+                         self._read(self._full_render(doc, context), 'word/_rels/document.xml.rels'))
+
+        # text changes are still filled in incrementally
+        context['text'] = 'changed'
+        self.sink.clear()
+        preview.render(context)
+        self.assertEqual(self.sink.total('docx.incremental.fields'), 1)
+
+    def test_paragraph_replacement_in_shared_paragraph(self):
+        doc = self._get_docx('simple_and_complex_fields')
+        preview = doc.incremental()
+        context = {name: name for name in doc.get_field_names()}
+        preview.render(context)
+
+        # bar and baz share a paragraph
+        context['bar'] = TableReplacement([['1']], None)
+        data = preview.render(context)
+
+        self.assertEqual(self._read(data), self._read(self._full_render(doc, context)))
+        self.assertIsNone(preview._doc)
@@ -0,0 +1,130 @@
+import json
+import os
+import pstats
+import tempfile
+import tracemalloc
+import unittest
+
+from bureaucracy.instrumentation import (
+    NULL_TIMER, CallbackSink, Instrumentation, MemorySink, add_sink,
+    instrumentation, remove_sink
+)
+from bureaucracy.profiling import RenderProfiler
+
+from .test_fields import DocxTestsBase
+
+
+class InstrumentationTests(unittest.TestCase):
+    def test_no_sinks(self):
+        instr = Instrumentation()
+        self.assertFalse(instr.enabled)
+        self.assertIs(instr.timer('foo'), NULL_TIMER)
+
+    def test_callback_sink(self):
+        instr = Instrumentation()
+        timings, counts = [], []
+        instr.add_sink(CallbackSink(on_timing=lambda *args: timings.append(args),
+                                    on_count=lambda *args: counts.append(args)))
+
+        with instr.timer('foo', tag='bar'):
+            pass
+        instr.count('baz', 3)
+
+        self.assertEqual([(name, tags) for name, seconds, tags in timings], [('foo', {'tag': 'bar'})])
+        self.assertEqual(counts, [('baz', 3, {})])
+
+
+class DocxInstrumentationTests(DocxTestsBase):
+    def setUp(self):
+        self.sink = MemorySink()
+        add_sink(self.sink)
+
+    def tearDown(self):
+        remove_sink(self.sink)
+
+    def test_render_phases(self):
+        doc = self._get_docx('simple_and_complex_fields')
+        doc.fast = False
+        data = doc.render({'foo': 'frobnicate'})
+
+        names = self.sink.timing_names()
+        for phase in ('docx.load', 'docx.copy', 'docx.iter_fields', 'docx.fill', 'docx.save', 'docx.render'):
+            self.assertIn(phase, names)
+        self.assertEqual(self.sink.total('docx.fields'), 6)
+        self.assertEqual(self.sink.total('docx.bytes_out'), len(data))
+        self.assertGreater(self.sink.total('docx.bytes_in'), 0)
+
+        fills = [tags['replacement'] for name, seconds, tags in self.sink.timings if name == 'docx.fill']
+        self.assertEqual(fills, ['TextReplacement'] * 6)
+
+    def test_render_phases_fast(self):
+        doc = self._get_docx('simple_and_complex_fields')
+        data = doc.render({'foo': 'frobnicate'})
+
+        names = self.sink.timing_names()
+        for phase in ('docx.compile', 'docx.copy', 'docx.fill', 'docx.save', 'docx.render'):
+            self.assertIn(phase, names)
+        self.assertNotIn('docx.iter_fields', names)
+        self.assertEqual(self.sink.total('docx.fields'), 6)
+        self.assertEqual(self.sink.total('docx.bytes_out'), len(data))
+
+    def test_detached(self):
+        remove_sink(self.sink)
+        self._get_docx('simple_fields').render({})
+        add_sink(self.sink)
+
+        self.assertEqual(self.sink.timings, [])
+        self.assertEqual(self.sink.counts, [])
+
+
+class ProfilerTests(DocxTestsBase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_slow_renders_are_captured(self):
+        doc = self._get_docx('simple_and_complex_fields')
+        doc.profiler = RenderProfiler(self.directory, threshold=0, trace_allocations=True)
+        doc.render({'foo': 'frobnicate'})
+
+        captures = doc.profiler.captures()
+        self.assertEqual(len(captures), 1)
+        self.assertEqual(sorted(os.listdir(captures[0])), ['allocations.tracemalloc', 'capture.json', 'profile.prof'])
+        with open(os.path.join(captures[0], 'capture.json')) as infile:
+            capture = json.load(infile)
+        self.assertEqual(capture['kind'], 'docx')
+        self.assertEqual(capture['counts']['docx.fields'], 6)
+        self.assertIn('docx.render', capture['timings'])
+        self.assertGreater(capture['peak_memory'], 0)
+        self.assertEqual(len(capture['context']), 64)
+        pstats.Stats(os.path.join(captures[0], 'profile.prof'))
+        tracemalloc.Snapshot.load(os.path.join(captures[0], 'allocations.tracemalloc'))
+
+        # nothing is left attached
+        self.assertFalse(instrumentation.enabled)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_fast_renders_are_not_captured(self):
+        doc = self._get_docx('simple_fields')
+        doc.profiler = RenderProfiler(self.directory, threshold=60)
+        doc.render({'foo': 'foo'})
+        doc.render_and_save(os.path.join(self.directory, 'out.docx'), {'foo': 'foo'})
+
+        self.assertEqual(doc.profiler.captures(), [])
+
+    def test_sampling_and_rotation(self):
+        doc = self._get_docx('simple_fields')
+        doc.profiler = RenderProfiler(self.directory, threshold=60, sample_rate=1, max_captures=2)
+        # other directories are not captures, the rotation leaves them alone
+        os.makedirs(os.path.join(self.directory, 'reports'))
+        for i in range(4):
+            doc.render({'foo': str(i)})
+
+        captures = doc.profiler.captures()
+        self.assertEqual(len(captures), 2)
+        self.assertTrue(os.path.isdir(os.path.join(self.directory, 'reports')))
+        with open(os.path.join(captures[0], 'capture.json')) as infile:
+            self.assertTrue(json.load(infile)['sampled'])
@@ -0,0 +1,170 @@
+import time
+from io import BytesIO
+
+import docx
+
+from bureaucracy import DocxTemplate
+from bureaucracy.preflight import PreflightError
+from bureaucracy.replacements import TableReplacement
+
+from .helpers import add_field, save_document
+from .test_fields import DocxTestsBase
+
+
+def table_template():
+    """
+    A table with a header row, a row repeated for every line and a total row.
+    """
+    document = docx.Document()
+    add_field(document.add_paragraph('Invoice for '), 'customer')
+    table = document.add_table(rows=3, cols=2)
+    table.cell(0, 0).text = 'Description'
+    table.cell(0, 1).text = 'Amount'
+    add_field(table.cell(1, 0).paragraphs[0], 'TableStart:lines')
+    add_field(table.cell(1, 0).paragraphs[0], 'description')
+    add_field(table.cell(1, 1).paragraphs[0], 'amount')
+    add_field(table.cell(1, 1).paragraphs[0], 'TableEnd:lines')
+    add_field(table.cell(2, 1).paragraphs[0], 'total')
+    return save_document(document)
+
+
+def paragraph_template():
+    document = docx.Document()
+    document.add_paragraph('Dear reader,')
+    add_field(document.add_paragraph(), 'TableStart:items')
+    paragraph = document.add_paragraph('- ')
+    add_field(paragraph, 'name')
+    paragraph.add_run(' by ')
+    add_field(paragraph, 'author')
+    add_field(document.add_paragraph(), 'TableEnd:items')
+    document.add_paragraph('Regards')
+    return save_document(document)
+
+
+class RegionTests(DocxTestsBase):
+    def _render(self, template, context):
+        return docx.Document(BytesIO(template.render(context)))
+
+    def test_field_names(self):
+        template = DocxTemplate(table_template())
+        self.assertEqual(template.get_field_names(), {'customer', 'lines', 'total'})
+        self.assertEqual(template.get_regions(), {'lines': {'description', 'amount'}})
+
+    def test_table_rows(self):
+        template = DocxTemplate(table_template())
+        document = self._render(template, {
+            'customer': 'ACME',
+            'lines': [{'description': 'Pigeons', 'amount': 3}, {'description': 'Seeds', 'amount': '12.50'}],
+            'total': '15.50',
+        })
+
+        table = document.tables[0]
+        self.assertEqual([[cell.text for cell in row.cells] for row in table.rows], [
+            ['Description', 'Amount'],
+            ['Pigeons', '3'],
+            ['Seeds', '12.50'],
+            ['', '15.50'],
+        ])
+        self.assertEqual(document.paragraphs[0].text, 'Invoice for ACME')
+        self.assertEqual(DocxTemplate(save_document(document)).get_field_names(), set())
+
+    def test_paragraphs(self):
+        template = DocxTemplate(paragraph_template())
+        document = self._render(template, {
+            'items': [{'name': 'Dune', 'author': 'Herbert'}, {'name': 'Emma'}],
+            'author': 'Austen',
+        })
+
+        # values missing from an item come from the context, the paragraphs of the markers are left out
+        self.assertEqual([paragraph.text for paragraph in document.paragraphs],
+                         ['Dear reader,', '- Dune by Herbert', '- Emma by Austen', 'Regards'])
+
+    def test_markers_with_content(self):
+        document = docx.Document()
+        add_field(document.add_paragraph('Items: '), 'TableStart:items')
+        add_field(document.add_paragraph('- '), 'name')
+        paragraph = document.add_paragraph('end')
+        add_field(paragraph, 'TableEnd:items')
+
+        template = DocxTemplate(save_document(document))
+        document = self._render(template, {'items': [{'name': 'Dune'}, {'name': 'Emma'}]})
+        self.assertEqual([paragraph.text for paragraph in document.paragraphs],
+                         ['Items: ', '- Dune', 'end', 'Items: ', '- Emma', 'end'])
+
+    def test_paragraph_replacements(self):
+        document = docx.Document()
+        add_field(document.add_paragraph(), 'TableStart:items')
+        add_field(document.add_paragraph(), 'name')
+        add_field(document.add_paragraph(), 'table')
+        add_field(document.add_paragraph(), 'TableEnd:items')
+        document.add_paragraph('Regards')
+
+        template = DocxTemplate(save_document(document), strict=True)
+        document = self._render(template, {'items': [
+            {'name': 'Dune', 'table': TableReplacement([['Herbert', 1965]], ['author', 'year'])},
+            {'name': 'Emma', 'table': TableReplacement([['Austen', 1815]], None)},
+        ]})
+
+        self.assertEqual([paragraph.text for paragraph in document.paragraphs], ['Dune', 'Emma', 'Regards'])
+        self.assertEqual([[[cell.text for cell in row.cells] for row in table.rows] for table in document.tables],
+                         [[['author', 'year'], ['Herbert', '1965']], [['Austen', '1815']]])
+        # the tables are in place, after the name of their item
+        body = [child.tag.rpartition('}')[2] for child in document.element.body]
+        self.assertEqual(body[:4], ['p', 'tbl', 'p', 'tbl'])
+
+    def test_no_items(self):
+        template = DocxTemplate(table_template())
+        document = self._render(template, {'customer': 'ACME', 'lines': [], 'total': '0'})
+        self.assertEqual(len(document.tables[0].rows), 2)
+
+    def test_strict(self):
+        template = DocxTemplate(table_template(), strict=True)
+        context = {'customer': 'ACME', 'lines': [{'description': 'Pigeons'}, 'Seeds'], 'total': '0'}
+
+        report = template.preflight(context)
+        self.assertEqual([(problem.field, problem.code) for problem in report.problems],
+                         [('lines[0].amount', 'missing'), ('lines', 'invalid')])
+        with self.assertRaises(PreflightError):
+            template.render(context)
+
+    def test_unpaired_marker(self):
+        document = docx.Document()
+        add_field(document.add_paragraph(), 'TableStart:lines')
+        add_field(document.add_paragraph(), 'description')
+        add_field(document.add_paragraph(), 'TableEnd:items')
+        add_field(document.add_paragraph(), 'TableEnd:items')
+
+        # like before regions existed, the markers are filled in like other fields
+        source = save_document(document)
+        template = DocxTemplate(source)
+        with self.assertLogs('bureaucracy', level='WARNING') as logs:
+            self.assertEqual(template.get_field_names(), {'TableStart:lines', 'description', 'TableEnd:items'})
+        self.assertEqual(len(logs.output), 2)
+        rendered = self._render(template, {'TableStart:lines': 'start', 'description': 'text', 'TableEnd:items': 'end'})
+        self.assertEqual([paragraph.text for paragraph in rendered.paragraphs], ['start', 'text', 'end', 'end'])
+
+        source.seek(0)
+        with self.assertRaises(ValueError):
+            DocxTemplate(source, strict=True).get_field_names()
+
+    def test_many_rows(self):
+        template = DocxTemplate(table_template())
+
+        def render(count):
+            lines = [{'description': 'line {}'.format(index), 'amount': index} for index in range(count)]
+            context = {'customer': 'ACME', 'lines': lines, 'total': '0'}
+            durations = []
+            for _ in range(3):
+                start = time.perf_counter()
+                data = template.render(context)
+                durations.append(time.perf_counter() - start)
+            return min(durations), data
+
+        small, _ = render(500)
+        large, data = render(4000)
+        # eight times the rows takes about eight times as long, quadratic expansion would take sixty four times
+        self.assertLess(large / small, 24)
+
+        table = docx.Document(BytesIO(data)).tables[0]
+        self.assertEqual(len(table.rows), 4002)
+        self.assertEqual(table.rows[4000].cells[0].text, 'line 3999')
@@ -1,9 +1,18 @@
 import os
+import tempfile
+import zipfile
 from io import BytesIO
+from unittest import mock
 
 import docx
+from docx.oxml import parse_xml
 from PyPDF2.pdf import PdfFileReader
 
+from bureaucracy.cache import MemoryCache
+from bureaucracy.converters import BaseConverter
+from bureaucracy.packaging import Compression
+from bureaucracy.replacements import ImageReplacement, TextReplacement
+
 from .test_fields import DocxTestsBase, resources_dir
 
 
@@ -60,3 +69,193 @@ class RenderTests(DocxTestsBase):
 
         # can the python-docx library parse our result without throwing a hissy fit?
         docx.Document(BytesIO(data))
+
+
+class FastRenderTests(DocxTestsBase):
+    def _document_xml(self, data):
+        with zipfile.ZipFile(BytesIO(data)) as infile:
+            return infile.read('word/document.xml')
+
+    def test_same_output_as_object_model(self):
+        doc = self._get_docx('simple_and_complex_fields')
+        context = {'foo': ' padded ', 'bar': 'tab\there', 'baz': 'two\nlines', 'complex': 5.2,
+                   'simple': TextReplacement('text')}
+
+        fast = doc.render(context)
+        doc.fast = False
+        slow = doc.render(context)
+
+        self.assertEqual(self._document_xml(fast), self._document_xml(slow))
+        self.assertTrue(docx.Document(BytesIO(fast)).element.xpath(".//text()='text'"))
+
+    def test_template_is_unchanged(self):
+        doc = self._get_docx('simple_fields')
+        first = doc.render({'foo': 'first value'})
+        second = doc.render({'foo': 'second value'})
+
+        self.assertEqual(doc.get_field_names(), {'foo', 'bar', 'baz'})
+        self.assertIn(b'first value', self._document_xml(first))
+        self.assertNotIn(b'first value', self._document_xml(second))
+
+    def test_changed_template(self):
+        doc = self._get_docx('simple_fields')
+        context = {'foo': 'foo', 'bar': 'bar', 'baz': 'baz'}
+        doc.render(context)
+
+        doc.paragraphs[0].insert_paragraph_before('inserted')
+        doc.sections[0].header.paragraphs[0].text = 'header'
+        document = docx.Document(BytesIO(doc.render(context)))
+
+        self.assertEqual(document.paragraphs[0].text, 'inserted')
+        self.assertEqual(document.sections[0].header.paragraphs[0].text, 'header')
+        fast = doc.render(context)
+        doc.fast = False
+        self.assertEqual(self._document_xml(fast), self._document_xml(doc.render(context)))
+
+    def test_refresh(self):
+        doc = self._get_docx('simple_fields')
+        doc.render({'foo': 'foo'})
+
+        # changing a part in place is not noticed until the template is refreshed
+        doc.styles['Normal'].font.name = 'Courier'
+        self.assertNotIn(b'Courier', zipfile.ZipFile(BytesIO(doc.render({'foo': 'foo'}))).read('word/styles.xml'))
+        doc.refresh()
+        self.assertIn(b'Courier', zipfile.ZipFile(BytesIO(doc.render({'foo': 'foo'}))).read('word/styles.xml'))
+
+    def test_rich_replacements_use_object_model(self):
+        doc = self._get_docx('simple_fields')
+        image = ImageReplacement(os.path.join(resources_dir, 'pigeon.jpg'))
+
+        self.assertIsNone(doc._render_fast({'foo': image}))
+        data = doc.render({'foo': image})
+        with zipfile.ZipFile(BytesIO(data)) as infile:
+            self.assertTrue(any(name.startswith('word/media/') for name in infile.namelist()))
+
+    def test_same_warnings_as_object_model(self):
+        doc = self._get_docx('simple_fields')
+        context = {'foo': 'foo', 'unknown': 'value'}
+
+        with self.assertLogs('bureaucracy', level='WARNING') as fast:
+            doc.render(context)
+        doc.fast = False
+        with self.assertLogs('bureaucracy', level='WARNING') as slow:
+            doc.render(context)
+
+        self.assertEqual(len(fast.output), 2)
+        self.assertEqual(sorted(fast.output), sorted(slow.output))
+
+    def test_strict(self):
+        doc = self._get_docx('simple_fields')
+        doc.strict = True
+        with self.assertRaises(ValueError):
+            doc.render({'foo': 'only foo'})
+
+
+class CompressionTests(DocxTestsBase):
+    def _compression(self, data):
+        with zipfile.ZipFile(BytesIO(data)) as infile:
+            return {info.filename: info.compress_type for info in infile.infolist()}
+
+    def test_store(self):
+        doc = self._get_docx('simple_fields')
+        doc.compression = Compression.STORE
+        context = {'foo': 'foo', 'bar': 'bar', 'baz': 'baz'}
+
+        fast = doc.render(context)
+        doc.fast = False
+        slow = doc.render(context)
+
+        for data in (fast, slow):
+            self.assertEqual(set(self._compression(data).values()), {zipfile.ZIP_STORED})
+            docx.Document(BytesIO(data))
+
+    def test_media_is_stored(self):
+        doc = self._get_docx('simple_fields')
+        doc.compression = Compression.SMALLEST
+        data = doc.render({'foo': ImageReplacement(os.path.join(resources_dir, 'pigeon.jpg'))})
+
+        compression = self._compression(data)
+        media = [name for name in compression if name.startswith('word/media/')]
+        self.assertTrue(media)
+        self.assertEqual({compression[name] for name in media}, {zipfile.ZIP_STORED})
+        self.assertEqual(compression['word/document.xml'], zipfile.ZIP_DEFLATED)
+
+    def test_same_package_as_library(self):
+        doc = self._get_docx('alltypes')
+        library = BytesIO()
+        docx.document.Document.save(doc, library)
+        doc.compression = Compression.FAST
+        compressed = BytesIO()
+        doc.save(compressed)
+
+        with zipfile.ZipFile(library) as expected, zipfile.ZipFile(compressed) as actual:
+            self.assertEqual(sorted(actual.namelist()), sorted(expected.namelist()))
+            for name in expected.namelist():
+                if name != '[Content_Types].xml':
+                    self.assertEqual(actual.read(name), expected.read(name))
+            content_types = [
+                sorted((node.tag, sorted(node.attrib.items())) for node in parse_xml(infile.read('[Content_Types].xml')))
+                for infile in (expected, actual)
+            ]
+        self.assertEqual(content_types[1], content_types[0])
+
+    def test_cache_key(self):
+        doc = self._get_docx('simple_fields')
+        doc.cache = MemoryCache()
+        deflated = doc.render({'foo': 'foo'})
+        doc.compression = Compression.STORE
+        stored = doc.render({'foo': 'foo'})
+
+        self.assertEqual(len(doc.cache), 2)
+        self.assertGreater(len(stored), len(deflated))
+
+    def test_presets(self):
+        self.assertIs(Compression.get('fast'), Compression.FAST)
+        self.assertEqual(Compression.get('smallest'), Compression(level=9))
+        with self.assertRaises(ValueError):
+            Compression.get('zstd')
+        with self.assertRaises(ValueError):
+            Compression(level=10)
+
+
+class RenderResultTests(DocxTestsBase):
+    def setUp(self):
+        self.converter = mock.Mock(spec=BaseConverter)
+        self.converter.convert.return_value = b'%PDF'
+
+    def test_formats_are_produced_once(self):
+        doc = self._get_docx('complex_fields')
+        doc.converter = self.converter
+        result = doc.render({'complex': 'BEEES'}, format=None)
+
+        self.assertTrue(result.is_cached('docx'))
+        self.assertEqual(result.pdf, b'%PDF')
+        self.assertEqual(result.get('pdf'), b'%PDF')
+        self.converter.convert.assert_called_once_with(result.docx, 'docx', 'pdf')
+        docx.Document(BytesIO(result.docx))
+
+    def test_object_model_render(self):
+        doc = self._get_docx('simple_fields')
+        doc.converter = self.converter
+        result = doc.render({'foo': ImageReplacement(os.path.join(resources_dir, 'pigeon.jpg'))}, format=None)
+
+        self.assertFalse(result.is_cached('docx'))
+        self.assertEqual(result.get('pdf'), b'%PDF')
+        self.assertTrue(result.is_cached('docx'))
+        self.assertIs(result.getbuffer('docx').obj, result.docx)
+
+    def test_save(self):
+        doc = self._get_docx('simple_fields')
+        doc.converter = self.converter
+        result = doc.render({'foo': 'foo'}, format=None)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            result.save(os.path.join(tmpdir, 'out.pdf'))
+            result.save(os.path.join(tmpdir, 'out.bin'), format='docx')
+            with open(os.path.join(tmpdir, 'out.pdf'), 'rb') as infile:
+                self.assertEqual(infile.read(), b'%PDF')
+            with open(os.path.join(tmpdir, 'out.bin'), 'rb') as infile:
+                self.assertEqual(infile.read(), result.docx)
+
+        with self.assertRaises(ValueError):
+            result.get('odt')
@@ -1,12 +1,16 @@
 import os
 import re
 from copy import copy
+from io import BytesIO
+from unittest import mock
 from zipfile import ZipFile
 
+import docx
 from docx.enum.style import WD_STYLE_TYPE
 
-from bureaucracy import HTML, Image, Table
+from bureaucracy import HTML, DocxTemplate, Image, SubTemplate, Table
 
+from .helpers import add_field, save_document
 from .test_fields import DocxTestsBase, resources_dir
 
 
@@ -130,3 +134,121 @@ class HTMLReplacementTests(DocxTestsBase):
         # assert that all styles mentioned in the document are also in the document's style section
         style_ids = doc.element.xpath('.//w:pStyle/@w:val')
         self.assertTrue(all(doc.styles.get_style_id(sid, WD_STYLE_TYPE.PARAGRAPH) for sid in style_ids))
+
+
+def fake_pandoc(html, to, format, outputfile):
+    # stands in for pandoc: a paragraph with the html as text
+    document = docx.Document()
+    document.add_paragraph(html)
+    document.save(outputfile)
+
+
+class ConvertManyTests(DocxTestsBase):
+    def test_convert_many(self):
+        with mock.patch('pypandoc.convert_text', side_effect=fake_pandoc) as convert:
+            replacements = HTML.convert_many(['<p>one</p>', '<p>two</p>', '<p>one</p>'], workers=2)
+
+        self.assertEqual(convert.call_count, 2)
+        self.assertEqual([replacement.html for replacement in replacements], ['<p>one</p>', '<p>two</p>', '<p>one</p>'])
+        self.assertEqual(replacements[2].par_nodes[0].xpath('string(.)'), '<p>one</p>')
+        # duplicates get their own paragraphs, as filling in moves them into the document
+        self.assertIsNot(replacements[0].par_nodes[0], replacements[2].par_nodes[0])
+
+    def test_convert_many_subclass(self):
+        class Styled(HTML):
+            def __init__(self, html, converted=None):
+                super().__init__(html, converted=converted)
+                self.style = 'Quote'
+
+        with mock.patch('pypandoc.convert_text', side_effect=fake_pandoc) as convert:
+            replacement, = Styled.convert_many(['<p>one</p>'])
+
+        self.assertEqual(convert.call_count, 1)
+        self.assertIsInstance(replacement, Styled)
+        self.assertEqual(replacement.style, 'Quote')
+
+    def test_convert_context(self):
+        doc = self._get_docx('html')
+        with mock.patch('pypandoc.convert_text', side_effect=fake_pandoc):
+            context = HTML.convert_many({'html': '<p>html</p>'})
+
+        self.assertIsInstance(context['html'], HTML)
+        doc.replace_fields(context)
+        self.assertTrue(doc._element.xpath('.//text()="<p>html</p>"'))
+
+
+class SubTemplateTests(DocxTestsBase):
+    def _clause(self):
+        document = docx.Document()
+        document.styles.add_style('Clause', WD_STYLE_TYPE.PARAGRAPH)
+        add_field(document.add_paragraph(style='Clause'), 'title')
+        add_field(document.add_paragraph(style='List Number'), 'term')
+        add_field(document.add_paragraph(), 'logo')
+        return DocxTemplate(save_document(document))
+
+    def _contract(self):
+        document = docx.Document()
+        add_field(document.add_paragraph('Contract with '), 'party')
+        add_field(document.add_paragraph(), 'first')
+        add_field(document.add_paragraph(), 'second')
+        return DocxTemplate(save_document(document))
+
+    def _numbering(self, document):
+        return document.part.numbering_part.element.xpath('./w:num')
+
+    def test_insert(self):
+        clause = self._clause()
+        contract = self._contract()
+        numbering = len(self._numbering(contract))
+        logo = os.path.join(resources_dir, 'pigeon.jpg')
+
+        data = contract.render({
+            'party': 'ACME',
+            'first': SubTemplate(clause, {'title': 'Payment', 'term': 'in 30 days', 'logo': Image(logo)}),
+            'second': SubTemplate(clause, {'title': 'Delivery', 'term': 'by pigeon', 'logo': Image(logo)}),
+        })
+
+        document = docx.Document(BytesIO(data))
+        self.assertEqual([paragraph.text for paragraph in document.paragraphs],
+                         ['Contract with ACME', 'Payment', 'in 30 days', '', 'Delivery', 'by pigeon', ''])
+        self.assertEqual([paragraph.style.name for paragraph in document.paragraphs[1:3]], ['Clause', 'List Number'])
+        self.assertEqual(len([style for style in document.styles if style.name == 'Clause']), 1)
+        # the numbering of the clause is added once
+        self.assertEqual(len(self._numbering(document)), numbering + len(self._numbering(clause)))
+        with ZipFile(BytesIO(data)) as infile:
+            self.assertEqual(len([name for name in infile.namelist() if name.startswith('word/media/')]), 1)
+
+    def test_sections(self):
+        document = docx.Document()
+        document.sections[0].header.paragraphs[0].text = 'Clause header'
+        document.add_paragraph('Landscape')
+        document.add_section()
+        document.add_paragraph('Portrait')
+        clause = DocxTemplate(save_document(document))
+
+        data = self._contract().render({'party': 'ACME', 'first': SubTemplate(clause), 'second': ''})
+
+        document = docx.Document(BytesIO(data))
+        self.assertEqual([paragraph.text for paragraph in document.paragraphs],
+                         ['Contract with ACME', 'Landscape', 'Portrait', ''])
+        self.assertEqual(len(document.sections), 1)
+
+    def test_text_only_clauses_are_filled_in_fast(self):
+        clause = self._clause()
+        with mock.patch.object(clause, '_copy') as copy_clause:
+            document = docx.Document(BytesIO(self._contract().render({
+                'party': 'ACME', 'first': SubTemplate(clause, {'title': 'Payment'}), 'second': 'none',
+            })))
+
+        copy_clause.assert_not_called()
+        self.assertEqual(document.paragraphs[1].text, 'Payment')
+
+    def test_strict(self):
+        clause = self._clause()
+        clause.strict = True
+        contract = self._contract()
+        contract.strict = True
+
+        report = contract.preflight({'party': 'ACME', 'first': SubTemplate(clause, {'title': 'Payment'}),
+                                     'second': ''})
+        self.assertEqual([problem.field for problem in report.problems], ['first', 'first'])
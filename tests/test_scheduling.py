@@ -0,0 +1,124 @@
+import threading
+import time
+import unittest
+
+from bureaucracy.converters import BaseConverter
+from bureaucracy.instrumentation import MemorySink, add_sink, remove_sink
+from bureaucracy.scheduling import (
+    ConversionScheduler, DeadlineExceeded, QueueFull
+)
+
+
+class GatedConverter(BaseConverter):
+    """
+    Converts by upper casing, once the gate is opened.
+    """
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.converted = []
+
+    def convert_many(self, documents, source_format, target_format):
+        self.started.release()
+        self.gate.wait(5)
+        self.converted += documents
+        return [data.upper() for data in documents]
+
+
+class ConversionSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.converter = GatedConverter()
+        self.sink = MemorySink()
+        add_sink(self.sink)
+
+    def tearDown(self):
+        self.converter.gate.set()
+        remove_sink(self.sink)
+
+    def _scheduler(self, **kwargs):
+        scheduler = ConversionScheduler(self.converter, **kwargs)
+        self.addCleanup(scheduler.shutdown)
+        return scheduler
+
+    def _occupy(self, scheduler, priority='batch'):
+        """
+        Submit a job and wait until a worker runs it.
+        """
+        future = scheduler.submit([b'busy'], 'docx', 'pdf', priority=priority)
+        self.assertTrue(self.converter.started.acquire(timeout=5))
+        return future
+
+    def test_priorities(self):
+        scheduler = self._scheduler()
+        self._occupy(scheduler)
+        batch = scheduler.submit([b'batch'], 'docx', 'pdf', priority='batch')
+        default = scheduler.submit([b'default'], 'docx', 'pdf')
+        interactive = scheduler.submit([b'interactive'], 'docx', 'pdf', priority='interactive')
+        self.assertEqual(scheduler.depth(), 3)
+
+        self.converter.gate.set()
+        self.assertEqual(batch.result(5), [b'BATCH'])
+        self.assertEqual(self.converter.converted, [b'busy', b'interactive', b'default', b'batch'])
+        self.assertEqual(interactive.result(), [b'INTERACTIVE'])
+        self.assertEqual(default.result(), [b'DEFAULT'])
+        self.assertEqual(self.sink.timing_names().count('convert.queue_wait'), 4)
+
+    def test_reserved_worker(self):
+        scheduler = self._scheduler(workers=2, reserved_workers=1)
+        self._occupy(scheduler)
+        scheduler.submit([b'batch'], 'docx', 'pdf', priority='batch')
+        interactive = scheduler.submit([b'interactive'], 'docx', 'pdf', priority='interactive')
+
+        # the reserved worker takes the interactive job while the batch job waits for the other one
+        self.assertTrue(self.converter.started.acquire(timeout=5))
+        self.assertEqual(scheduler.depth('batch'), 1)
+        self.converter.gate.set()
+        self.assertEqual(interactive.result(5), [b'INTERACTIVE'])
+
+    def test_deadline(self):
+        scheduler = self._scheduler()
+        self._occupy(scheduler)
+        late = scheduler.submit([b'late'], 'docx', 'pdf', priority='interactive', timeout=0.01)
+        time.sleep(0.05)
+
+        self.converter.gate.set()
+        with self.assertRaises(DeadlineExceeded):
+            late.result(5)
+        self.assertNotIn(b'late', self.converter.converted)
+        self.assertEqual(self.sink.total('convert.expired'), 1)
+
+    def test_full_queue(self):
+        scheduler = self._scheduler(max_queue=1, block=False)
+        self._occupy(scheduler)
+        scheduler.submit([b'queued'], 'docx', 'pdf')
+
+        with self.assertRaises(QueueFull):
+            scheduler.submit([b'rejected'], 'docx', 'pdf')
+        # every priority has its own queue
+        scheduler.submit([b'interactive'], 'docx', 'pdf', priority='interactive')
+        self.assertEqual(self.sink.total('convert.rejected'), 1)
+
+    def test_backpressure(self):
+        scheduler = self._scheduler(max_queue=1)
+        self._occupy(scheduler)
+        scheduler.submit([b'queued'], 'docx', 'pdf')
+
+        with self.assertRaises(DeadlineExceeded):
+            scheduler.submit([b'waits'], 'docx', 'pdf', timeout=0.01)
+
+        threading.Timer(0.05, self.converter.gate.set).start()
+        future = scheduler.submit([b'waits'], 'docx', 'pdf', timeout=5)
+        self.assertEqual(future.result(5), [b'WAITS'])
+
+    def test_scheduled_converter(self):
+        self.converter.gate.set()
+        scheduler = self._scheduler(batch_size=2)
+        converter = scheduler.for_priority('batch')
+
+        self.assertEqual(converter.convert_many([b'a', b'b', b'c'], 'docx', 'pdf'), [b'A', b'B', b'C'])
+        self.assertEqual(converter.convert(b'd', 'docx', 'pdf'), b'D')
+        depths = [tags for name, value, tags in self.sink.counts if name == 'convert.queue_depth']
+        self.assertEqual(depths, [{'priority': 'batch'}] * 3)
+        with self.assertRaises(ValueError):
+            scheduler.for_priority('urgent')